@@ -0,0 +1,137 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import asyncio
+import functools
+import threading
+
+from pika.adapters.asyncio_connection import AsyncioConnection
+
+from container_service_extension.consumer import MessageConsumer
+from container_service_extension.logger import SERVER_LOGGER as LOGGER
+
+# Seconds to wait for a consumer to close its AMQP connection on stop
+STOP_TIMEOUT = 30
+
+
+class AsyncioMessageConsumer(MessageConsumer):
+    """AMQP consumer driven by an asyncio event loop.
+
+    Any number of these consumers can share a single event loop. Message
+    intake, reply publishing and reconnection all happen on the loop, while
+    the blocking request processing (vCD/PKS broker calls) is offloaded to
+    a processor pool, so the number of in-flight requests is bound only by
+    the pool and not by the number of AMQP connections.
+    """
+
+    def __init__(self,
+                 host,
+                 port,
+                 ssl,
+                 vhost,
+                 username,
+                 password,
+                 exchange,
+                 routing_key,
+                 loop,
+                 processor_pool):
+        super().__init__(host, port, ssl, vhost, username, password,
+                         exchange, routing_key, processor_pool=processor_pool)
+        self._loop = loop
+        self._stopped = threading.Event()
+
+    def connect(self):
+        LOGGER.info(f"Connecting to {self.host}:{self.port}")
+        parameters = self.get_connection_parameters()
+        return AsyncioConnection(parameters,
+                                 on_open_callback=self.on_connection_open,
+                                 stop_ioloop_on_close=False,
+                                 custom_ioloop=self._loop)
+
+    def on_connection_closed(self, connection, reply_code, reply_text):
+        self._channel = None
+        if self._closing:
+            self._stopped.set()
+        else:
+            LOGGER.warning(f"Connection closed, reopening in 5 seconds: "
+                           f"({reply_code}) {reply_text}")
+            self._loop.call_later(5, self.reconnect)
+
+    def reconnect(self):
+        if not self._closing:
+            self._connection = self.connect()
+
+    def dispatch_message(self, channel, basic_deliver, properties, body):
+        future = asyncio.wrap_future(
+            self._processor_pool.submit(self.process_message, basic_deliver,
+                                        properties, body),
+            loop=self._loop)
+        future.add_done_callback(functools.partial(
+            self.on_request_done, channel, basic_deliver.delivery_tag,
+            properties))
+        self._pending_requests.add(future)
+        future.add_done_callback(self._pending_requests.discard)
+
+    def on_request_done(self, channel, delivery_tag, properties, future):
+        # process_message() turns every error into an error reply
+        self.on_message_processed(channel, delivery_tag, properties,
+                                  future.result())
+
+    def run(self):
+        """Open the AMQP connection on the event loop.
+
+        Unlike MessageConsumer.run(), this does not block. The event loop
+        needs to be run separately, see run_event_loop().
+        """
+        self._loop.call_soon_threadsafe(self._start)
+
+    def _start(self):
+        self._connection = self.connect()
+
+    def stop(self):
+        LOGGER.info("Stopping")
+        self._loop.call_soon_threadsafe(self._stop)
+        if not self._stopped.wait(timeout=STOP_TIMEOUT):
+            LOGGER.warning("Timed out waiting for AMQP connection to close")
+        LOGGER.info("Stopped")
+
+    def _stop(self):
+        self._closing = True
+        if self._pending_requests:
+            # let in-flight requests publish their replies first
+            LOGGER.info(f"Waiting for {len(self._pending_requests)} "
+                        f"request(s) to finish")
+            future = asyncio.gather(*self._pending_requests,
+                                    return_exceptions=True)
+            future.add_done_callback(lambda _: self._stop_connection())
+        else:
+            self._stop_connection()
+
+    def _stop_connection(self):
+        if self._channel is not None:
+            self.stop_consuming()
+        elif self._connection is not None and self._connection.is_open:
+            self.close_connection()
+        else:
+            self._stopped.set()
+
+
+def run_event_loop(loop):
+    """Run an event loop shared by AsyncioMessageConsumers until stopped.
+
+    :param asyncio.AbstractEventLoop loop:
+    """
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_forever()
+    finally:
+        loop.close()
+
+
+def stop_event_loop(loop):
+    """Stop an event loop started via run_event_loop() from another thread.
+
+    :param asyncio.AbstractEventLoop loop:
+    """
+    loop.call_soon_threadsafe(loop.stop)
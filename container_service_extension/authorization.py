@@ -22,23 +22,23 @@ def secure(required_rights=[]):
 
     :rtype: method
     """
+    namespaced_rights = [f'{{{CSE_SERVICE_NAMESPACE}}}:{right_name}'
+                         for right_name in required_rights or []]
+
     def decorator_secure(func):
         @functools.wraps(func)
         def decorator_wrapper(*args, **kwargs):
             server_config = utils.get_server_runtime_config()
 
             if (server_config['service']['enforce_authorization']
-                    and required_rights is not None
-                    and len(required_rights) > 0):
+                    and len(namespaced_rights) > 0):
                 class_instance: abstract_broker.AbstractBroker = args[0]
+                # set of rights, see UserContext.rights
                 user_rights = class_instance.context.user.rights
 
-                missing_rights = []
-                for right_name in required_rights:
-                    namespaced_name = f'{{{CSE_SERVICE_NAMESPACE}}}' \
-                                      f':{right_name}'
-                    if namespaced_name not in user_rights:
-                        missing_rights.append(namespaced_name)
+                missing_rights = [right_name
+                                  for right_name in namespaced_rights
+                                  if right_name not in user_rights]
 
                 if len(missing_rights) > 0:
                     LOGGER.debug(f"Authorization failed for user "
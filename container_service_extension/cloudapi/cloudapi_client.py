@@ -2,14 +2,47 @@
 # Copyright (c) 2019 VMware, Inc. All Rights Reserved.
 # SPDX-License-Identifier: BSD-2-Clause
 
-from copy import deepcopy
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
+import os
+import threading
 
+import cachetools
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from container_service_extension.shared_constants import RequestMethod
+
+# Maximum number of connections kept alive per session
+DEFAULT_POOL_SIZE = 10
+# Number of times a request rejected with 429 or 503 is retried
+DEFAULT_MAX_RETRIES = 3
+# Retries back off exponentially, sleeping backoff_factor * 2^(retry - 1)
+# seconds, unless the response carries a Retry-After header
+DEFAULT_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = (requests.codes.too_many_requests,
+                      requests.codes.service_unavailable)
+# Methods whose requests are retried on 503, requests of other methods are
+# retried on 429 only
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT'])
+# Maximum number of (base url, credential) sessions kept alive
+MAX_SESSIONS = 128
+
+_sessions = cachetools.LRUCache(maxsize=MAX_SESSIONS)
+_sessions_pid = None
+_sessions_lock = threading.Lock()
 
 
 class CloudApiClient(object):
-    """REST based client for cloudapi server."""
+    """REST based client for cloudapi server.
+
+    Clients for the same base url, credentials, pool size and retry
+    settings share a pooled requests.Session, so that connections are kept
+    alive across client instances.
+    """
 
     def __init__(self,
                  base_url,
@@ -19,7 +52,10 @@ class CloudApiClient(object):
                  logger_debug,
                  logger_wire,
                  verify_ssl=True,
-                 is_sys_admin=False):
+                 is_sys_admin=False,
+                 pool_size=DEFAULT_POOL_SIZE,
+                 max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR):
         if not base_url.endswith('/'):
             base_url += '/'
         self._base_url = base_url
@@ -32,6 +68,8 @@ class CloudApiClient(object):
         self._headers["Accept"] = f"application/json;version={api_version}"
 
         self._verify_ssl = verify_ssl
+        self._session = _get_session(base_url, token, verify_ssl, pool_size,
+                                     max_retries, backoff_factor)
         self.LOGGER = logger_debug
         self.LOGGER_WIRE = logger_wire
         self._last_response = None
@@ -79,7 +117,6 @@ class CloudApiClient(object):
 
         :raises HTTPError: if the underlying REST call fails.
         """
-        # TODO pagination support in relative resource path
         if resource_url_absolute_path:
             url = resource_url_absolute_path
         else:
@@ -89,20 +126,20 @@ class CloudApiClient(object):
             url += f"{resource_url_relative_path}"
 
         self.LOGGER_WIRE.debug(f"Request uri : {(method.value).upper()} {url}")
-        headers = deepcopy(self._headers)
         if content_type and 'json' not in content_type:
+            headers = dict(self._headers)
             headers['Content-type'] = content_type
-            response = requests.request(
+            response = self._session.request(
                 method.value,
                 url,
                 headers=headers,
                 data=payload,
                 verify=self._verify_ssl)
         else:
-            response = requests.request(
+            response = self._session.request(
                 method.value,
                 url,
-                headers=headers,
+                headers=self._headers,
                 json=payload,
                 verify=self._verify_ssl)
         self._last_response = response
@@ -119,3 +156,154 @@ class CloudApiClient(object):
 
         if response.text:
             return json.loads(response.text)
+
+    def iterate_pages(self,
+                      cloudapi_version,
+                      resource_url_relative_path,
+                      query_string=None,
+                      page_size=None,
+                      max_workers=1):
+        """Iterate over the records of a paginated cloudapi collection.
+
+        The first page is fetched right away, the page count it reports
+        determines how many more pages are requested. With max_workers > 1,
+        up to that many of the remaining pages are fetched concurrently,
+        records are still yielded in page order.
+
+        :param str cloudapi_version: cloudapi version that's part of the url
+            e.g. 1.0.0 in /cloudapi/1.0.0/vdcComputePolicies
+        :param str resource_url_relative_path: path of the collection without
+            query string, e.g. vdcComputePolicies
+        :param str query_string: additional query parameters such as filter
+            and sort order, without the page parameter.
+        :param int page_size: number of records per page, vCD default if None
+        :param int max_workers: maximum number of pages fetched concurrently.
+
+        :return: Generator that yields the records of all pages.
+
+        :rtype: Generator[dict, None, None]
+
+        :raises HTTPError: if the underlying REST call fails.
+        """
+        query_params = []
+        if query_string:
+            query_params.append(query_string)
+        if page_size:
+            query_params.append(f"pageSize={page_size}")
+
+        def get_page(page_num):
+            page_query_string = "&".join(query_params + [f"page={page_num}"])
+            return self.do_request(
+                method=RequestMethod.GET,
+                cloudapi_version=cloudapi_version,
+                resource_url_relative_path=f"{resource_url_relative_path}?"
+                                           f"{page_query_string}")
+
+        response_body = get_page(1)
+        values = response_body.get('values', [])
+        yield from values
+        page_count = response_body.get('pageCount')
+        if page_count is None:
+            # page count unknown, read pages until an empty one comes back
+            page_num = 1
+            while values:
+                page_num += 1
+                values = get_page(page_num).get('values', [])
+                yield from values
+            return
+        if page_count <= 1:
+            return
+        if max_workers <= 1:
+            for page_num in range(2, page_count + 1):
+                yield from get_page(page_num).get('values', [])
+            return
+
+        max_workers = min(max_workers, page_count - 1)
+        pending_pages = collections.deque()
+        next_page_num = 2
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                while next_page_num <= page_count or pending_pages:
+                    # keep at most max_workers pages in flight or buffered
+                    while next_page_num <= page_count and \
+                            len(pending_pages) < max_workers:
+                        pending_pages.append(
+                            executor.submit(get_page, next_page_num))
+                        next_page_num += 1
+                    future = pending_pages.popleft()
+                    yield from future.result().get('values', [])
+            finally:
+                for future in pending_pages:
+                    future.cancel()
+
+
+def _get_session(base_url, token, verify_ssl, pool_size, max_retries,
+                 backoff_factor):
+    """Get the shared session for a base url, credential and settings.
+
+    Sessions are per process, since pooled connections must not be shared
+    with processes forked by the server.
+
+    :rtype: requests.Session
+    """
+    global _sessions_pid
+    key = (base_url, hashlib.sha256(token.encode()).hexdigest(), verify_ssl,
+           pool_size, max_retries, backoff_factor)
+    with _sessions_lock:
+        if _sessions_pid != os.getpid():
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=pool_size,
+                max_retries=_get_retry(max_retries, backoff_factor))
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[key] = session
+        return session
+
+
+class _ThrottlingRetry(Retry):
+    """Retry of 429 responses for all methods, and of 503 for some.
+
+    vCD sends 429 when it throttles a request, before doing any work, so
+    such requests are safe to retry whatever their method. A 503 may also
+    come from a proxy after vCD got the request, so only requests of
+    idempotent methods are retried on 503.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == requests.codes.too_many_requests:
+            return True
+        return super().is_retry(method, status_code,
+                                has_retry_after=has_retry_after)
+
+
+def _get_retry(max_retries, backoff_factor):
+    """Get the retry settings of the sessions of cloudapi clients.
+
+    :param int max_retries: number of times a request is retried.
+    :param float backoff_factor:
+
+    :rtype: urllib3.util.retry.Retry
+    """
+    retry_kwargs = {
+        'total': max_retries,
+        'connect': 0,
+        'read': 0,
+        'status': max_retries,
+        'backoff_factor': backoff_factor,
+        'status_forcelist': RETRY_STATUS_CODES,
+        'raise_on_status': False,
+        'respect_retry_after_header': True
+    }
+    try:
+        return _ThrottlingRetry(allowed_methods=IDEMPOTENT_METHODS,
+                                **retry_kwargs)
+    except TypeError:
+        # urllib3 < 1.26
+        return _ThrottlingRetry(method_whitelist=IDEMPOTENT_METHODS,
+                                **retry_kwargs)
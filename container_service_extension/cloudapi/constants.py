@@ -7,6 +7,8 @@ from enum import Enum
 CLOUDAPI_VERSION_1_0_0 = '1.0.0'
 CLOUDAPI_URN_PREFIX = 'urn:vcloud'
 CSE_COMPUTE_POLICY_PREFIX = 'cse----'
+# Largest pageSize accepted by cloudapi collection endpoints
+MAX_PAGE_SIZE = 128
 
 
 class CloudApiResource(str, Enum):
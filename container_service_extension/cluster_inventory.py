@@ -0,0 +1,361 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import collections
+import copy
+import datetime
+import os
+import threading
+import time
+import urllib.parse
+
+import pyvcloud.vcd.client as vcd_client
+
+from container_service_extension.logger import SERVER_LOGGER as LOGGER
+import container_service_extension.sysadmin_client_pool as sysadmin_client_pool # noqa: E501
+import container_service_extension.vdc_index as vdc_index
+
+# Seconds between two refreshes of the inventory from vCD
+DEFAULT_REFRESH_INTERVAL = 60
+
+# Seconds by which the first refresh after a load reaches back, which covers
+# the difference between the clocks of vCD and of this server
+CLOCK_SKEW_MARGIN = 300
+
+# Maximum number of vApps whose clusters are read by a single query, which
+# keeps the id filter of the query URL within limits
+MAX_VAPPS_PER_QUERY = 50
+
+_inventory = None
+_inventory_pid = None
+_inventory_lock = threading.Lock()
+
+
+class ClusterInventory(object):
+    """In-memory inventory of all native clusters in vCD.
+
+    Clusters are kept as returned by vcdbroker.get_all_clusters(), keyed by
+    vApp id and indexed by cluster name, cluster id, VDC id and org name.
+
+    All clusters are loaded once, on first read. From then on, a background
+    thread periodically queries the vCD tasks on vApps that ended since the
+    previous refresh, and reads the clusters of these vApps only, see
+    refresh_changes(). This picks up changes made by other server processes,
+    or outside of CSE. Cluster operations of this server process update the
+    affected cluster right away, see refresh_cluster() and remove_cluster().
+
+    The inventory is loaded with a sys admin client, so it holds clusters of
+    all orgs. Callers must restrict the clusters they read to those visible
+    to the user.
+    """
+
+    def __init__(self, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._clusters = {}
+        self._by_name = collections.defaultdict(set)
+        self._by_cluster_id = collections.defaultdict(set)
+        self._by_vdc_id = collections.defaultdict(set)
+        self._by_org_name = collections.defaultdict(set)
+        self._lock = threading.RLock()
+        self._loaded = threading.Event()
+        self._initial_load_lock = threading.Lock()
+        self._stopped = threading.Event()
+        # ids of clusters updated while a load was in progress
+        self._updated_during_load = None
+        # end date of the latest vApp task seen, in the format of vCD, and
+        # the ids of the tasks seen that ended at that date
+        self._changes_since = None
+        self._task_ids_seen = set()
+        self._stats = {
+            'loads': 0,
+            'reads': 0,
+            'refreshes': 0,
+            'changed_vapps': 0,
+            'last_load_time': None,
+            'last_refresh_time': None
+        }
+
+    def get_clusters(self, cluster_name=None, cluster_id=None, org_name=None,
+                     ovdc_name=None):
+        """Get clusters matching all of the given filters.
+
+        :param str cluster_name:
+        :param str cluster_id:
+        :param str org_name:
+        :param str ovdc_name:
+
+        :return: copies of the matching clusters, which can be modified by
+            the caller.
+
+        :rtype: list
+        """
+        if not self._loaded.is_set():
+            with self._initial_load_lock:
+                if not self._loaded.is_set():
+                    self.load()
+
+        with self._lock:
+            self._stats['reads'] += 1
+            candidates = None
+            for index, key in ((self._by_name, cluster_name),
+                               (self._by_cluster_id, cluster_id),
+                               (self._by_org_name, _org_key(org_name))):
+                if key is None:
+                    continue
+                vapp_ids = index.get(key, set())
+                candidates = vapp_ids if candidates is None \
+                    else candidates & vapp_ids
+            if candidates is None:
+                candidates = self._clusters.keys()
+            clusters = [self._clusters[vapp_id] for vapp_id in candidates]
+            if ovdc_name is not None:
+                clusters = [c for c in clusters if c['vdc_name'] == ovdc_name]
+            return copy.deepcopy(clusters)
+
+    def get_clusters_in_vdc(self, vdc_id):
+        """Get copies of all clusters in an org VDC.
+
+        :param str vdc_id:
+
+        :rtype: list
+        """
+        with self._lock:
+            return copy.deepcopy([self._clusters[vapp_id]
+                                  for vapp_id in self._by_vdc_id.get(vdc_id, set())]) # noqa: E501
+
+    def load(self):
+        """Bring the inventory in line with all clusters in vCD."""
+        with self._lock:
+            self._updated_during_load = set()
+        try:
+            # tasks that end while the clusters are queried are picked up by
+            # the next refresh
+            changes_since = _format_date(
+                time.time() - CLOCK_SKEW_MARGIN)
+            clusters = self._with_sysadmin_client(_query_clusters)
+            with self._lock:
+                num_changes = self._apply(clusters,
+                                          skip=self._updated_during_load)
+                self._changes_since = changes_since
+                self._task_ids_seen = set()
+                self._stats['loads'] += 1
+                self._stats['last_load_time'] = time.time()
+        finally:
+            with self._lock:
+                self._updated_during_load = None
+        self._loaded.set()
+        LOGGER.debug(f"Refreshed cluster inventory: {len(clusters)} "
+                     f"cluster(s), {num_changes} change(s)")
+
+    def refresh_cluster(self, cluster_id):
+        """Update a cluster in the inventory with its current state in vCD.
+
+        Removes the cluster from the inventory if it no longer exists.
+
+        :param str cluster_id: CSE cluster id of the cluster.
+        """
+        clusters = self._with_sysadmin_client(_query_clusters,
+                                              cluster_id=cluster_id)
+        with self._lock:
+            self._remove(self._by_cluster_id.get(cluster_id, set()))
+            for cluster in clusters:
+                self._add(cluster)
+            if self._updated_during_load is not None:
+                self._updated_during_load.add(cluster_id)
+
+    def refresh_changes(self):
+        """Update the clusters of the vApps changed since the last refresh.
+
+        vApps changed are those of the vCD tasks that ended since the last
+        refresh, or since the inventory was loaded. Clusters whose vApp no
+        longer exists are removed from the inventory.
+
+        :return: number of vApps changed.
+
+        :rtype: int
+        """
+        with self._lock:
+            changes_since = self._changes_since
+            task_ids_seen = self._task_ids_seen
+        if changes_since is None:
+            # not loaded yet
+            return 0
+        records = self._with_sysadmin_client(_query_vapp_tasks,
+                                             changes_since=changes_since)
+        vapp_ids = set()
+        latest_end = _parse_date(changes_since)
+        latest_task_ids = set(task_ids_seen)
+        for record in records:
+            task_id = record.get('href').split('/')[-1]
+            end = _parse_date(record.get('endDate'))
+            if task_id in task_ids_seen:
+                continue
+            vapp_ids.add(record.get('object').split('vapp-')[-1])
+            if end > latest_end:
+                latest_end = end
+                changes_since = record.get('endDate')
+                latest_task_ids = set()
+            if end == latest_end:
+                latest_task_ids.add(task_id)
+
+        vapp_ids = sorted(vapp_ids)
+        for i in range(0, len(vapp_ids), MAX_VAPPS_PER_QUERY):
+            batch = vapp_ids[i:i + MAX_VAPPS_PER_QUERY]
+            clusters = self._with_sysadmin_client(_query_clusters,
+                                                  vapp_ids=batch)
+            with self._lock:
+                self._remove(batch)
+                for cluster in clusters:
+                    self._add(cluster)
+        with self._lock:
+            self._changes_since = changes_since
+            self._task_ids_seen = latest_task_ids
+            self._stats['refreshes'] += 1
+            self._stats['changed_vapps'] += len(vapp_ids)
+            self._stats['last_refresh_time'] = time.time()
+        if vapp_ids:
+            LOGGER.debug(f"Refreshed cluster inventory: {len(vapp_ids)} "
+                         f"vApp(s) changed")
+        return len(vapp_ids)
+
+    def remove_cluster(self, cluster_id):
+        """Remove a deleted cluster from the inventory.
+
+        :param str cluster_id: CSE cluster id of the cluster.
+        """
+        with self._lock:
+            self._remove(self._by_cluster_id.get(cluster_id, set()))
+            if self._updated_during_load is not None:
+                self._updated_during_load.add(cluster_id)
+
+    def start(self):
+        """Start refreshing the changed clusters in the background."""
+        thread = threading.Thread(target=self._refresh_loop,
+                                  name='ClusterInventoryRefresh',
+                                  daemon=True)
+        thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._clusters)
+        return stats
+
+    def _refresh_loop(self):
+        while not self._stopped.wait(timeout=self.refresh_interval):
+            try:
+                self.refresh_changes()
+            except Exception as err:
+                LOGGER.warning(f"Failed to refresh cluster inventory: {err}",
+                               exc_info=True)
+
+    def _apply(self, clusters, skip):
+        """Apply the difference between @clusters and the inventory.
+
+        :return: number of added, updated and removed clusters.
+
+        :rtype: int
+        """
+        num_changes = 0
+        loaded_vapp_ids = set()
+        for cluster in clusters:
+            loaded_vapp_ids.add(cluster['vapp_id'])
+            if cluster['cluster_id'] in skip:
+                continue
+            if self._clusters.get(cluster['vapp_id']) != cluster:
+                self._remove([cluster['vapp_id']])
+                self._add(cluster)
+                num_changes += 1
+        removed_vapp_ids = [
+            vapp_id for vapp_id, cluster in self._clusters.items()
+            if vapp_id not in loaded_vapp_ids
+            and cluster['cluster_id'] not in skip]
+        self._remove(removed_vapp_ids)
+        return num_changes + len(removed_vapp_ids)
+
+    def _add(self, cluster):
+        vapp_id = cluster['vapp_id']
+        self._clusters[vapp_id] = cluster
+        self._by_name[cluster['name']].add(vapp_id)
+        self._by_cluster_id[cluster['cluster_id']].add(vapp_id)
+        self._by_vdc_id[cluster['vdc_id']].add(vapp_id)
+        self._by_org_name[_org_key(cluster['org_name'])].add(vapp_id)
+
+    def _remove(self, vapp_ids):
+        for vapp_id in list(vapp_ids):
+            cluster = self._clusters.pop(vapp_id, None)
+            if cluster is None:
+                continue
+            for index, key in ((self._by_name, cluster['name']),
+                               (self._by_cluster_id, cluster['cluster_id']),
+                               (self._by_vdc_id, cluster['vdc_id']),
+                               (self._by_org_name,
+                                _org_key(cluster['org_name']))):
+                index[key].discard(vapp_id)
+                if not index[key]:
+                    del index[key]
+
+    @staticmethod
+    def _with_sysadmin_client(func, **kwargs):
+        with sysadmin_client_pool.get_pool().leased_client() as client:
+            return func(client, **kwargs)
+
+
+def _org_key(org_name):
+    # org names are case insensitive in vCD
+    return org_name.lower() if org_name is not None else None
+
+
+def _format_date(timestamp):
+    return datetime.datetime.fromtimestamp(
+        timestamp, tz=datetime.timezone.utc).isoformat(timespec='milliseconds')
+
+
+def _parse_date(value):
+    # vCD dates are ISO 8601, possibly with a 'Z' suffix
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _query_vapp_tasks(sysadmin_client, changes_since):
+    qfilter = f"objectType==vApp;" \
+              f"endDate=ge={urllib.parse.quote_plus(changes_since)}"
+    q = sysadmin_client.get_typed_query(
+        vcd_client.ResourceType.ADMIN_TASK.value,
+        query_result_format=vcd_client.QueryResultFormat.RECORDS,
+        qfilter=qfilter,
+        fields='object,endDate')
+    return list(q.execute())
+
+
+def _query_clusters(sysadmin_client, cluster_id=None, vapp_ids=None):
+    # circular dependency between vcdbroker.py and cluster_inventory.py
+    from container_service_extension.vcdbroker import get_all_clusters
+    clusters = get_all_clusters(sysadmin_client, cluster_id=cluster_id,
+                                vapp_ids=vapp_ids)
+    for cluster in clusters:
+        if not cluster['org_name']:
+            cluster['org_name'] = vdc_index.get_index().get_org_name(
+                cluster['vdc_id'], sysadmin_client)
+    return clusters
+
+
+def get_inventory():
+    """Get the cluster inventory of the current process.
+
+    The inventory is created and its background refresh started on first
+    use, separately in every worker process of the server. Every process
+    loads all clusters once, and then only reads the clusters that changed.
+
+    :rtype: ClusterInventory
+    """
+    global _inventory, _inventory_pid
+    with _inventory_lock:
+        if _inventory is None or _inventory_pid != os.getpid():
+            _inventory = ClusterInventory()
+            _inventory.start()
+            _inventory_pid = os.getpid()
+        return _inventory
@@ -2,6 +2,11 @@
 # Copyright (c) 2019 VMware, Inc. All Rights Reserved.
 # SPDX-License-Identifier: BSD-2-Clause
 
+import collections
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import TimeoutError
+from concurrent.futures import wait
+
 import pyvcloud.vcd.client as vcd_client
 from pyvcloud.vcd.exceptions import EntityNotFoundException
 from pyvcloud.vcd.exceptions import OperationNotSupportedException
@@ -16,11 +21,14 @@ import container_service_extension.logger as logger
 import container_service_extension.pyvcloud_utils as vcd_utils
 import container_service_extension.request_context as ctx
 from container_service_extension.shared_constants import RequestMethod
+import container_service_extension.task_watcher as task_watcher
 import container_service_extension.utils as utils
 
 
 _SYSTEM_DEFAULT_COMPUTE_POLICY = 'System Default'
 GLOBAL_PVDC_COMPUTE_POLICY_MIN_VERSION = 35.0
+# Number of VMs whose compute policy is updated concurrently in vCD
+DEFAULT_POLICY_UPDATE_WORKERS = 8
 
 
 class ComputePolicyManager:
@@ -84,25 +92,17 @@ class ComputePolicyManager:
         filter_string = None
         if filters:
             filter_string = ";".join([f"{key}=={value}" for (key, value) in filters.items()]) # noqa: E501
-        cloudapiResource = cloudapi_constants.CloudApiResource
-        page_num = 0
-        while True:
-            page_num += 1
-            # without the &sortAsc parameter, vCD returns unpredictable results
-            query_string = f"page={page_num}&sortAsc=name"
-            if filter_string:
-                query_string = f"filter={filter_string}&{query_string}"
-            response_body = self._cloudapi_client.do_request(
-                method=RequestMethod.GET,
+        # without the sortAsc parameter, vCD returns unpredictable results
+        query_string = "sortAsc=name"
+        if filter_string:
+            query_string = f"filter={filter_string}&{query_string}"
+        for policy in self._cloudapi_client.iterate_pages(
                 cloudapi_version=cloudapi_constants.CLOUDAPI_VERSION_1_0_0,
-                resource_url_relative_path=f"{cloudapiResource.PVDC_COMPUTE_POLICIES}?{query_string}") # noqa: E501
-
-            if len(response_body['values']) == 0:
-                break
-            for policy in response_body['values']:
-                cp_name = policy['name']
-                policy['display_name'] = self._get_policy_display_name(cp_name)
-                yield policy
+                resource_url_relative_path=cloudapi_constants.CloudApiResource.PVDC_COMPUTE_POLICIES, # noqa: E501
+                query_string=query_string):
+            cp_name = policy['name']
+            policy['display_name'] = self._get_policy_display_name(cp_name)
+            yield policy
 
     def get_all_vdc_compute_policies(self, filters=None):
         """Get all compute policies in vCD.
@@ -124,26 +124,17 @@ class ComputePolicyManager:
         filter_string = None
         if filters:
             filter_string = ";".join([f"{key}=={value}" for (key, value) in filters.items()]) # noqa: E501
-        cloudapiResource = cloudapi_constants.CloudApiResource
-        page_num = 0
-        while True:
-            page_num += 1
-            # without the &sortAsc parameter, vCD returns unpredictable results
-            query_string = f"page={page_num}&sortAsc=name"
-            if filter_string:
-                query_string = f"filter={filter_string}&{query_string}"
-            # without the &sortAsc parameter, vCD returns unpredictable results
-            response_body = self._cloudapi_client.do_request(
-                method=RequestMethod.GET,
+        # without the sortAsc parameter, vCD returns unpredictable results
+        query_string = "sortAsc=name"
+        if filter_string:
+            query_string = f"filter={filter_string}&{query_string}"
+        for policy in self._cloudapi_client.iterate_pages(
                 cloudapi_version=cloudapi_constants.CLOUDAPI_VERSION_1_0_0,
-                resource_url_relative_path=f"{cloudapiResource.VDC_COMPUTE_POLICIES}?{query_string}") # noqa: E501
-
-            if len(response_body['values']) == 0:
-                break
-            for policy in response_body['values']:
-                cp_name = policy['name']
-                policy['display_name'] = self._get_policy_display_name(cp_name)
-                yield policy
+                resource_url_relative_path=cloudapi_constants.CloudApiResource.VDC_COMPUTE_POLICIES, # noqa: E501
+                query_string=query_string):
+            cp_name = policy['name']
+            policy['display_name'] = self._get_policy_display_name(cp_name)
+            yield policy
 
     def get_pvdc_compute_policy(self, policy_name):
         """Get the CSE created PVDC compute policy by name.
@@ -433,31 +424,117 @@ class ComputePolicyManager:
         filter_string = ""
         if filters:
             filter_string = ";".join([f"{key}=={value}" for (key, value) in filters.items()]) # noqa: E501
-        response_body = self._cloudapi_client.do_request(
-            method=RequestMethod.GET,
-            cloudapi_version=cloudapi_constants.CLOUDAPI_VERSION_1_0_0,
-            resource_url_relative_path=relative_path)
-        page_num = 0
-        while True:
-            page_num += 1
-            # without the &sortAsc parameter, vCD returns unpredictable results
-            query_string = f"page={page_num}&sortAsc=name"
-            if filter_string:
-                query_string = f"filter={filter_string}&{query_string}"
-            response_body = self._cloudapi_client.do_request(
-                method=RequestMethod.GET,
+        # without the sortAsc parameter, vCD returns unpredictable results
+        query_string = "sortAsc=name"
+        if filter_string:
+            query_string = f"filter={filter_string}&{query_string}"
+        for cp in self._cloudapi_client.iterate_pages(
                 cloudapi_version=cloudapi_constants.CLOUDAPI_VERSION_1_0_0,
-                resource_url_relative_path=f"{relative_path}?{query_string}") # noqa: E501
-
-            if len(response_body['values']) == 0:
-                break
-            for cp in response_body['values']:
-                policy = {
-                    'name': self._get_policy_display_name(cp.get('name')),
-                    'href': self._get_policy_href(cp.get('id')),
-                    'id': cp.get('id')
-                }
-                yield policy
+                resource_url_relative_path=relative_path,
+                query_string=query_string):
+            policy = {
+                'name': self._get_policy_display_name(cp.get('name')),
+                'href': self._get_policy_href(cp.get('id')),
+                'id': cp.get('id')
+            }
+            yield policy
+
+    def list_vms_with_compute_policy_in_vdc(self, vdc_id, compute_policy_id):
+        """List the VMs of a vdc that use a given compute policy.
+
+        VMs using the policy are fetched from the cloudapi endpoint of the
+        policy, and restricted to the vdc by VM typed queries filtered on
+        their ids, instead of reading every VM of the vdc.
+
+        :param str vdc_id: id of the vdc.
+        :param str compute_policy_id: URN of the vdc compute policy.
+
+        :return: list of dicts with 'name' and 'href' of the VMs.
+        :rtype: list
+        """
+        self._raise_error_if_not_supported()
+        resource = cloudapi_constants.CloudApiResource
+        relative_path = \
+            f"{resource.VDC_COMPUTE_POLICIES}/{compute_policy_id}/vms"
+        policy_vm_ids = sorted({
+            vm.get('id').split(':')[-1]
+            for vm in self._cloudapi_client.iterate_pages(
+                cloudapi_version=cloudapi_constants.CLOUDAPI_VERSION_1_0_0,
+                resource_url_relative_path=relative_path,
+                page_size=cloudapi_constants.MAX_PAGE_SIZE)
+        })
+        return [
+            {
+                'name': record.get('name'),
+                'href': record.get('href')
+            }
+            for record in vcd_utils.get_vms_in_ovdc(
+                self._sysadmin_client, vdc_id, policy_vm_ids)
+        ]
+
+    def _update_compute_policy_of_vms(self, vms, compute_policy_href,
+                                      max_workers=DEFAULT_POLICY_UPDATE_WORKERS, # noqa: E501
+                                      progress_callback=None):
+        """Set the compute policy of VMs, updating several VMs at a time.
+
+        Updates are submitted from this thread, and the vCD tasks of all VMs
+        being updated are tracked together by the task watcher. A failed VM
+        doesn't stop the update of the remaining VMs.
+
+        :param list vms: dicts with 'name' and 'href' of the VMs.
+        :param str compute_policy_href: href of the new compute policy.
+        :param int max_workers: maximum number of VMs updated concurrently.
+        :param function progress_callback: called with the number of VMs
+            done and the failures so far, whenever a VM update finishes.
+
+        :return: dict of VM name to the error its update failed with.
+        :rtype: dict
+        """
+        failures = {}
+        pending_vms = collections.deque(vms)
+        # future of the vCD task of a VM update to the name of the VM
+        vm_updates = {}
+        num_done = 0
+
+        def vm_done(vm_name, err=None):
+            nonlocal num_done
+            num_done += 1
+            if err is not None:
+                logger.SERVER_LOGGER.error(
+                    f"Failed to update compute policy of VM '{vm_name}': "
+                    f"{err}")
+                failures[vm_name] = err
+            if progress_callback:
+                progress_callback(num_done, failures)
+
+        watcher = task_watcher.get_watcher()
+        while pending_vms or vm_updates:
+            while pending_vms and len(vm_updates) < max(1, max_workers):
+                vm_resource = pending_vms.popleft()
+                try:
+                    vm = VM(self._sysadmin_client, href=vm_resource['href'])
+                    vm_task = vm.update_compute_policy(compute_policy_href)
+                    vm_updates[watcher.watch(vm_task)] = vm_resource['name']
+                except Exception as err:
+                    vm_done(vm_resource['name'], err)
+            if not vm_updates:
+                continue
+
+            done, _ = wait(vm_updates, timeout=task_watcher.DEFAULT_TIMEOUT,
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                # none of the VM tasks finished in time, give up on all of them
+                for future in vm_updates:
+                    future.cancel()
+                done = list(vm_updates)
+            for future in done:
+                vm_name = vm_updates.pop(future)
+                if future.cancelled():
+                    vm_done(vm_name, TimeoutError(
+                        "Timed out waiting for the compute policy update"))
+                    continue
+                vm_done(vm_name, future.exception())
+        return failures
 
     def assign_vdc_placement_policy_to_vapp_template_vms(self,
                                                          compute_policy_href,
@@ -713,49 +790,21 @@ class ComputePolicyManager:
                         f"compute policy not found")
 
                 compute_policy_id = retrieve_compute_policy_id_from_href(compute_policy_href) # noqa: E501
-                vapps = vcd_utils.get_all_vapps_in_ovdc(self._sysadmin_client,
-                                                        ovdc_id)
-                target_vms = []
-                for vapp in vapps:
-                    vm_resources = vapp.get_all_vms()
-                    for vm_resource in vm_resources:
-                        if vm_resource.VdcComputePolicy.get('id') == compute_policy_id: # noqa: E501
-                            target_vms.append(vm_resource)
-                vm_names = [vm.get('name') for vm in target_vms]
-
-                task.update(
-                    status=vcd_client.TaskStatus.RUNNING.value,
-                    namespace='vcloud.cse',
-                    operation=f"Setting compute policy to "
-                              f"'{_SYSTEM_DEFAULT_COMPUTE_POLICY}' on "
-                              f"{len(vm_names)} affected VMs: {vm_names}",
-                    operation_name='Remove org VDC compute policy',
-                    details='',
-                    progress=None,
-                    owner_href=vdc.href,
-                    owner_name=vdc.name,
-                    owner_type=vcd_client.EntityType.VDC.value,
-                    user_href=user_href,
-                    user_name=user_name,
-                    task_href=task_href,
-                    org_href=org_href,
-                )
-
-                task_monitor = self._sysadmin_client.get_task_monitor()
-                for vm_resource in target_vms:
-                    vm = VM(self._sysadmin_client,
-                            href=vm_resource.get('href'))
-                    _task = vm.update_compute_policy(system_default_href)
+                target_vms = self.list_vms_with_compute_policy_in_vdc(
+                    ovdc_id, compute_policy_id)
+                vm_names = [vm['name'] for vm in target_vms]
 
+                def update_progress(num_done, failures):
                     task.update(
                         status=vcd_client.TaskStatus.RUNNING.value,
                         namespace='vcloud.cse',
                         operation=f"Setting compute policy to "
-                                  f"'{_SYSTEM_DEFAULT_COMPUTE_POLICY}' on VM "
-                                  f"'{vm_resource.get('name')}'",
+                                  f"'{_SYSTEM_DEFAULT_COMPUTE_POLICY}' on "
+                                  f"affected VMs: {num_done}/{len(vm_names)} "
+                                  f"done, {len(failures)} failed",
                         operation_name='Remove org VDC compute policy',
                         details='',
-                        progress=None,
+                        progress=int(num_done * 100 / len(vm_names)) if vm_names else None, # noqa: E501
                         owner_href=vdc.href,
                         owner_name=vdc.name,
                         owner_type=vcd_client.EntityType.VDC.value,
@@ -764,7 +813,23 @@ class ComputePolicyManager:
                         task_href=task_href,
                         org_href=org_href,
                     )
-                    task_monitor.wait_for_success(_task)
+
+                update_progress(0, {})
+                service_config = utils.get_server_runtime_config()['service']
+                failures = self._update_compute_policy_of_vms(
+                    target_vms, system_default_href,
+                    max_workers=service_config.get(
+                        'policy_update_workers',
+                        DEFAULT_POLICY_UPDATE_WORKERS),
+                    progress_callback=update_progress)
+                if failures:
+                    failed_vms = ', '.join(
+                        f"'{name}' ({err})" for name, err in failures.items())
+                    raise cse_exceptions.CseServerError(
+                        f"Failed to set compute policy to "
+                        f"'{_SYSTEM_DEFAULT_COMPUTE_POLICY}' on "
+                        f"{len(failures)} of {len(vm_names)} affected VMs: "
+                        f"{failed_vms}")
 
             task.update(
                 status=vcd_client.TaskStatus.RUNNING.value,
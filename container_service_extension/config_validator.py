@@ -33,6 +33,8 @@ from container_service_extension.sample_generator import \
     SAMPLE_PKS_NSXT_SERVERS_SECTION, SAMPLE_PKS_ORGS_SECTION, \
     SAMPLE_PKS_PVDCS_SECTION, SAMPLE_PKS_SERVERS_SECTION, \
     SAMPLE_SERVICE_CONFIG, SAMPLE_VCD_CONFIG, SAMPLE_VCS_CONFIG # noqa: H301
+from container_service_extension.server_constants import ConsumerBackend
+from container_service_extension.server_constants import NodeNaming
 from container_service_extension.server_constants import \
     SUPPORTED_VCD_API_VERSIONS
 from container_service_extension.server_constants import SYSTEM_ORG_NAME
@@ -122,16 +124,7 @@ def get_validated_config(config_file_name,
                                  log_wire=log_wire)
     _validate_broker_config(config['broker'], msg_update_callback,
                             logger_debug)
-    check_keys_and_value_types(config['service'],
-                               SAMPLE_SERVICE_CONFIG['service'],
-                               location="config file 'service' section",
-                               excluded_keys=['log_wire'],
-                               msg_update_callback=msg_update_callback)
-    check_keys_and_value_types(config['service']['telemetry'],
-                               SAMPLE_SERVICE_CONFIG['service']['telemetry'],
-                               location="config file 'service->telemetry' "
-                                        "section",
-                               msg_update_callback=msg_update_callback)
+    _validate_service_config(config['service'], msg_update_callback)
     msg_update_callback.general(
         f"Config file '{config_file_name}' is valid")
     if pks_config_file_name:
@@ -329,6 +322,62 @@ def _validate_broker_config(broker_dict,
         raise Exception("Remote template cookbook is invalid.")
 
 
+def _validate_service_config(service_dict,
+                             msg_update_callback=NullPrinter()):
+    """Ensure that 'service' section of config is correct.
+
+    Checks that 'service' section of config has correct keys and value
+    types. Optional properties may be omitted.
+
+    :param dict service_dict: 'service' section of config file as a dict.
+    :param utils.ConsoleMessagePrinter msg_update_callback: Callback object.
+
+    :raises KeyError: if @service_dict has missing or extra properties.
+    :raises TypeError: if the value type for a @service_dict property is
+        incorrect.
+    :raises ValueError: if 'consumer_backend' is not a supported backend.
+    """
+    optional_keys = [
+        'cloudapi_backoff_factor',
+        'cloudapi_max_retries',
+        'cloudapi_pool_size',
+        'consumer_backend',
+        'log_wire',
+        'node_naming',
+        'node_script_workers',
+        'policy_update_workers',
+        'processors',
+        'rights_cache_ttl',
+        'sysadmin_pool_size',
+        'task_update_window',
+        'tenant_session_cache_size',
+        'tenant_session_cache_ttl'
+    ]
+    check_keys_and_value_types(service_dict,
+                               SAMPLE_SERVICE_CONFIG['service'],
+                               location="config file 'service' section",
+                               excluded_keys=optional_keys,
+                               msg_update_callback=msg_update_callback)
+    check_keys_and_value_types(service_dict['telemetry'],
+                               SAMPLE_SERVICE_CONFIG['service']['telemetry'],
+                               location="config file 'service->telemetry' "
+                                        "section",
+                               msg_update_callback=msg_update_callback)
+
+    valid_consumer_backends = [backend.value for backend in ConsumerBackend]
+    consumer_backend = service_dict.get('consumer_backend',
+                                        ConsumerBackend.SELECT)
+    if consumer_backend not in valid_consumer_backends:
+        raise ValueError(f"Consumer backend is '{consumer_backend}' when it "
+                         f"should be one of {valid_consumer_backends}")
+
+    valid_node_namings = [naming.value for naming in NodeNaming]
+    node_naming = service_dict.get('node_naming', NodeNaming.RANDOM)
+    if node_naming not in valid_node_namings:
+        raise ValueError(f"Node naming is '{node_naming}' when it should be "
+                         f"one of {valid_node_namings}")
+
+
 def _validate_pks_config_structure(pks_config,
                                    msg_update_callback=NullPrinter()):
     sample_config = {
@@ -3,6 +3,9 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 import base64
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import json
 import sys
 import threading
@@ -19,6 +22,26 @@ from container_service_extension.server_constants import EXCHANGE_TYPE
 from container_service_extension.shared_constants import RESPONSE_MESSAGE_KEY
 
 
+class RequestProcessorPool(object):
+    """Pool of threads that process the requests received by consumers.
+
+    A single pool is shared by all consumers of a server process, whichever
+    the consumer backend. Its size bounds the number of unacknowledged
+    messages the broker delivers to each consumer.
+    """
+
+    def __init__(self, max_workers, thread_name_prefix=''):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+    def submit(self, fn, *args):
+        return self._executor.submit(fn, *args)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
 class MessageConsumer(object):
     def __init__(self,
                  host,
@@ -28,11 +51,23 @@ class MessageConsumer(object):
                  username,
                  password,
                  exchange,
-                 routing_key):
+                 routing_key,
+                 processor_pool=None):
         self._connection = None
         self._channel = None
         self._closing = False
         self._consumer_tag = None
+        # If there is no processor pool, messages are processed inline on the
+        # ioloop thread; otherwise they are handed off to the pool and only
+        # decoding/dispatching happens on the ioloop.
+        self._processor_pool = processor_pool
+        # Messages are acknowledged once processed, so the broker delivers
+        # no more messages than the consumer can process at a time and
+        # leaves the others to the remaining consumers.
+        self.prefetch_count = 1
+        if processor_pool is not None:
+            self.prefetch_count = processor_pool.max_workers
+        self._pending_requests = set()
         self.host = host
         self.port = port
         self.ssl = ssl
@@ -44,10 +79,9 @@ class MessageConsumer(object):
         self.queue = routing_key
         self.fsencoding = sys.getfilesystemencoding()
 
-    def connect(self):
-        LOGGER.info(f"Connecting to {self.host}:{self.port}")
+    def get_connection_parameters(self):
         credentials = pika.PlainCredentials(self.username, self.password)
-        parameters = pika.ConnectionParameters(
+        return pika.ConnectionParameters(
             self.host,
             self.port,
             self.vhost,
@@ -56,6 +90,10 @@ class MessageConsumer(object):
             connection_attempts=3,
             retry_delay=2,
             socket_timeout=5)
+
+    def connect(self):
+        LOGGER.info(f"Connecting to {self.host}:{self.port}")
+        parameters = self.get_connection_parameters()
         return pika.SelectConnection(
             parameters, self.on_connection_open, stop_ioloop_on_close=False)
 
@@ -92,7 +130,7 @@ class MessageConsumer(object):
         LOGGER.debug("Channel opened")
         self._channel = channel
         self.add_on_channel_close_callback()
-        self.setup_exchange(self.exchange)
+        self.setup_qos()
 
     def add_on_channel_close_callback(self):
         LOGGER.debug("Adding channel close callback")
@@ -103,6 +141,15 @@ class MessageConsumer(object):
                        f"{reply_text}")
         self._connection.close()
 
+    def setup_qos(self):
+        LOGGER.debug(f"Setting prefetch count to {self.prefetch_count}")
+        self._channel.basic_qos(self.on_basic_qos_ok,
+                                prefetch_count=self.prefetch_count)
+
+    def on_basic_qos_ok(self, unused_frame):
+        LOGGER.debug("QOS set")
+        self.setup_exchange(self.exchange)
+
     def setup_exchange(self, exchange_name):
         LOGGER.debug(f"Declaring exchange {exchange_name}")
         self._channel.exchange_declare(
@@ -147,8 +194,56 @@ class MessageConsumer(object):
         if self._channel:
             self._channel.close()
 
-    def on_message(self, unused_channel, basic_deliver, properties, body):
-        self.acknowledge_message(basic_deliver.delivery_tag)
+    def on_message(self, channel, basic_deliver, properties, body):
+        # Messages are acknowledged once their reply is published. Until
+        # then they count against the prefetch count of the channel, which
+        # keeps further messages on the broker while all processors are busy.
+        if self._processor_pool is None:
+            reply = self.process_message(basic_deliver, properties, body)
+            self.on_message_processed(channel, basic_deliver.delivery_tag,
+                                      properties, reply)
+            return
+
+        self.dispatch_message(channel, basic_deliver, properties, body)
+
+    def dispatch_message(self, channel, basic_deliver, properties, body):
+        future = self._processor_pool.submit(self.process_message_async,
+                                             channel, basic_deliver,
+                                             properties, body)
+        self._pending_requests.add(future)
+        future.add_done_callback(self._pending_requests.discard)
+
+    def process_message_async(self, channel, basic_deliver, properties, body):
+        """Process message on a worker thread and schedule its reply.
+
+        pika channels are not thread safe, so the reply is published via a
+        callback on the connection's ioloop.
+        """
+        reply = self.process_message(basic_deliver, properties, body)
+        callback = functools.partial(self.on_message_processed, channel,
+                                     basic_deliver.delivery_tag,
+                                     properties, reply)
+        self._connection.ioloop.add_callback_threadsafe(callback)
+
+    def on_message_processed(self, channel, delivery_tag, properties, reply):
+        # Delivery tags are only valid on the channel the message was
+        # delivered on. If that channel was closed meanwhile, the broker
+        # delivers the message again, and the reply is left to that delivery.
+        if channel is not self._channel or not channel.is_open:
+            LOGGER.warning(f"Channel closed, dropping reply to message "
+                           f"# {delivery_tag}, which will be redelivered")
+            return
+        self.publish_reply(properties, reply)
+        self.acknowledge_message(delivery_tag)
+
+    def process_message(self, basic_deliver, properties, body):
+        """Process the request and form the reply message.
+
+        :return: reply message or None if no reply should be sent.
+
+        :rtype: dict
+        """
+        body_json = {}
         try:
             body_json = json.loads(body.decode(self.fsencoding))[0]
             LOGGER.debug(f"Received message # {basic_deliver.delivery_tag} "
@@ -185,26 +280,31 @@ class MessageConsumer(object):
             tb = traceback.format_exc()
             LOGGER.error(tb)
 
-        if properties.reply_to is not None:
-            reply_msg = {
-                'id': body_json['id'],
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Content-Length': len(reply_body)
-                },
-                'statusCode': status_code,
-                'body': base64.b64encode(reply_body.encode()).decode(self.fsencoding), # noqa: E501
-                'request': False
-            }
-            LOGGER.debug(f"reply: {reply_body}")
-
-            reply_properties = pika.BasicProperties(
-                correlation_id=properties.correlation_id)
-            self._channel.basic_publish(
-                exchange=properties.headers['replyToExchange'],
-                routing_key=properties.reply_to,
-                body=json.dumps(reply_msg),
-                properties=reply_properties)
+        if properties.reply_to is None:
+            return None
+
+        LOGGER.debug(f"reply: {reply_body}")
+        return {
+            'id': body_json.get('id'),
+            'headers': {
+                'Content-Type': 'application/json',
+                'Content-Length': len(reply_body)
+            },
+            'statusCode': status_code,
+            'body': base64.b64encode(reply_body.encode()).decode(self.fsencoding), # noqa: E501
+            'request': False
+        }
+
+    def publish_reply(self, properties, reply_msg):
+        if reply_msg is None:
+            return
+        reply_properties = pika.BasicProperties(
+            correlation_id=properties.correlation_id)
+        self._channel.basic_publish(
+            exchange=properties.headers['replyToExchange'],
+            routing_key=properties.reply_to,
+            body=json.dumps(reply_msg),
+            properties=reply_properties)
 
     def acknowledge_message(self, delivery_tag):
         LOGGER.debug(f"Acknowledging message {delivery_tag}")
@@ -230,6 +330,8 @@ class MessageConsumer(object):
     def stop(self):
         LOGGER.info("Stopping")
         self._closing = True
+        # let in-flight requests finish and queue their replies
+        futures.wait(list(self._pending_requests))
         self.stop_consuming()
         self._connection.ioloop.start()
         LOGGER.info("Stopped")
@@ -2,16 +2,16 @@
 # Copyright (c) 2020 VMware, Inc. All Rights Reserved.
 # SPDX-License-Identifier: BSD-2-Clause
 
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
 import copy
-import random
 import re
-import string
 import time
 
 import pkg_resources
 import pyvcloud.vcd.client as vcd_client
 import pyvcloud.vcd.org as vcd_org
-import pyvcloud.vcd.task as vcd_task
 import pyvcloud.vcd.vapp as vcd_vapp
 from pyvcloud.vcd.vdc import VDC
 import pyvcloud.vcd.vm as vcd_vm
@@ -24,20 +24,30 @@ import container_service_extension.def_.utils as def_utils
 import container_service_extension.exceptions as e
 import container_service_extension.local_template_manager as ltm
 from container_service_extension.logger import SERVER_LOGGER as LOGGER
+import container_service_extension.node_name_allocator as node_name_allocator # noqa: E501
 import container_service_extension.pyvcloud_utils as vcd_utils
 import container_service_extension.request_context as ctx
 import container_service_extension.request_handlers.request_utils as req_utils
 from container_service_extension.server_constants import ClusterMetadataKey
+from container_service_extension.server_constants import DEFAULT_NODE_SCRIPT_WORKERS # noqa: E501
+from container_service_extension.server_constants import EXEC_READY_TIMEOUT
+from container_service_extension.server_constants import GUEST_TOOLS_READY_TIMEOUT # noqa: E501
 from container_service_extension.server_constants import KwargKey
 from container_service_extension.server_constants import LocalTemplateKey
+from container_service_extension.server_constants import MAX_EXEC_READY_INTERVAL # noqa: E501
+from container_service_extension.server_constants import MIN_EXEC_READY_INTERVAL # noqa: E501
 from container_service_extension.server_constants import NodeType
 from container_service_extension.server_constants import ScriptFile
 from container_service_extension.server_constants import SYSTEM_ORG_NAME
 from container_service_extension.shared_constants import RequestKey
+import container_service_extension.sysadmin_client_pool as sysadmin_client_pool # noqa: E501
+import container_service_extension.task_reporter as task_reporter
+import container_service_extension.task_watcher as task_watcher
 from container_service_extension.telemetry.constants import CseOperation
 from container_service_extension.telemetry.constants import PayloadKey
 from container_service_extension.telemetry.telemetry_handler import \
     record_user_action_details
+import container_service_extension.template_script_registry as template_script_registry # noqa: E501
 import container_service_extension.utils as utils
 import container_service_extension.vsphere_utils as vs_utils
 
@@ -50,7 +60,7 @@ class ClusterService(abstract_broker.AbstractBroker):
         # populates above attributes
         super().__init__(request_context)
 
-        self.task = None
+        self.task_reporter = None
         self.task_resource = None
         self.entity_svc = def_entity_svc.DefEntityService(
             request_context.cloudapi_client)
@@ -254,7 +264,8 @@ class ClusterService(abstract_broker.AbstractBroker):
                 msg = f"Error while creating vApp: {err}"
                 LOGGER.debug(str(err))
                 raise e.ClusterOperationError(msg)
-            self.context.client.get_task_monitor().wait_for_status(vapp_resource.Tasks.Task[0]) # noqa: E501
+            self._flush_task_update()
+            task_watcher.wait_for_task(vapp_resource.Tasks.Task[0])
 
             template = get_template(template_name, template_revision)
 
@@ -273,92 +284,48 @@ class ClusterService(abstract_broker.AbstractBroker):
             vapp = vcd_vapp.VApp(self.context.client,
                                  href=vapp_resource.get('href'))
             task = vapp.set_multiple_metadata(tags)
-            self.context.client.get_task_monitor().wait_for_status(task)
+            self._flush_task_update()
+            task_watcher.wait_for_task(task)
+
+            timings = task_reporter.PhaseTimings()
+
+            def report_progress(message):
+                self._update_task(vcd_client.TaskStatus.RUNNING,
+                                  message=f"{message} of cluster "
+                                          f"'{cluster_name}' ({cluster_id})",
+                                  details=str(timings))
+                # the phase reported is waited for right away
+                self._flush_task_update()
 
-            msg = f"Creating master node for cluster '{cluster_name}' " \
-                  f"({cluster_id})"
-            self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
             vapp.reload()
             server_config = utils.get_server_runtime_config()
             catalog_name = server_config['broker']['catalog']
-            try:
-                add_nodes(self.context.sysadmin_client,
-                          num_nodes=1,
-                          node_type=NodeType.MASTER,
-                          org=org,
-                          vdc=vdc,
-                          vapp=vapp,
-                          catalog_name=catalog_name,
-                          template=template,
-                          network_name=network_name,
-                          storage_profile=master_storage_profile,
-                          ssh_key=ssh_key)
-            except Exception as err:
-                raise e.MasterNodeCreationError("Error adding master node:",
-                                                str(err))
+            self._flush_task_update()
+            master_ip = create_cluster_nodes(
+                self.context.sysadmin_client,
+                org=org,
+                vdc=vdc,
+                vapp=vapp,
+                catalog_name=catalog_name,
+                template=template,
+                network_name=network_name,
+                num_workers=num_workers,
+                enable_nfs=enable_nfs,
+                master_storage_profile=master_storage_profile,
+                worker_storage_profile=worker_storage_profile,
+                ssh_key=ssh_key,
+                timings=timings,
+                progress_callback=report_progress)
 
-            msg = f"Initializing cluster '{cluster_name}' ({cluster_id})"
-            self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
             vapp.reload()
-            init_cluster(self.context.sysadmin_client,
-                         vapp,
-                         template[LocalTemplateKey.NAME],
-                         template[LocalTemplateKey.REVISION])
-            master_ip = get_master_ip(self.context.sysadmin_client, vapp)
             task = vapp.set_metadata('GENERAL', 'READWRITE', 'cse.master.ip',
                                      master_ip)
-            self.context.client.get_task_monitor().wait_for_status(task)
-
-            msg = f"Creating {num_workers} node(s) for cluster " \
-                  f"'{cluster_name}' ({cluster_id})"
-            self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
-            try:
-                add_nodes(self.context.sysadmin_client,
-                          num_nodes=num_workers,
-                          node_type=NodeType.WORKER,
-                          org=org,
-                          vdc=vdc,
-                          vapp=vapp,
-                          catalog_name=catalog_name,
-                          template=template,
-                          network_name=network_name,
-                          storage_profile=worker_storage_profile,
-                          ssh_key=ssh_key)
-            except Exception as err:
-                raise e.WorkerNodeCreationError("Error creating worker node:",
-                                                str(err))
-
-            msg = f"Adding {num_workers} node(s) to cluster " \
-                  f"'{cluster_name}' ({cluster_id})"
-            self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
-            vapp.reload()
-            join_cluster(self.context.sysadmin_client,
-                         vapp,
-                         template[LocalTemplateKey.NAME],
-                         template[LocalTemplateKey.REVISION])
-
-            if enable_nfs:
-                msg = f"Creating NFS node for cluster " \
-                      f"'{cluster_name}' ({cluster_id})"
-                self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
-                try:
-                    add_nodes(self.context.sysadmin_client,
-                              num_nodes=1,
-                              node_type=NodeType.NFS,
-                              org=org,
-                              vdc=vdc,
-                              vapp=vapp,
-                              catalog_name=catalog_name,
-                              template=template,
-                              network_name=network_name,
-                              storage_profile=worker_storage_profile,
-                              ssh_key=ssh_key)
-                except Exception as err:
-                    raise e.NFSNodeCreationError("Error creating NFS node:",
-                                                 str(err))
+            self._flush_task_update()
+            task_watcher.wait_for_task(task)
 
             msg = f"Created cluster '{cluster_name}' ({cluster_id})"
-            self._update_task(vcd_client.TaskStatus.SUCCESS, message=msg)
+            self._update_task(vcd_client.TaskStatus.SUCCESS, message=msg,
+                              details=str(timings))
 
             # Update defined entity instance with new values like vapp_id,
             # master_ip and nodes.
@@ -393,6 +360,7 @@ class ClusterService(abstract_broker.AbstractBroker):
                                           cluster_id=cluster_id,
                                           org_name=org_name,
                                           ovdc_name=ovdc_name)
+                    self._flush_task_update()
                     _delete_vapp(self.context.client, cluster['vdc_href'],
                                  cluster_name)
                     # Delete the corresponding defined entity
@@ -875,6 +843,7 @@ class ClusterService(abstract_broker.AbstractBroker):
             LOGGER.debug(msg)
             self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
 
+            self._flush_task_update()
             new_nodes = add_nodes(self.context.sysadmin_client,
                                   num_nodes=num_workers,
                                   node_type=node_type,
@@ -901,6 +870,7 @@ class ClusterService(abstract_broker.AbstractBroker):
                 for spec in new_nodes['specs']:
                     target_nodes.append(spec['target_vm_name'])
                 vapp.reload()
+                self._flush_task_update()
                 join_cluster(self.context.sysadmin_client,
                              vapp,
                              template[LocalTemplateKey.NAME],
@@ -916,6 +886,7 @@ class ClusterService(abstract_broker.AbstractBroker):
                 self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
                 LOGGER.info(msg)
                 try:
+                    self._flush_task_update()
                     _delete_nodes(self.context.sysadmin_client,
                                   vapp_href,
                                   err.node_names,
@@ -948,6 +919,7 @@ class ClusterService(abstract_broker.AbstractBroker):
 
             # if nodes fail to drain, continue with node deletion anyways
             try:
+                self._flush_task_update()
                 _drain_nodes(self.context.sysadmin_client,
                              vapp_href,
                              node_names_list,
@@ -961,6 +933,7 @@ class ClusterService(abstract_broker.AbstractBroker):
                   f"'{cluster_name}': {node_names_list}"
             self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
 
+            self._flush_task_update()
             _delete_nodes(self.context.sysadmin_client,
                           vapp_href,
                           node_names_list,
@@ -984,6 +957,7 @@ class ClusterService(abstract_broker.AbstractBroker):
         try:
             msg = f"Deleting cluster '{cluster_name}'"
             self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
+            self._flush_task_update()
             _delete_vapp(self.context.client, cluster_vdc_href, cluster_name)
             msg = f"Deleted cluster '{cluster_name}'"
             self._update_task(vcd_client.TaskStatus.SUCCESS, message=msg)
@@ -1024,34 +998,36 @@ class ClusterService(abstract_broker.AbstractBroker):
             if upgrade_k8s:
                 msg = f"Draining master node {master_node_names}"
                 self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
+                self._flush_task_update()
                 _drain_nodes(self.context.sysadmin_client, vapp_href,
                              master_node_names, cluster_name=cluster_name)
 
                 msg = f"Upgrading Kubernetes ({c_k8s} -> {t_k8s}) " \
                       f"in master node {master_node_names}"
                 self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
-                filepath = ltm.get_script_filepath(template_name,
-                                                   template_revision,
-                                                   ScriptFile.MASTER_K8S_UPGRADE) # noqa: E501
-                script = utils.read_data_file(filepath, logger=LOGGER)
+                script = template_script_registry.get_registry().get_script(
+                    template_name, template_revision,
+                    ScriptFile.MASTER_K8S_UPGRADE)
+                self._flush_task_update()
                 run_script_in_nodes(self.context.sysadmin_client, vapp_href,
                                     master_node_names, script)
 
                 msg = f"Uncordoning master node {master_node_names}"
                 self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
+                self._flush_task_update()
                 _uncordon_nodes(self.context.sysadmin_client,
                                 vapp_href,
                                 master_node_names,
                                 cluster_name=cluster_name)
 
-                filepath = ltm.get_script_filepath(template_name,
-                                                   template_revision,
-                                                   ScriptFile.WORKER_K8S_UPGRADE) # noqa: E501
-                script = utils.read_data_file(filepath, logger=LOGGER)
+                script = template_script_registry.get_registry().get_script(
+                    template_name, template_revision,
+                    ScriptFile.WORKER_K8S_UPGRADE)
                 for node in worker_node_names:
                     msg = f"Draining node {node}"
                     self._update_task(vcd_client.TaskStatus.RUNNING,
                                       message=msg)
+                    self._flush_task_update()
                     _drain_nodes(self.context.sysadmin_client,
                                  vapp_href,
                                  [node],
@@ -1061,12 +1037,14 @@ class ClusterService(abstract_broker.AbstractBroker):
                           f"-> {t_k8s}) in node {node}"
                     self._update_task(vcd_client.TaskStatus.RUNNING,
                                       message=msg)
+                    self._flush_task_update()
                     run_script_in_nodes(self.context.sysadmin_client,
                                         vapp_href, [node], script)
 
                     msg = f"Uncordoning node {node}"
                     self._update_task(vcd_client.TaskStatus.RUNNING,
                                       message=msg)
+                    self._flush_task_update()
                     _uncordon_nodes(self.context.sysadmin_client,
                                     vapp_href, [node],
                                     cluster_name=cluster_name)
@@ -1074,6 +1052,7 @@ class ClusterService(abstract_broker.AbstractBroker):
             if upgrade_docker or upgrade_cni:
                 msg = f"Draining all nodes {all_node_names}"
                 self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
+                self._flush_task_update()
                 _drain_nodes(self.context.sysadmin_client,
                              vapp_href, all_node_names,
                              cluster_name=cluster_name)
@@ -1082,10 +1061,10 @@ class ClusterService(abstract_broker.AbstractBroker):
                 msg = f"Upgrading Docker-CE ({c_docker} -> {t_docker}) " \
                       f"in nodes {all_node_names}"
                 self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
-                filepath = ltm.get_script_filepath(template_name,
-                                                   template_revision,
-                                                   ScriptFile.DOCKER_UPGRADE)
-                script = utils.read_data_file(filepath, logger=LOGGER)
+                script = template_script_registry.get_registry().get_script(
+                    template_name, template_revision,
+                    ScriptFile.DOCKER_UPGRADE)
+                self._flush_task_update()
                 run_script_in_nodes(self.context.sysadmin_client, vapp_href,
                                     all_node_names, script)
 
@@ -1093,16 +1072,17 @@ class ClusterService(abstract_broker.AbstractBroker):
                 msg = f"Applying CNI ({cluster['cni']} {c_cni} -> {t_cni}) " \
                       f"in master node {master_node_names}"
                 self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
-                filepath = ltm.get_script_filepath(template_name,
-                                                   template_revision,
-                                                   ScriptFile.MASTER_CNI_APPLY)
-                script = utils.read_data_file(filepath, logger=LOGGER)
+                script = template_script_registry.get_registry().get_script(
+                    template_name, template_revision,
+                    ScriptFile.MASTER_CNI_APPLY)
+                self._flush_task_update()
                 run_script_in_nodes(self.context.sysadmin_client, vapp_href,
                                     master_node_names, script)
 
             # uncordon all nodes (sometimes redundant)
             msg = f"Uncordoning all nodes {all_node_names}"
             self._update_task(vcd_client.TaskStatus.RUNNING, message=msg)
+            self._flush_task_update()
             _uncordon_nodes(self.context.sysadmin_client, vapp_href,
                             all_node_names, cluster_name=cluster_name)
 
@@ -1119,7 +1099,8 @@ class ClusterService(abstract_broker.AbstractBroker):
             }
             vapp = vcd_vapp.VApp(self.context.client, href=vapp_href)
             task = vapp.set_multiple_metadata(metadata)
-            self.context.client.get_task_monitor().wait_for_status(task)
+            self._flush_task_update()
+            task_watcher.wait_for_task(task)
 
             msg = f"Successfully upgraded cluster '{cluster_name}' software " \
                   f"to match template {template_name} (revision " \
@@ -1137,7 +1118,7 @@ class ClusterService(abstract_broker.AbstractBroker):
             self.context.end()
 
     def _update_task(self, status, message='', error_message=None,
-                     stack_trace=''):
+                     stack_trace='', details=''):
         """Update task or create it if it does not exist.
 
         This function should only be used in the x_async functions, or in the
@@ -1152,36 +1133,20 @@ class ClusterService(abstract_broker.AbstractBroker):
         because if any unknown errors occur during an operation, there should
         be a finally clause that takes care of logging out.
         """
-        if not self.context.client.is_sysadmin():
-            stack_trace = ''
-
-        if self.task is None:
-            self.task = vcd_task.Task(self.context.sysadmin_client)
-
-        task_href = None
-        if self.task_resource is not None:
-            task_href = self.task_resource.get('href')
-
-        org = vcd_utils.get_org(self.context.client)
-        user_href = org.get_user(self.context.user.name).get('href')
-
-        self.task_resource = self.task.update(
-            status=status.value,
-            namespace='vcloud.cse',
-            operation=message,
-            operation_name='cluster operation',
-            details='',
-            progress=None,
-            owner_href=self.context.user.org_href,
-            owner_name=self.context.user.org_name,
-            owner_type='application/vnd.vmware.vcloud.org+xml',
-            user_href=user_href,
-            user_name=self.context.user.name,
-            org_href=self.context.user.org_href,
-            task_href=task_href,
-            error_message=error_message,
-            stack_trace=stack_trace
-        )
+        if self.task_reporter is None:
+            self.task_reporter = task_reporter.TaskReporter(self.context)
+        self.task_resource = self.task_reporter.update(
+            status, message=message, error_message=error_message,
+            stack_trace=stack_trace, details=details)
+
+    def _flush_task_update(self):
+        """Send the RUNNING update held back by the task reporter, if any.
+
+        Called before every blocking wait, so that the task shows the step
+        being waited for.
+        """
+        if self.task_reporter is not None:
+            self.task_reporter.flush()
 
 
 def _drain_nodes(sysadmin_client: vcd_client.Client, vapp_href, node_names,
@@ -1239,7 +1204,7 @@ def _delete_vapp(client, vdc_href, vapp_name):
     try:
         vdc = VDC(client, href=vdc_href)
         task = vdc.delete_vapp(vapp_name, force=True)
-        client.get_task_monitor().wait_for_status(task)
+        task_watcher.wait_for_task(task)
     except Exception as err:
         LOGGER.warning(f"Failed to delete vapp {vapp_name} "
                        f"(vdc: {vdc_href}) with error: {err}")
@@ -1273,13 +1238,13 @@ def _delete_nodes(sysadmin_client: vcd_client.Client, vapp_href, node_names,
         vm = vcd_vm.VM(sysadmin_client, resource=vapp.get_vm(vm_name))
         try:
             task = vm.undeploy()
-            sysadmin_client.get_task_monitor().wait_for_status(task)
+            task_watcher.wait_for_task(task)
         except Exception:
             LOGGER.warning(f"Failed to undeploy VM {vm_name} "
                            f"(vapp: {vapp_href})")
 
     task = vapp.delete_vms(node_names)
-    sysadmin_client.get_task_monitor().wait_for_status(task)
+    task_watcher.wait_for_task(task)
     LOGGER.debug(f"Successfully deleted node(s) {node_names} from "
                  f"cluster '{cluster_name}' (vapp: {vapp_href})")
 
@@ -1317,7 +1282,7 @@ def is_valid_cluster_name(name):
 
 
 def get_all_clusters(client, cluster_name=None, cluster_id=None,
-                     org_name=None, ovdc_name=None):
+                     org_name=None, ovdc_name=None, page_size=None):
     """Get list of dictionaries containing data for each visible cluster.
 
     TODO define these cluster data dictionary keys better:
@@ -1326,6 +1291,9 @@ def get_all_clusters(client, cluster_name=None, cluster_id=None,
         'number_of_vms', 'template_name', 'template_revision',
         'cse_version', 'cluster_id', 'status', 'os', 'docker_version',
         'kubernetes', 'kubernetes_version', 'cni', 'cni_version'
+
+    :param int page_size: number of records per page of the underlying
+        typed queries, pyvcloud default if None.
     """
     query_filter = f'metadata:{ClusterMetadataKey.CLUSTER_ID}==STRING:*'
     if cluster_id is not None:
@@ -1343,97 +1311,93 @@ def get_all_clusters(client, cluster_name=None, cluster_id=None,
             query_filter += f";org=={org.resource.get('id')}"
 
     # 2 queries are required because each query can only return 8 metadata
-    q = client.get_typed_query(
+    records = vcd_utils.execute_split_typed_query(
+        client,
         resource_type,
-        query_result_format=vcd_client.QueryResultFormat.ID_RECORDS,
-        qfilter=query_filter,
-        fields=f'metadata:{ClusterMetadataKey.CLUSTER_ID}'
-               f',metadata:{ClusterMetadataKey.MASTER_IP}'
-               f',metadata:{ClusterMetadataKey.CSE_VERSION}'
-               f',metadata:{ClusterMetadataKey.TEMPLATE_NAME}'
-               f',metadata:{ClusterMetadataKey.TEMPLATE_REVISION}'
-               f',metadata:{ClusterMetadataKey.BACKWARD_COMPATIBILE_TEMPLATE_NAME}' # noqa: E501
-               f',metadata:{ClusterMetadataKey.OS}')
-    q2 = client.get_typed_query(
-        resource_type,
-        query_result_format=vcd_client.QueryResultFormat.ID_RECORDS,
-        qfilter=query_filter,
-        fields=f'metadata:{ClusterMetadataKey.DOCKER_VERSION}'
-               f',metadata:{ClusterMetadataKey.KUBERNETES}'
-               f',metadata:{ClusterMetadataKey.KUBERNETES_VERSION}'
-               f',metadata:{ClusterMetadataKey.CNI}'
-               f',metadata:{ClusterMetadataKey.CNI_VERSION}')
-
-    metadata_key_to_cluster_key = {
-        ClusterMetadataKey.CLUSTER_ID: 'cluster_id',
-        ClusterMetadataKey.CSE_VERSION: 'cse_version',
-        ClusterMetadataKey.MASTER_IP: 'leader_endpoint',
-        ClusterMetadataKey.TEMPLATE_NAME: 'template_name',
-        ClusterMetadataKey.TEMPLATE_REVISION: 'template_revision',
-        ClusterMetadataKey.OS: 'os',
-        ClusterMetadataKey.DOCKER_VERSION: 'docker_version',
-        ClusterMetadataKey.KUBERNETES: 'kubernetes',
-        ClusterMetadataKey.KUBERNETES_VERSION: 'kubernetes_version',
-        ClusterMetadataKey.CNI: 'cni',
-        ClusterMetadataKey.CNI_VERSION: 'cni_version'
-    }
-
-    clusters = {}
-    for record in q.execute():
-        vapp_id = record.get('id').split(':')[-1]
-        vdc_id = record.get('vdc').split(':')[-1]
-        vapp_href = f'{client.get_api_uri()}/vApp/vapp-{vapp_id}'
-
-        clusters[vapp_id] = {
-            'name': record.get('name'),
-            'vapp_id': vapp_id,
-            'vapp_href': vapp_href,
-            'vdc_name': record.get('vdcName'),
-            'vdc_href': f'{client.get_api_uri()}/vdc/{vdc_id}',
-            'vdc_id': vdc_id,
-            'leader_endpoint': '',
-            'master_nodes': [],
-            'nodes': [],
-            'nfs_nodes': [],
-            'number_of_vms': record.get('numberOfVMs'),
-            'template_name': '',
-            'template_revision': '',
-            'cse_version': '',
-            'cluster_id': '',
-            'status': record.get('status'),
-            'os': '',
-            'docker_version': '',
-            'kubernetes': '',
-            'kubernetes_version': '',
-            'cni': '',
-            'cni_version': ''
-        }
-
-        if hasattr(record, 'Metadata'):
-            for element in record.Metadata.MetadataEntry:
-                if element.Key in metadata_key_to_cluster_key:
-                    clusters[vapp_id][metadata_key_to_cluster_key[element.Key]] = str(element.TypedValue.Value) # noqa: E501
-                # for pre-2.5.0 cluster backwards compatibility
-                elif element.Key == ClusterMetadataKey.BACKWARD_COMPATIBILE_TEMPLATE_NAME and clusters[vapp_id]['template_name'] == '': # noqa: E501
-                    clusters[vapp_id]['template_name'] = str(element.TypedValue.Value) # noqa: E501
-
+        query_filter,
+        [f'metadata:{ClusterMetadataKey.CLUSTER_ID}'
+         f',metadata:{ClusterMetadataKey.MASTER_IP}'
+         f',metadata:{ClusterMetadataKey.CSE_VERSION}'
+         f',metadata:{ClusterMetadataKey.TEMPLATE_NAME}'
+         f',metadata:{ClusterMetadataKey.TEMPLATE_REVISION}'
+         f',metadata:{ClusterMetadataKey.BACKWARD_COMPATIBILE_TEMPLATE_NAME}' # noqa: E501
+         f',metadata:{ClusterMetadataKey.OS}',
+         f'metadata:{ClusterMetadataKey.DOCKER_VERSION}'
+         f',metadata:{ClusterMetadataKey.KUBERNETES}'
+         f',metadata:{ClusterMetadataKey.KUBERNETES_VERSION}'
+         f',metadata:{ClusterMetadataKey.CNI}'
+         f',metadata:{ClusterMetadataKey.CNI_VERSION}'],
+        page_size=page_size)
+
+    clusters = []
+    for vapp_records in records.values():
+        # all queries return the same record fields besides the metadata
+        cluster = _new_cluster(client, vapp_records[0])
+        for record in vapp_records:
+            _update_cluster_from_metadata(cluster, record)
+        clusters.append(cluster)
+
+    for cluster in clusters:
         # pre-2.6 clusters may not have kubernetes version metadata
-        if clusters[vapp_id]['kubernetes_version'] == '':
-            clusters[vapp_id]['kubernetes_version'] = ltm.get_k8s_version_from_template_name(clusters[vapp_id]['template_name']) # noqa: E501
+        if cluster['kubernetes_version'] == '':
+            cluster['kubernetes_version'] = ltm.get_k8s_version_from_template_name(cluster['template_name']) # noqa: E501
+
+    return clusters
+
+
+_METADATA_KEY_TO_CLUSTER_KEY = {
+    ClusterMetadataKey.CLUSTER_ID: 'cluster_id',
+    ClusterMetadataKey.CSE_VERSION: 'cse_version',
+    ClusterMetadataKey.MASTER_IP: 'leader_endpoint',
+    ClusterMetadataKey.TEMPLATE_NAME: 'template_name',
+    ClusterMetadataKey.TEMPLATE_REVISION: 'template_revision',
+    ClusterMetadataKey.OS: 'os',
+    ClusterMetadataKey.DOCKER_VERSION: 'docker_version',
+    ClusterMetadataKey.KUBERNETES: 'kubernetes',
+    ClusterMetadataKey.KUBERNETES_VERSION: 'kubernetes_version',
+    ClusterMetadataKey.CNI: 'cni',
+    ClusterMetadataKey.CNI_VERSION: 'cni_version'
+}
+
+
+def _new_cluster(client, record):
+    vapp_id = record.get('id').split(':')[-1]
+    vdc_id = record.get('vdc').split(':')[-1]
+    return {
+        'name': record.get('name'),
+        'vapp_id': vapp_id,
+        'vapp_href': f'{client.get_api_uri()}/vApp/vapp-{vapp_id}',
+        'vdc_name': record.get('vdcName'),
+        'vdc_href': f'{client.get_api_uri()}/vdc/{vdc_id}',
+        'vdc_id': vdc_id,
+        'leader_endpoint': '',
+        'master_nodes': [],
+        'nodes': [],
+        'nfs_nodes': [],
+        'number_of_vms': record.get('numberOfVMs'),
+        'template_name': '',
+        'template_revision': '',
+        'cse_version': '',
+        'cluster_id': '',
+        'status': record.get('status'),
+        'os': '',
+        'docker_version': '',
+        'kubernetes': '',
+        'kubernetes_version': '',
+        'cni': '',
+        'cni_version': ''
+    }
 
-    # api query can fetch only 8 metadata at a time
-    # since we have more than 8 metadata, we need to use 2 queries
-    for record in q2.execute():
-        vapp_id = record.get('id').split(':')[-1]
-        if hasattr(record, 'Metadata'):
-            for element in record.Metadata.MetadataEntry:
-                if element.Key in metadata_key_to_cluster_key:
-                    clusters[vapp_id][metadata_key_to_cluster_key[element.Key]] = str(element.TypedValue.Value) # noqa: E501
-                # for pre-2.5.0 cluster backwards compatibility
-                elif element.Key == ClusterMetadataKey.BACKWARD_COMPATIBILE_TEMPLATE_NAME and clusters[vapp_id]['template_name'] == '': # noqa: E501
-                    clusters[vapp_id]['template_name'] = str(element.TypedValue.Value) # noqa: E501
 
-    return list(clusters.values())
+def _update_cluster_from_metadata(cluster, record):
+    if not hasattr(record, 'Metadata'):
+        return
+    for element in record.Metadata.MetadataEntry:
+        if element.Key in _METADATA_KEY_TO_CLUSTER_KEY:
+            cluster[_METADATA_KEY_TO_CLUSTER_KEY[element.Key]] = str(element.TypedValue.Value) # noqa: E501
+        # for pre-2.5.0 cluster backwards compatibility
+        elif element.Key == ClusterMetadataKey.BACKWARD_COMPATIBILE_TEMPLATE_NAME and cluster['template_name'] == '': # noqa: E501
+            cluster['template_name'] = str(element.TypedValue.Value)
 
 
 def get_cluster(client, cluster_name, cluster_id=None, org_name=None,
@@ -1469,6 +1433,79 @@ def add_nodes(sysadmin_client, num_nodes, node_type, org, vdc, vapp,
     vcd_utils.raise_error_if_not_sysadmin(sysadmin_client)
 
     specs = []
+    try:
+        specs = clone_nodes(sysadmin_client,
+                            [(node_type, num_nodes, storage_profile)],
+                            org=org,
+                            vdc=vdc,
+                            vapp=vapp,
+                            catalog_name=catalog_name,
+                            template=template,
+                            network_name=network_name,
+                            num_cpu=num_cpu,
+                            memory_in_mb=memory_in_mb,
+                            ssh_key=ssh_key)[node_type]
+        vm_names = [spec['target_vm_name'] for spec in specs]
+        tasks = power_on_nodes(sysadmin_client, vapp, vm_names)
+        task = tasks[-1] if tasks else None
+
+        if node_type == NodeType.NFS:
+            vapp.reload()
+            enable_nfs_server(sysadmin_client, vapp, template, vm_names)
+    except e.NodeCreationError:
+        raise
+    except Exception as err:
+        # TODO: get details of the exception to determine cause of failure,
+        # e.g. not enough resources available.
+        node_list = [entry.get('target_vm_name') for entry in specs]
+        raise e.NodeCreationError(node_list, str(err))
+
+    vapp.reload()
+    return {'task': task, 'specs': specs}
+
+
+def clone_nodes(sysadmin_client, nodes, org, vdc, vapp, catalog_name,
+                template, network_name, num_cpu=None, memory_in_mb=None,
+                ssh_key=None):
+    """Clone the VMs of new nodes into a cluster vApp.
+
+    The VMs of all nodes are added by a single recompose of the vApp, since
+    vCD doesn't run several recomposes of a vApp at the same time. CPU and
+    memory of the VMs are set by the recompose as well, so the VMs don't
+    need to be reconfigured afterwards, unless the source VM lacks a CPU or
+    memory item to size them with. The VMs are left powered off, see
+    power_on_nodes(). Node names are allocated by the node name allocator,
+    against the VMs in the vApp.
+
+    :param pyvcloud.vcd.client.Client sysadmin_client:
+    :param list nodes: tuples of NodeType, number of nodes and name of the
+        storage profile (or None), one for every type of node to add.
+    :param pyvcloud.vcd.org.Org org:
+    :param pyvcloud.vcd.vdc.VDC vdc:
+    :param pyvcloud.vcd.vapp.VApp vapp:
+    :param str catalog_name:
+    :param dict template:
+    :param str network_name:
+    :param int num_cpu: number of CPUs, as in the template if None.
+    :param int memory_in_mb: memory in MB, as in the template if None.
+    :param str ssh_key:
+
+    :return: dict of NodeType to the specs of the VMs added for that type.
+
+    :rtype: dict
+
+    :raises NodeCreationError: if the VMs can't be added.
+    """
+    vcd_utils.raise_error_if_not_sysadmin(sysadmin_client)
+    if not num_cpu:
+        num_cpu = template[LocalTemplateKey.CPU]
+    if not memory_in_mb:
+        memory_in_mb = template[LocalTemplateKey.MEMORY]
+
+    specs = {}
+    all_specs = []
+    allocator = node_name_allocator.get_allocator()
+    allocated_names = []
     try:
         # DEV NOTE: With api v33.0 and onwards, get_catalog operation will fail
         # for non admin users of an an org which is not hosting the catalog,
@@ -1489,9 +1526,8 @@ def add_nodes(sysadmin_client, num_nodes, node_type, org, vdc, vapp,
         catalog_item_href = catalog_item.Entity.get('href')
 
         source_vapp = vcd_vapp.VApp(sysadmin_client, href=catalog_item_href)
-        source_vm = source_vapp.get_all_vms()[0].get('name')
-        if storage_profile is not None:
-            storage_profile = vdc.get_storage_profile(storage_profile)
+        source_vm_resource = source_vapp.get_all_vms()[0]
+        source_vm = source_vm_resource.get('name')
 
         cust_script = None
         if ssh_key is not None:
@@ -1505,75 +1541,342 @@ def add_nodes(sysadmin_client, num_nodes, node_type, org, vdc, vapp,
                 "fi"
 
         vapp.reload()
-        for n in range(num_nodes):
-            name = None
-            while True:
-                name = f"{node_type}-{''.join(random.choices(string.ascii_lowercase + string.digits, k=4))}" # noqa: E501
-                try:
-                    vapp.get_vm(name)
-                except Exception:
-                    break
-            spec = {
-                'source_vm_name': source_vm,
-                'vapp': source_vapp.resource,
-                'target_vm_name': name,
-                'hostname': name,
-                'password_auto': True,
-                'network': network_name,
-                'ip_allocation_mode': 'pool'
-            }
-            if cust_script is not None:
-                spec['cust_script'] = cust_script
+        existing_names = {vm.get('name') for vm in vapp.get_all_vms()}
+        for node_type, num_nodes, storage_profile in nodes:
             if storage_profile is not None:
-                spec['storage_profile'] = storage_profile
-            specs.append(spec)
-
-        task = vapp.add_vms(specs, power_on=False)
-        sysadmin_client.get_task_monitor().wait_for_status(task)
+                storage_profile = vdc.get_storage_profile(storage_profile)
+            specs[node_type] = []
+            names = allocator.allocate(vapp.href, existing_names, node_type,
+                                       num_nodes)
+            allocated_names.extend(names)
+            for name in names:
+                spec = {
+                    'source_vm_name': source_vm,
+                    'vapp': source_vapp.resource,
+                    'target_vm_name': name,
+                    'hostname': name,
+                    'password_auto': True,
+                    'network': network_name,
+                    'ip_allocation_mode': 'pool'
+                }
+                if cust_script is not None:
+                    spec['cust_script'] = cust_script
+                if storage_profile is not None:
+                    spec['storage_profile'] = storage_profile
+                specs[node_type].append(spec)
+                all_specs.append(spec)
+
+        hardware_section = _get_virtual_hardware_section(
+            source_vm_resource, num_cpu, memory_in_mb)
+        task = _add_vms(vapp, all_specs, hardware_section)
+        task_watcher.wait_for_task(task)
         vapp.reload()
+        if hardware_section is None:
+            _reconfigure_vms(sysadmin_client, vapp,
+                             [spec['target_vm_name'] for spec in all_specs],
+                             num_cpu, memory_in_mb)
+        # remember where the new VMs are in vCenter, so that executing scripts
+        # in them doesn't need to look them up in vCD
+        sysadmin_vapp = vcd_vapp.VApp(sysadmin_client, href=vapp.href)
+        for spec in all_specs:
+            vs_utils.cache_vm_location(sysadmin_client, sysadmin_vapp,
+                                       spec['target_vm_name'])
+    except Exception as err:
+        allocator.release(vapp.href, allocated_names)
+        # TODO: get details of the exception to determine cause of failure,
+        # e.g. not enough resources available.
+        node_list = [entry.get('target_vm_name') for entry in all_specs]
+        raise e.NodeCreationError(node_list, str(err))
 
-        if not num_cpu:
-            num_cpu = template[LocalTemplateKey.CPU]
-        if not memory_in_mb:
-            memory_in_mb = template[LocalTemplateKey.MEMORY]
-        for spec in specs:
-            vm_name = spec['target_vm_name']
-            vm_resource = vapp.get_vm(vm_name)
-            vm = vcd_vm.VM(sysadmin_client, resource=vm_resource)
+    return specs
 
-            task = vm.modify_cpu(num_cpu)
-            sysadmin_client.get_task_monitor().wait_for_status(task)
 
-            task = vm.modify_memory(memory_in_mb)
-            sysadmin_client.get_task_monitor().wait_for_status(task)
+def _get_virtual_hardware_section(source_vm_resource, num_cpu, memory_in_mb):
+    """Get the virtual hardware section to clone a VM with.
 
-            task = vm.power_on()
-            sysadmin_client.get_task_monitor().wait_for_status(task)
-            vapp.reload()
+    The CPU and memory items of the source VM are copied, with their
+    quantities replaced by @num_cpu and @memory_in_mb. vCD accepts a
+    VirtualHardwareSection in the InstantiationParams of the SourcedItem of
+    a recompose since vCloud API 5.1.
 
-            if node_type == NodeType.NFS:
-                LOGGER.debug(f"Enabling NFS server on {vm_name}")
-                script_filepath = ltm.get_script_filepath(
-                    template[LocalTemplateKey.NAME],
-                    template[LocalTemplateKey.REVISION],
-                    ScriptFile.NFSD)
-                script = utils.read_data_file(script_filepath, logger=LOGGER)
-                exec_results = execute_script_in_nodes(
-                    sysadmin_client, vapp=vapp, node_names=[vm_name],
-                    script=script)
-                errors = get_script_execution_errors(exec_results)
-                if errors:
-                    raise e.ScriptExecutionError(
-                        f"VM customization script execution failed "
-                        f"on node {vm_name}:{errors}")
-    except Exception as err:
-        # TODO: get details of the exception to determine cause of failure,
-        # e.g. not enough resources available.
-        node_list = [entry.get('target_vm_name') for entry in specs]
-        raise e.NodeCreationError(node_list, str(err))
+    :return: the section, or None if the source VM lacks the CPU or the
+        memory item, in which case the VMs need to be reconfigured after
+        the recompose, see _reconfigure_vms().
 
-    vapp.reload()
-    return {'task': task, 'specs': specs}
+    :rtype: lxml.objectify.ObjectifiedElement
+    """
+    rasd = '{' + vcd_client.NSMAP['rasd'] + '}'
+    vmw = '{' + vcd_client.NSMAP['vmw'] + '}'
+    section = vcd_client.E_OVF.VirtualHardwareSection(
+        vcd_client.E_OVF.Info('Virtual hardware requirements'))
+    items = source_vm_resource.xpath(
+        'ovf:VirtualHardwareSection/ovf:Item',
+        namespaces={'ovf': vcd_client.NSMAP['ovf']})
+    for item in items:
+        if item[rasd + 'ResourceType'] == 3:
+            item = copy.deepcopy(item)
+            item[rasd + 'ElementName'] = f"{num_cpu} virtual CPU(s)"
+            item[rasd + 'VirtualQuantity'] = num_cpu
+            item[vmw + 'CoresPerSocket'] = num_cpu
+            section.append(item)
+        elif item[rasd + 'ResourceType'] == 4:
+            item = copy.deepcopy(item)
+            item[rasd + 'ElementName'] = f"{memory_in_mb} MB of memory"
+            item[rasd + 'VirtualQuantity'] = memory_in_mb
+            section.append(item)
+    if len(section.xpath('ovf:Item',
+                         namespaces={'ovf': vcd_client.NSMAP['ovf']})) < 2:
+        return None
+    return section
+
+
+def _reconfigure_vms(sysadmin_client, vapp, vm_names, num_cpu, memory_in_mb):
+    """Set CPU and memory of VMs, one reconfigure task per VM at a time.
+
+    vCD runs only one task on a VM at a time, so the CPU of all VMs is set
+    first and their memory afterwards, each as a single batch of tasks.
+
+    :param pyvcloud.vcd.client.Client sysadmin_client:
+    :param pyvcloud.vcd.vapp.VApp vapp:
+    :param List[str] vm_names:
+    :param int num_cpu:
+    :param int memory_in_mb:
+    """
+    vms = [vcd_vm.VM(sysadmin_client, resource=vapp.get_vm(vm_name))
+           for vm_name in vm_names]
+    task_watcher.wait_for_tasks([vm.modify_cpu(num_cpu) for vm in vms])
+    task_watcher.wait_for_tasks(
+        [vm.modify_memory(memory_in_mb) for vm in vms])
+
+
+def _add_vms(vapp, specs, hardware_section):
+    """Recompose a vApp to add powered off VMs with the given hardware.
+
+    Same as vapp.add_vms(specs, power_on=False), except that
+    @hardware_section, if any, is added to the instantiation params of
+    every VM.
+
+    :return: recompose task.
+
+    :rtype: lxml.objectify.ObjectifiedElement
+    """
+    params = vcd_client.E.RecomposeVAppParams(deploy='true', powerOn='false')
+    for spec in specs:
+        sourced_item = vapp.to_sourced_item(spec)
+        if hardware_section is not None:
+            sourced_item.InstantiationParams.append(
+                copy.deepcopy(hardware_section))
+        params.append(sourced_item)
+    return vapp.client.post_linked_resource(
+        vapp.resource, vcd_client.RelationType.RECOMPOSE,
+        vcd_client.EntityType.RECOMPOSE_VAPP_PARAMS.value, params)
+
+
+def power_on_nodes(sysadmin_client, vapp, vm_names):
+    """Power on the VMs of nodes as a single batch.
+
+    Power on tasks of all VMs are started right away and waited for
+    together.
+
+    :param pyvcloud.vcd.client.Client sysadmin_client:
+    :param pyvcloud.vcd.vapp.VApp vapp:
+    :param List[str] vm_names:
+
+    :return: final power on tasks, in the order of @vm_names.
+
+    :rtype: list
+    """
+    tasks = []
+    for vm_name in vm_names:
+        vm = vcd_vm.VM(sysadmin_client, resource=vapp.get_vm(vm_name))
+        tasks.append(vm.power_on())
+    return task_watcher.wait_for_tasks(tasks)
+
+
+def enable_nfs_server(sysadmin_client, vapp, template, vm_names):
+    """Set up powered on NFS nodes as NFS servers.
+
+    :param pyvcloud.vcd.client.Client sysadmin_client:
+    :param pyvcloud.vcd.vapp.VApp vapp:
+    :param dict template:
+    :param List[str] vm_names:
+    """
+    LOGGER.debug(f"Enabling NFS server on {vm_names}")
+    script = template_script_registry.get_registry().get_script(
+        template[LocalTemplateKey.NAME],
+        template[LocalTemplateKey.REVISION],
+        ScriptFile.NFSD)
+    exec_results = execute_script_in_nodes(
+        sysadmin_client, vapp=vapp, node_names=vm_names, script=script)
+    errors = get_script_execution_errors(exec_results)
+    if errors:
+        raise e.ScriptExecutionError(
+            f"VM customization script execution failed "
+            f"on node {vm_names}:{errors}")
+
+
+def create_cluster_nodes(sysadmin_client, org, vdc, vapp, catalog_name,
+                         template, network_name, num_workers,
+                         enable_nfs=False, num_cpu=None, memory_in_mb=None,
+                         master_storage_profile=None,
+                         worker_storage_profile=None, ssh_key=None,
+                         timings=None, progress_callback=None):
+    """Create the nodes of a new cluster and set up Kubernetes on them.
+
+    Instead of running one phase after the other, every node moves on as
+    soon as the phases it depends on are done:
+    - the VMs of all nodes are cloned together, see clone_nodes(), and the
+      power on of all of them is started at once.
+    - the master node is initialized as soon as it is powered on.
+    - every worker node joins the cluster as soon as it is powered on and
+      the join token has been created on the master node.
+    - NFS nodes are set up as soon as they are powered on.
+    The master node is set up on the calling thread, worker and NFS nodes on
+    a thread pool sized by 'node_script_workers' of the service config, with
+    a sys admin client of their own each.
+
+    :param pyvcloud.vcd.client.Client sysadmin_client:
+    :param pyvcloud.vcd.org.Org org:
+    :param pyvcloud.vcd.vdc.VDC vdc:
+    :param pyvcloud.vcd.vapp.VApp vapp: cluster vApp, without any node yet.
+    :param str catalog_name:
+    :param dict template:
+    :param str network_name:
+    :param int num_workers:
+    :param bool enable_nfs: if True, add an NFS node too.
+    :param int num_cpu:
+    :param int memory_in_mb:
+    :param str master_storage_profile:
+    :param str worker_storage_profile: storage profile of worker and NFS
+        nodes.
+    :param str ssh_key:
+    :param task_reporter.PhaseTimings timings: records the time spent in
+        every phase.
+    :param callable progress_callback: called with a message whenever a
+        phase starts.
+
+    :return: IP of the master node.
+
+    :rtype: str
+    """
+    vcd_utils.raise_error_if_not_sysadmin(sysadmin_client)
+    if timings is None:
+        timings = task_reporter.PhaseTimings()
+    template_name = template[LocalTemplateKey.NAME]
+    template_revision = template[LocalTemplateKey.REVISION]
+
+    def report(message):
+        if progress_callback is not None:
+            progress_callback(message)
+
+    nodes = [(NodeType.MASTER, 1, master_storage_profile),
+             (NodeType.WORKER, num_workers, worker_storage_profile)]
+    if enable_nfs:
+        nodes.append((NodeType.NFS, 1, worker_storage_profile))
+    num_nodes = sum(num for _, num, _ in nodes)
+    report(f"Creating {num_nodes} node(s)")
+    with timings.measure('clone'):
+        specs = clone_nodes(sysadmin_client, nodes,
+                            org=org,
+                            vdc=vdc,
+                            vapp=vapp,
+                            catalog_name=catalog_name,
+                            template=template,
+                            network_name=network_name,
+                            num_cpu=num_cpu,
+                            memory_in_mb=memory_in_mb,
+                            ssh_key=ssh_key)
+    names = {node_type: [spec['target_vm_name'] for spec in node_specs]
+             for node_type, node_specs in specs.items()}
+
+    report(f"Powering on {num_nodes} node(s)")
+    # every node waits for the power on task of its own VM only
+    watcher = task_watcher.get_watcher()
+    power_ons = {}
+    for vm_name in [name for node_names in names.values()
+                    for name in node_names]:
+        try:
+            vm = vcd_vm.VM(sysadmin_client, resource=vapp.get_vm(vm_name))
+            power_ons[vm_name] = watcher.watch(vm.power_on())
+        except Exception as err:
+            raise e.NodeCreationError([vm_name], str(err))
+
+    def wait_for_power_on(vm_name):
+        try:
+            power_ons[vm_name].result(timeout=task_watcher.DEFAULT_TIMEOUT)
+        except Exception as err:
+            raise e.NodeCreationError([vm_name], str(err))
+
+    join_info_future = Future()
+
+    def set_up_worker(vm_name):
+        with timings.measure('worker setup'):
+            wait_for_power_on(vm_name)
+        join_info = join_info_future.result()
+        with _lease_vapp(vapp.href) as worker_vapp:
+            with timings.measure('join'):
+                _join_nodes(worker_vapp.client, worker_vapp, template_name,
+                            template_revision, join_info, [vm_name])
+
+    def set_up_nfs(vm_name):
+        try:
+            with timings.measure('nfs setup'):
+                wait_for_power_on(vm_name)
+                with _lease_vapp(vapp.href) as nfs_vapp:
+                    enable_nfs_server(nfs_vapp.client, nfs_vapp, template,
+                                      [vm_name])
+        except Exception as err:
+            raise e.NFSNodeCreationError("Error creating NFS node:",
+                                         str(err))
+
+    max_workers = utils.get_server_runtime_config()['service'].get(
+        'node_script_workers', DEFAULT_NODE_SCRIPT_WORKERS)
+    num_node_chains = len(names[NodeType.WORKER]) + len(names[NodeType.NFS])
+    with ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, num_node_chains))) \
+            as executor:
+        futures = [executor.submit(set_up_nfs, vm_name)
+                   for vm_name in names[NodeType.NFS]]
+        futures.extend(executor.submit(set_up_worker, vm_name)
+                       for vm_name in names[NodeType.WORKER])
+
+        try:
+            with timings.measure('master setup'):
+                wait_for_power_on(names[NodeType.MASTER][0])
+            master_vapp = vcd_vapp.VApp(sysadmin_client, href=vapp.href)
+            report("Initializing master node")
+            with timings.measure('init'):
+                init_cluster(sysadmin_client, master_vapp, template_name,
+                             template_revision)
+                join_info = _get_join_info(sysadmin_client, master_vapp)
+        except Exception as err:
+            # worker nodes waiting for the join token give up
+            join_info_future.set_exception(err)
+            raise
+        join_info_future.set_result(join_info)
+        if names[NodeType.WORKER]:
+            report(f"Joining {num_workers} node(s)")
+
+        for future in futures:
+            future.result()
+    return join_info[1]
+
+
+@contextlib.contextmanager
+def _lease_vapp(vapp_href):
+    """Lease a sys admin client and get a vApp of its own.
+
+    pyvcloud clients and vApps aren't thread safe, so every thread that
+    works on a vApp needs both of its own.
+
+    :param str vapp_href:
+
+    :return: vApp whose client is the leased sys admin client.
+
+    :rtype: pyvcloud.vcd.vapp.VApp
+    """
+    with sysadmin_client_pool.get_pool().leased_client() as sysadmin_client:
+        yield vcd_vapp.VApp(sysadmin_client, href=vapp_href)
 
 
 def get_node_names(vapp, node_type):
@@ -1619,10 +1922,8 @@ def init_cluster(sysadmin_client: vcd_client.Client, vapp, template_name,
     vcd_utils.raise_error_if_not_sysadmin(sysadmin_client)
 
     try:
-        script_filepath = ltm.get_script_filepath(template_name,
-                                                  template_revision,
-                                                  ScriptFile.MASTER)
-        script = utils.read_data_file(script_filepath, logger=LOGGER)
+        script = template_script_registry.get_registry().get_script(
+            template_name, template_revision, ScriptFile.MASTER)
         node_names = get_node_names(vapp, NodeType.MASTER)
         result = execute_script_in_nodes(sysadmin_client, vapp=vapp,
                                          node_names=node_names, script=script)
@@ -1642,6 +1943,22 @@ def init_cluster(sysadmin_client: vcd_client.Client, vapp, template_name,
 def join_cluster(sysadmin_client: vcd_client.Client, vapp, template_name,
                  template_revision, target_nodes=None):
     vcd_utils.raise_error_if_not_sysadmin(sysadmin_client)
+    init_info = _get_join_info(sysadmin_client, vapp)
+
+    node_names = get_node_names(vapp, NodeType.WORKER)
+    if target_nodes is not None:
+        node_names = [name for name in node_names if name in target_nodes]
+    _join_nodes(sysadmin_client, vapp, template_name, template_revision,
+                init_info, node_names)
+
+
+def _get_join_info(sysadmin_client, vapp):
+    """Create a join token on the master node.
+
+    :return: the join token and the IP of the master node.
+
+    :rtype: list
+    """
     script = "#!/usr/bin/env bash\n" \
              "kubeadm token create\n" \
              "ip route get 1 | awk '{print $NF;exit}'\n"
@@ -1653,16 +1970,15 @@ def join_cluster(sysadmin_client: vcd_client.Client, vapp, template_name,
     if errors:
         raise e.ScriptExecutionError(f"Join cluster script execution failed "
                                      f"on master node {node_names}:{errors}")
-    init_info = master_result[0][1].content.decode().split()
+    return master_result[0][1].content.decode().split()
 
-    node_names = get_node_names(vapp, NodeType.WORKER)
-    if target_nodes is not None:
-        node_names = [name for name in node_names if name in target_nodes]
-    tmp_script_filepath = ltm.get_script_filepath(template_name,
-                                                  template_revision,
-                                                  ScriptFile.NODE)
-    tmp_script = utils.read_data_file(tmp_script_filepath, logger=LOGGER)
-    script = tmp_script.format(token=init_info[0], ip=init_info[1])
+
+def _join_nodes(sysadmin_client, vapp, template_name, template_revision,
+                init_info, node_names):
+    script_template = \
+        template_script_registry.get_registry().get_script_template(
+            template_name, template_revision, ScriptFile.NODE)
+    script = script_template.format(token=init_info[0], ip=init_info[1])
     worker_results = execute_script_in_nodes(sysadmin_client, vapp=vapp,
                                              node_names=node_names,
                                              script=script)
@@ -1676,11 +1992,12 @@ def join_cluster(sysadmin_client: vcd_client.Client, vapp, template_name,
                                         f"\n{result[2].content.decode()}")
 
 
-def _wait_until_ready_to_exec(vs, vm, password, tries=30):
-    ready = False
+def _wait_until_ready_to_exec(vs, vm, password, timeout=EXEC_READY_TIMEOUT):
+    deadline = time.time() + timeout
+    interval = MIN_EXEC_READY_INTERVAL
     script = "#!/usr/bin/env bash\n" \
              "uname -a\n"
-    for _ in range(tries):
+    while True:
         result = vs.execute_script_in_guest(
             vm, 'root', password, script,
             target_file=None,
@@ -1690,37 +2007,85 @@ def _wait_until_ready_to_exec(vs, vm, password, tries=30):
             delete_script=True,
             callback=_wait_for_guest_execution_callback)
         if result[0] == 0:
-            ready = True
-            break
+            return
         LOGGER.info(f"Script returned {result[0]}; VM is not "
                     f"ready to execute scripts, yet")
-        time.sleep(2)
-
-    if not ready:
-        raise e.CseServerError('VM is not ready to execute scripts')
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise e.CseServerError('VM is not ready to execute scripts')
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, MAX_EXEC_READY_INTERVAL)
 
 
 def execute_script_in_nodes(sysadmin_client: vcd_client.Client,
                             vapp, node_names, script,
-                            check_tools=True, wait=True):
+                            check_tools=True, wait=True, max_workers=None):
+    """Execute a script in nodes, in several nodes at a time.
+
+    :param pyvcloud.vcd.client.Client sysadmin_client:
+    :param pyvcloud.vcd.vapp.VApp vapp:
+    :param List[str] node_names:
+    :param str script:
+    :param bool check_tools: if True, wait for VMware tools of the nodes to
+        be ready before executing the script.
+    :param bool wait: if True, wait for the script to finish.
+    :param int max_workers: maximum number of nodes the script is executed
+        in concurrently, 'node_script_workers' of the service config if None.
+
+    :return: results of the script execution, in the order of @node_names.
+
+    :rtype: list
+    """
     vcd_utils.raise_error_if_not_sysadmin(sysadmin_client)
-    all_results = []
-    for node_name in node_names:
-        LOGGER.debug(f"will try to execute script on {node_name}:\n"
-                     f"{script}")
+    if max_workers is None:
+        max_workers = utils.get_server_runtime_config()['service'].get(
+            'node_script_workers', DEFAULT_NODE_SCRIPT_WORKERS)
+    node_names = list(node_names)
+    if check_tools:
+        # one waiter for all nodes, instead of polling every node separately
+        LOGGER.debug(f"waiting for tools on {node_names}")
+        not_ready = vs_utils.wait_until_guests_ready(
+            sysadmin_client, vapp, node_names,
+            callback=_wait_for_tools_ready_callback,
+            timeout=GUEST_TOOLS_READY_TIMEOUT)
+        if not_ready:
+            raise e.CseServerError(f"VMware Tools are not running in "
+                                   f"node(s) {not_ready}")
+    if len(node_names) <= 1 or max_workers <= 1:
+        return [_execute_script_in_node(sysadmin_client, vapp, node_name,
+                                        script, check_tools, wait)
+                for node_name in node_names]
+
+    with ThreadPoolExecutor(
+            max_workers=min(max_workers, len(node_names))) as executor:
+        futures = [executor.submit(_execute_script_in_node_concurrently,
+                                   vapp.href, node_name, script, check_tools,
+                                   wait)
+                   for node_name in node_names]
+        return [future.result() for future in futures]
+
+
+def _execute_script_in_node_concurrently(vapp_href, node_name, script,
+                                         check_tools, wait):
+    # pyvcloud clients and vApps aren't thread safe, so every node gets a
+    # sys admin client and a vApp of its own
+    with sysadmin_client_pool.get_pool().leased_client() as sysadmin_client:
+        vapp = vcd_vapp.VApp(sysadmin_client, href=vapp_href)
+        return _execute_script_in_node(sysadmin_client, vapp, node_name,
+                                       script, check_tools, wait)
+
 
-        vs = vs_utils.get_vsphere(sysadmin_client, vapp, vm_name=node_name,
-                                  logger=LOGGER)
-        vs.connect()
-        moid = vapp.get_vm_moid(node_name)
+def _execute_script_in_node(sysadmin_client, vapp, node_name, script,
+                            check_tools, wait):
+    LOGGER.debug(f"will try to execute script on {node_name}:\n"
+                 f"{script}")
+
+    with vs_utils.vsphere_session(sysadmin_client, vapp, node_name,
+                                  logger=LOGGER) as vs:
+        moid = vs_utils.get_vm_moid(sysadmin_client, vapp, node_name)
         vm = vs.get_vm_by_moid(moid)
         password = vapp.get_admin_password(node_name)
         if check_tools:
-            LOGGER.debug(f"waiting for tools on {node_name}")
-            vs.wait_until_tools_ready(
-                vm,
-                sleep=5,
-                callback=_wait_for_tools_ready_callback)
             _wait_until_ready_to_exec(vs, vm, password)
         LOGGER.debug(f"about to execute script on {node_name} "
                      f"(vm={vm}), wait={wait}")
@@ -1746,9 +2111,7 @@ def execute_script_in_nodes(sysadmin_client: vcd_client.Client,
         LOGGER.debug(result[0])
         LOGGER.debug(result_stderr)
         LOGGER.debug(result_stdout)
-        all_results.append(result)
-
-    return all_results
+    return result
 
 
 def run_script_in_nodes(sysadmin_client: vcd_client.Client, vapp_href,
@@ -8,11 +8,15 @@ from typing import List
 from container_service_extension.cloudapi.cloudapi_client import CloudApiClient
 from container_service_extension.cloudapi.constants import CLOUDAPI_VERSION_1_0_0  # noqa: E501
 from container_service_extension.cloudapi.constants import CloudApiResource
+from container_service_extension.cloudapi.constants import MAX_PAGE_SIZE
 from container_service_extension.def_.models import DefEntity
 import container_service_extension.def_.utils as def_utils
 import container_service_extension.exceptions as cse_exception
 from container_service_extension.shared_constants import RequestMethod
 
+# Maximum number of entity pages fetched concurrently by list operations
+MAX_PAGE_FETCH_WORKERS = 4
+
 
 # TODO(DEF) Exception handling
 class DefEntityService():
@@ -46,19 +50,12 @@ class DefEntityService():
         :return: Generator of defined entities
         :rtype: Generator[DefEntity]
         """
-        page_num = 0
-        while True:
-            page_num += 1
-            response_body = self._cloudapi_client.do_request(
-                method=RequestMethod.GET,
+        for entity in self._cloudapi_client.iterate_pages(
                 cloudapi_version=CLOUDAPI_VERSION_1_0_0,
-                resource_url_relative_path=f"{CloudApiResource.ENTITIES}?"
-                                           f"page={page_num}")
-            if len(response_body['values']) > 0:
-                for entity in response_body['values']:
-                    yield DefEntity(**entity)
-            else:
-                break
+                resource_url_relative_path=CloudApiResource.ENTITIES,
+                page_size=MAX_PAGE_SIZE,
+                max_workers=MAX_PAGE_FETCH_WORKERS):
+            yield DefEntity(**entity)
 
     def list_entities_by_interface(self, vendor: str, nss: str, version: str):
         """List entities of a given interface.
@@ -74,20 +71,13 @@ class DefEntityService():
         """
         # TODO Yet to be verified. Waiting for the build from Extensibility
         #  team.
-        page_num = 0
-        while True:
-            page_num += 1
-            response_body = self._cloudapi_client.do_request(
-                method=RequestMethod.GET,
+        for entity in self._cloudapi_client.iterate_pages(
                 cloudapi_version=CLOUDAPI_VERSION_1_0_0,
                 resource_url_relative_path=f"{CloudApiResource.ENTITIES}/"
-                                           f"{CloudApiResource.INTERFACES}/{vendor}/{nss}/{version}?"  # noqa: E501
-                                           f"page={page_num}")
-            if len(response_body['values']) > 0:
-                for entity in response_body['values']:
-                    yield DefEntity(**entity)
-            else:
-                break
+                                           f"{CloudApiResource.INTERFACES}/{vendor}/{nss}/{version}",  # noqa: E501
+                page_size=MAX_PAGE_SIZE,
+                max_workers=MAX_PAGE_FETCH_WORKERS):
+            yield DefEntity(**entity)
 
     def list_entities_by_entity_type(self, vendor: str, nss: str,
                                      version: str) -> List[DefEntity]:
@@ -104,19 +94,13 @@ class DefEntityService():
         """
         # TODO Yet to be verified. Waiting for the build from
         #  Extensibility team.
-        page_num = 0
-        while True:
-            page_num += 1
-            response_body = self._cloudapi_client.do_request(
-                method=RequestMethod.GET,
+        for entity in self._cloudapi_client.iterate_pages(
                 cloudapi_version=CLOUDAPI_VERSION_1_0_0,
                 resource_url_relative_path=f"{CloudApiResource.ENTITIES}/"
-                                           f"{vendor}/{nss}/{version}?page={page_num}")  # noqa: E501
-            if len(response_body['values']) > 0:
-                for entity in response_body['values']:
-                    yield DefEntity(**entity)
-            else:
-                break
+                                           f"{vendor}/{nss}/{version}",
+                page_size=MAX_PAGE_SIZE,
+                max_workers=MAX_PAGE_FETCH_WORKERS):
+            yield DefEntity(**entity)
 
     def update_entity(self, entity_id: str, entity: DefEntity) -> DefEntity:
         """Update entity instance.
@@ -28,19 +28,10 @@ class DefSchemaService():
         :return: Generator of interfaces
         :rtype: Generator
         """
-        page_num = 0
-        while True:
-            page_num += 1
-            response_body = self._cloudapi_client.do_request(
-                method=RequestMethod.GET,
+        for interface in self._cloudapi_client.iterate_pages(
                 cloudapi_version=CLOUDAPI_VERSION_1_0_0,
-                resource_url_relative_path=f"{CloudApiResource.INTERFACES}?"
-                f"page={page_num}")
-            if len(response_body['values']) > 0:
-                for interface in response_body['values']:
-                    yield def_models.DefInterface(**interface)
-            else:
-                break
+                resource_url_relative_path=CloudApiResource.INTERFACES):
+            yield def_models.DefInterface(**interface)
 
     def get_interface(self, id: str) -> def_models.DefInterface:
         """Get the interface given an id.
@@ -130,19 +121,10 @@ class DefSchemaService():
         :return: Generator of entity types
         :rtype: Generator[DefEntityType]
         """
-        page_num = 0
-        while True:
-            page_num += 1
-            response_body = self._cloudapi_client.do_request(
-                method=RequestMethod.GET,
+        for entityType in self._cloudapi_client.iterate_pages(
                 cloudapi_version=CLOUDAPI_VERSION_1_0_0,
-                resource_url_relative_path=f"{CloudApiResource.ENTITY_TYPES}?"
-                f"page={page_num}")
-            if len(response_body['values']) > 0:
-                for entityType in response_body['values']:
-                    yield def_models.DefEntityType(**entityType)
-            else:
-                break
+                resource_url_relative_path=CloudApiResource.ENTITY_TYPES):
+            yield def_models.DefEntityType(**entityType)
 
     def update_entity_type(self, entity_type: def_models.DefEntityType) -> def_models.DefEntityType:  # noqa: E501
         """Update the entity type.
@@ -0,0 +1,132 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import random
+import re
+import string
+import threading
+import time
+
+from container_service_extension.server_constants import NodeNaming
+from container_service_extension.utils import get_server_runtime_config
+
+# Number of random characters suffixed to the node type by NodeNaming.RANDOM
+RANDOM_SUFFIX_LENGTH = 4
+# Minimum number of digits of the number suffixed by NodeNaming.SEQUENTIAL
+SEQUENTIAL_SUFFIX_DIGITS = 4
+# Seconds for which allocated names stay reserved. Long enough for the VMs
+# to show up in every later snapshot of the vApp.
+RESERVATION_TTL = 3600
+
+_allocator = None
+_allocator_pid = None
+_allocator_lock = threading.Lock()
+
+
+class NodeNameAllocator(object):
+    """Allocates unique names for new nodes of clusters.
+
+    Names are picked against a snapshot of the VM names of the cluster vApp
+    taken by the caller, so allocating names takes no vCD calls. Allocated
+    names stay reserved for RESERVATION_TTL seconds, so that concurrent
+    operations on the same cluster never pick the same name, even if one
+    of them took its snapshot before the VMs of the other were added.
+
+    Reservations are kept per server process. Random names of different
+    processes are unlikely to collide, but NodeNaming.SEQUENTIAL picks the
+    same next number in every process, which is why the server refuses to
+    run multiple worker processes with sequential naming.
+    """
+
+    def __init__(self):
+        # vApp href -> {name: reservation expiry time}
+        self._reserved = {}
+        self._lock = threading.Lock()
+
+    def allocate(self, vapp_href, existing_names, node_type, count,
+                 naming=None):
+        """Allocate names for new nodes of a cluster.
+
+        :param str vapp_href: href of the cluster vApp.
+        :param set existing_names: names of the VMs in the vApp.
+        :param NodeType node_type:
+        :param int count: number of names to allocate.
+        :param NodeNaming naming: 'node_naming' of the service config if
+            None.
+
+        :return: the allocated names.
+
+        :rtype: list
+        """
+        if naming is None:
+            naming = get_server_runtime_config()['service'].get(
+                'node_naming', NodeNaming.RANDOM)
+        with self._lock:
+            reserved = self._get_reserved(vapp_href)
+            taken = set(existing_names) | reserved.keys()
+            if naming == NodeNaming.SEQUENTIAL:
+                names = _get_sequential_names(taken, node_type, count)
+            else:
+                names = _get_random_names(taken, node_type, count)
+            expiry_time = time.time() + RESERVATION_TTL
+            for name in names:
+                reserved[name] = expiry_time
+        return names
+
+    def release(self, vapp_href, names):
+        """Release names of nodes that weren't created.
+
+        :param str vapp_href: href of the cluster vApp.
+        :param list names:
+        """
+        with self._lock:
+            reserved = self._get_reserved(vapp_href)
+            for name in names:
+                reserved.pop(name, None)
+
+    def _get_reserved(self, vapp_href):
+        now = time.time()
+        for href in list(self._reserved):
+            reserved = self._reserved[href]
+            for name in [n for n, t in reserved.items() if t <= now]:
+                del reserved[name]
+            if not reserved and href != vapp_href:
+                del self._reserved[href]
+        return self._reserved.setdefault(vapp_href, {})
+
+
+def _get_random_names(taken, node_type, count):
+    names = []
+    taken = set(taken)
+    while len(names) < count:
+        suffix = ''.join(random.choices(string.ascii_lowercase + string.digits,
+                                        k=RANDOM_SUFFIX_LENGTH))
+        name = f"{node_type.value}-{suffix}"
+        if name not in taken:
+            taken.add(name)
+            names.append(name)
+    return names
+
+
+def _get_sequential_names(taken, node_type, count):
+    pattern = re.compile(rf"{re.escape(node_type.value)}-(\d+)")
+    numbers = [int(match.group(1))
+               for match in map(pattern.fullmatch, taken) if match]
+    start = max(numbers, default=0) + 1
+    return [f"{node_type.value}-{number:0{SEQUENTIAL_SUFFIX_DIGITS}d}"
+            for number in range(start, start + count)]
+
+
+def get_allocator():
+    """Get the node name allocator of the current process.
+
+    :rtype: NodeNameAllocator
+    """
+    global _allocator, _allocator_pid
+    with _allocator_lock:
+        if _allocator is None or _allocator_pid != os.getpid():
+            _allocator = NodeNameAllocator()
+            _allocator_pid = os.getpid()
+        return _allocator
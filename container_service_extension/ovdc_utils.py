@@ -21,6 +21,7 @@ from container_service_extension.server_constants import PKS_CLUSTER_DOMAIN_KEY
 from container_service_extension.server_constants import PKS_COMPUTE_PROFILE_KEY # noqa: E501
 from container_service_extension.server_constants import PKS_PLANS_KEY
 from container_service_extension.shared_constants import RequestKey
+import container_service_extension.sysadmin_client_pool as sysadmin_client_pool # noqa: E501
 import container_service_extension.utils as utils
 
 
@@ -73,18 +74,13 @@ def get_ovdc_k8s_provider_metadata(sysadmin_client: vcd_client.Client,
 
 
 def get_all_ovdc_with_metadata():
-    client = None
-    try:
-        client = vcd_utils.get_sys_admin_client()
+    with sysadmin_client_pool.get_pool().leased_client() as client:
         q = client.get_typed_query(
             vcd_client.ResourceType.ADMIN_ORG_VDC.value,
             query_result_format=vcd_client.QueryResultFormat.RECORDS,
             fields='metadata@SYSTEM:k8s_provider')
-        ovdc_records = q.execute()
+        ovdc_records = list(q.execute())
         return ovdc_records
-    finally:
-        if client is not None:
-            client.logout()
 
 
 def update_ovdc_k8s_provider_metadata(sysadmin_client: vcd_client.Client,
@@ -40,8 +40,6 @@ from container_service_extension.pksclient.models.compute_profile_request \
 from container_service_extension.pksclient.models.update_cluster_parameters \
     import UpdateClusterParameters
 from container_service_extension.pksclient.rest import ApiException
-from container_service_extension.pyvcloud_utils import \
-    get_org_name_from_ovdc_id
 import container_service_extension.request_context as ctx
 import container_service_extension.request_handlers.request_utils as req_utils
 from container_service_extension.server_constants import \
@@ -53,6 +51,7 @@ from container_service_extension.server_constants import SYSTEM_ORG_NAME
 from container_service_extension.shared_constants import RequestKey
 from container_service_extension.uaaclient.uaaclient import UaaClient
 import container_service_extension.utils as utils
+import container_service_extension.vdc_index as vdc_index
 
 
 # Delimiter to append with user id context
@@ -840,8 +839,7 @@ class PksBroker(AbstractBroker):
             return False
         vdc_id = self._extract_vdc_id_from_pks_compute_profile_name(
             compute_profile_name)
-        return org_name == get_org_name_from_ovdc_id(
-            self.context.sysadmin_client, vdc_id)
+        return org_name == vdc_index.get_index().get_org_name(vdc_id)
 
     def _apply_vdc_filter(self, cluster_list, vdc_name):
         return [cluster_info for cluster_info in cluster_list if self._does_cluster_belong_to_vdc(cluster_info, vdc_name)] # noqa: E501
@@ -883,8 +881,8 @@ class PksBroker(AbstractBroker):
         pks_cluster['vdc'] = ''
         if compute_profile_name:
             vdc_id = self._extract_vdc_id_from_pks_compute_profile_name(compute_profile_name)  # noqa: E501
-            pks_cluster['org_name'] = get_org_name_from_ovdc_id(
-                self.context.sysadmin_client, vdc_id)
+            pks_cluster['org_name'] = \
+                vdc_index.get_index().get_org_name(vdc_id)
             pks_cluster['vdc'] = self._extract_vdc_name_from_pks_compute_profile_name(compute_profile_name)  # noqa: E501
 
         pks_cluster['status'] = \
@@ -2,6 +2,7 @@
 # Copyright (c) 2019 VMware, Inc. All Rights Reserved.
 # SPDX-License-Identifier: BSD-2-Clause
 
+from concurrent.futures import ThreadPoolExecutor
 import pathlib
 
 import pyvcloud.vcd.client as vcd_client
@@ -9,7 +10,6 @@ from pyvcloud.vcd.exceptions import EntityNotFoundException
 import pyvcloud.vcd.org as vcd_org
 from pyvcloud.vcd.utils import extract_id
 from pyvcloud.vcd.utils import get_admin_href
-import pyvcloud.vcd.vapp as vcd_vapp
 from pyvcloud.vcd.vdc import VDC
 import requests
 
@@ -23,11 +23,13 @@ from container_service_extension.utils import NullPrinter
 from container_service_extension.utils import str_to_bool
 
 
-# Cache to keep ovdc_id to org_name mapping for vcd cse cluster list
-OVDC_TO_ORG_MAP = {}
 ORG_ADMIN_RIGHTS = ['General: Administrator Control',
                     'General: Administrator View']
 
+# Maximum number of entities read by a single typed query filtered on their
+# ids, which keeps the id filter of the query URL within limits
+MAX_IDS_PER_QUERY = 50
+
 
 def raise_error_if_not_sysadmin(client: vcd_client.Client):
     if not client.is_sysadmin():
@@ -35,6 +37,16 @@ def raise_error_if_not_sysadmin(client: vcd_client.Client):
 
 
 def connect_vcd_user_via_token(tenant_auth_token, is_jwt_token):
+    client_tenant = get_tenant_client()
+    client_tenant.rehydrate_from_token(tenant_auth_token, is_jwt_token)
+    return client_tenant
+
+
+def get_tenant_client():
+    """Get a vCD client that is not logged in yet, as per server config.
+
+    :rtype: pyvcloud.vcd.client.Client
+    """
     server_config = get_server_runtime_config()
     vcd_uri = server_config['vcd']['host']
     version = server_config['vcd']['api_version']
@@ -43,7 +55,7 @@ def connect_vcd_user_via_token(tenant_auth_token, is_jwt_token):
     log_wire = str_to_bool(server_config['service'].get('log_wire'))
     if log_wire:
         log_filename = SERVER_DEBUG_WIRELOG_FILEPATH
-    client_tenant = vcd_client.Client(
+    return vcd_client.Client(
         uri=vcd_uri,
         api_version=version,
         verify_ssl_certs=verify_ssl_certs,
@@ -51,8 +63,24 @@ def connect_vcd_user_via_token(tenant_auth_token, is_jwt_token):
         log_requests=log_wire,
         log_headers=log_wire,
         log_bodies=log_wire)
-    client_tenant.rehydrate_from_token(tenant_auth_token, is_jwt_token)
-    return client_tenant
+
+
+def copy_client(client):
+    """Get another vCD client, logged in with the vCD session of @client.
+
+    pyvcloud clients aren't thread safe, the copy can be used on another
+    thread alongside @client. The copy shares the vCD session of @client, so
+    it must not be logged out.
+
+    :param pyvcloud.vcd.client.Client client: logged in client.
+
+    :rtype: pyvcloud.vcd.client.Client
+    """
+    token = client.get_access_token()
+    is_jwt_token = token is not None
+    if not is_jwt_token:
+        token = client.get_xvcloud_authorization_token()
+    return connect_vcd_user_via_token(token, is_jwt_token)
 
 
 def get_sys_admin_client():
@@ -153,9 +181,10 @@ def get_vdc(client, vdc_id=None, vdc_name=None, org=None, org_name=None,
 
 
 def get_org_name_from_ovdc_id(sysadmin_client: vcd_client.Client, vdc_id):
-    """Get org_name from vdc_id using OVDC_TO_ORG_MAP.
+    """Get org_name from vdc_id.
 
-    Update OVDC_TO_ORG_MAP for new {org_name:vdc_id} pair
+    Looks up the vdc in vCD, use vdc_index.get_index().get_org_name() to
+    have it served from the in-memory VDC index instead.
 
     :param vdc_id: unique ovdc id
 
@@ -165,9 +194,6 @@ def get_org_name_from_ovdc_id(sysadmin_client: vcd_client.Client, vdc_id):
     """
     raise_error_if_not_sysadmin(sysadmin_client)
 
-    if vdc_id in OVDC_TO_ORG_MAP:
-        return OVDC_TO_ORG_MAP.get(vdc_id)
-
     vdc_href = f"{sysadmin_client.get_api_uri()}/vdc/{vdc_id}"
     vdc_resource = sysadmin_client.get_resource(get_admin_href(vdc_href))
     vdc_obj = VDC(sysadmin_client, resource=vdc_resource)
@@ -176,7 +202,6 @@ def get_org_name_from_ovdc_id(sysadmin_client: vcd_client.Client, vdc_id):
         vcd_client.RelationType.UP,
         vcd_client.EntityType.ADMIN_ORG.value)
     org = vcd_org.Org(sysadmin_client, href=link.href)
-    OVDC_TO_ORG_MAP[vdc_id] = org.get_name()
     return org.get_name()
 
 
@@ -418,29 +443,100 @@ def wait_for_catalog_item_to_resolve(client, catalog_name, catalog_item_name,
     client.get_task_monitor().wait_for_success(resource.Tasks.Task[0])
 
 
-def get_all_vapps_in_ovdc(client, ovdc_id):
-    resource_type = vcd_client.ResourceType.VAPP.value
+def get_vms_in_ovdc(client, ovdc_id, vm_ids):
+    """Get those of the given VMs that are in an org VDC.
+
+    The VMs are read by typed queries filtered on their ids, at most
+    MAX_IDS_PER_QUERY VMs per query.
+
+    :param pyvcloud.vcd.client.Client client:
+    :param str ovdc_id: UUID of the org VDC.
+    :param list vm_ids: UUIDs of the VMs.
+
+    :return: Generator that yields the VM query records, projected to the
+        'name' of the VM along with its 'href'.
+
+    :rtype: Generator[lxml.objectify.ObjectifiedElement, None, None]
+    """
+    resource_type = vcd_client.ResourceType.VM.value
     if client.is_sysadmin():
-        resource_type = vcd_client.ResourceType.ADMIN_VAPP.value
+        resource_type = vcd_client.ResourceType.ADMIN_VM.value
+
+    vm_ids = list(vm_ids)
+    for i in range(0, len(vm_ids), MAX_IDS_PER_QUERY):
+        id_filter = ','.join(f"id==urn:vcloud:vm:{vm_id}"
+                             for vm_id in vm_ids[i:i + MAX_IDS_PER_QUERY])
+        q = client.get_typed_query(
+            resource_type,
+            query_result_format=vcd_client.QueryResultFormat.RECORDS,
+            qfilter=f'isVAppTemplate==false;({id_filter})',
+            equality_filter=('vdc', f"{client.get_api_uri()}/vdc/{ovdc_id}"),
+            fields='name')
+        yield from q.execute()
+
 
-    q = client.get_typed_query(
-        resource_type,
-        query_result_format=vcd_client.QueryResultFormat.RECORDS,
-        equality_filter=('vdc', f"{client.get_api_uri()}/vdc/{ovdc_id}")
-    )
+def execute_split_typed_query(client, query_type_name, qfilter, fields,
+                              page_size=None):
+    """Execute a typed query whose fields are split across several queries.
 
-    vapps = []
-    for record in q.execute():
-        vapp = vcd_vapp.VApp(client, href=record.get('href'))
-        vapp.reload()
-        vapps.append(vapp)
+    A typed query returns at most 8 metadata entries per record, so the
+    metadata is read by several queries with the same filter, each returning
+    a part of the fields. The first query is executed on @client, the others
+    concurrently, on copies of @client.
 
-    return vapps
+    :param pyvcloud.vcd.client.Client client:
+    :param str query_type_name:
+    :param str qfilter:
+    :param list fields: comma separated fields of every query.
+    :param int page_size: number of records per page of the queries,
+        pyvcloud default if None.
+
+    :return: dict of entity id to the records of the entity, one per query
+        that returned it. Entities are in the order of the first query, the
+        ones only returned by other queries come last, e.g. entities that
+        started to match the filter in between the queries.
+
+    :rtype: dict
+    """
+    def get_query(query_client, query_fields):
+        return query_client.get_typed_query(
+            query_type_name,
+            query_result_format=vcd_client.QueryResultFormat.ID_RECORDS,
+            page_size=page_size,
+            qfilter=qfilter,
+            fields=query_fields)
+
+    def execute_other_query(query_fields):
+        return list(get_query(copy_client(client), query_fields).execute())
+
+    records = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(fields) - 1)) as executor:
+        other_futures = [executor.submit(execute_other_query, query_fields)
+                         for query_fields in fields[1:]]
+        for record in get_query(client, fields[0]).execute():
+            records.setdefault(record.get('id'), []).append(record)
+        for future in other_futures:
+            for record in future.result():
+                records.setdefault(record.get('id'), []).append(record)
+    return records
 
 
 def get_cloudapi_client_from_vcd_client(client: vcd_client.Client,
                                         logger_debug=NULL_LOGGER,
-                                        logger_wire=NULL_LOGGER):
+                                        logger_wire=NULL_LOGGER,
+                                        service_config=None):
+    """Get a cloudapi client logged in with the vCD session of @client.
+
+    :param pyvcloud.vcd.client.Client client:
+    :param logging.Logger logger_debug:
+    :param logging.Logger logger_wire:
+    :param dict service_config: 'service' section of the server config, to
+        read the connection pool size and retry settings of the client from.
+        The CloudApiClient defaults are used if None.
+
+    :rtype: container_service_extension.cloudapi.cloudapi_client.CloudApiClient
+    """
+    service_config = service_config or {}
     token = client.get_access_token()
     is_jwt = True
     if not token:
@@ -453,4 +549,7 @@ def get_cloudapi_client_from_vcd_client(client: vcd_client.Client,
                                          logger_debug=logger_debug,
                                          logger_wire=logger_wire,
                                          verify_ssl=client._verify_ssl_certs,
-                                         is_sys_admin=client.is_sysadmin())
+                                         is_sys_admin=client.is_sysadmin(),
+                                         pool_size=service_config.get('cloudapi_pool_size', cloudApiClient.DEFAULT_POOL_SIZE), # noqa: E501
+                                         max_retries=service_config.get('cloudapi_max_retries', cloudApiClient.DEFAULT_MAX_RETRIES), # noqa: E501
+                                         backoff_factor=service_config.get('cloudapi_backoff_factor', cloudApiClient.DEFAULT_BACKOFF_FACTOR)) # noqa: E501
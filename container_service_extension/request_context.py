@@ -3,6 +3,7 @@ import pyvcloud.vcd.client as vcd_client
 import container_service_extension.cloudapi.cloudapi_client as cloudApiClient
 import container_service_extension.logger as logger
 import container_service_extension.pyvcloud_utils as vcd_utils
+import container_service_extension.tenant_session_cache as tenant_session_cache # noqa: E501
 import container_service_extension.user_context as user_context
 import container_service_extension.utils as utils
 
@@ -14,6 +15,9 @@ class RequestContext:
         self._auth_token: str = auth_token
         self._is_jwt: bool = is_jwt
 
+        # Cached tenant session of user auth token
+        self._tenant_session: tenant_session_cache.TenantSession = None
+
         # vCD API client from user auth token
         self._client: vcd_client.Client = None
 
@@ -35,33 +39,43 @@ class RequestContext:
         self.body: dict = request_body
         self.query_params: dict = request_query_params
 
+    @property
+    def tenant_session(self):
+        if self._tenant_session is None:
+            self._tenant_session = tenant_session_cache.get_cache().get(
+                self._auth_token, self._is_jwt)
+        return self._tenant_session
+
     @property
     def client(self):
         if self._client is None:
-            self._client = vcd_utils.connect_vcd_user_via_token(
-                tenant_auth_token=self._auth_token,
-                is_jwt_token=self._is_jwt)
+            # a client of its own for each request, since pyvcloud clients
+            # are not thread safe
+            self._client = tenant_session_cache.new_client(
+                self.tenant_session, self._auth_token, self._is_jwt)
         return self._client
 
     @property
     def cloudapi_client(self):
         if self._cloudapi_client is None:
-            log_wire = utils.get_server_runtime_config() \
-                            .get('service', {}).get('log_wire', False)
+            service_config = \
+                utils.get_server_runtime_config().get('service', {})
             logger_wire = logger.NULL_LOGGER
-            if log_wire:
+            if service_config.get('log_wire', False):
                 logger_wire = logger.SERVER_CLOUDAPI_WIRE_LOGGER
             self._cloudapi_client = \
                 vcd_utils.get_cloudapi_client_from_vcd_client(self.client,
                                                               logger.SERVER_LOGGER, # noqa: E501
-                                                              logger_wire)
+                                                              logger_wire,
+                                                              service_config=service_config) # noqa: E501
         return self._cloudapi_client
 
     @property
     def user(self):
         if self._user is None:
-            self._user = user_context.UserContext(self.client,
-                                                  self.cloudapi_client)
+            self._user = user_context.UserContext(
+                self.client, self.cloudapi_client,
+                tenant_session=self.tenant_session)
         return self._user
 
     @property
@@ -72,5 +86,10 @@ class RequestContext:
     def sysadmin_cloudapi_client(self):
         return self.user.sysadmin_cloudapi_client
 
-    def end(self):
-        self.user.end()
+    def evict_tenant_session(self):
+        """Drop the cached session of the auth token, e.g. after a 401."""
+        tenant_session_cache.get_cache().evict(self._auth_token)
+        self._tenant_session = None
+
+    def end(self, error=None):
+        self.user.end(error=error)
@@ -5,6 +5,7 @@
 import container_service_extension.exceptions as e
 import container_service_extension.request_context as ctx
 import container_service_extension.request_handlers.request_utils as req_utils
+import container_service_extension.rights_cache as rights_cache
 from container_service_extension.shared_constants import RequestKey
 from container_service_extension.telemetry.constants import CseOperation
 from container_service_extension.telemetry.constants import OperationStatus
@@ -53,6 +54,8 @@ def system_update(request_data, request_context: ctx.RequestContext):
         try:
             result = service.Service().update_status(
                 request_data.get(RequestKey.SERVER_ACTION))
+            # let updated roles take effect without waiting for the cache ttl
+            rights_cache.invalidate()
             status = OperationStatus.SUCCESS
             return result
         finally:
@@ -24,6 +24,7 @@ from container_service_extension.shared_constants import OperationType
 from container_service_extension.shared_constants import RequestKey
 from container_service_extension.shared_constants import RequestMethod
 from container_service_extension.shared_constants import RESPONSE_MESSAGE_KEY
+import container_service_extension.tenant_session_cache as tenant_session_cache
 
 """Process incoming requests
 
@@ -165,14 +166,21 @@ def process_request(body):
 
     is_def_request = def_utils.is_def_supported_by_cse_server() and _is_def_endpoint(body['requestUri'])  # noqa: E501
 
+    error = None
     try:
         if is_def_request:
             body_content = def_handler.OPERATION_TO_METHOD[operation](context)  # noqa: E501
         else:
             body_content = OPERATION_TO_HANDLER[operation](data, context)
+    except Exception as err:
+        error = err
+        # token is no longer accepted by vCD, don't serve it from cache
+        if tenant_session_cache.is_unauthorized_error(err):
+            context.evict_tenant_session()
+        raise
     finally:
         if not context.is_async:
-            context.end()
+            context.end(error=error)
 
     if not isinstance(body_content, (list, dict)):
         body_content = {RESPONSE_MESSAGE_KEY: str(body_content)}
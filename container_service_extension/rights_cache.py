@@ -0,0 +1,88 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import multiprocessing
+import os
+import threading
+
+import cachetools
+
+from container_service_extension.utils import get_server_runtime_config
+
+# Maximum number of (org, role) entries kept by the cache
+DEFAULT_CACHE_SIZE = 1024
+# Seconds after which the rights of a role are fetched from vCD again
+DEFAULT_CACHE_TTL = 300
+
+# Bumped on invalidation. Created at import time, i.e. before the server
+# forks worker processes, so that an invalidation in any process is seen by
+# all of them.
+_generation = multiprocessing.Value('i', 0)
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+class RightsCache(object):
+    """Thread safe TTL cache of role rights keyed by (org href, role name)."""
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self._cache = cachetools.TTLCache(maxsize=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self._generation = _generation.value
+
+    def get_rights(self, org_href, role_name, load_rights):
+        """Get the rights of a role, loading them on a cache miss.
+
+        :param str org_href: href of the org that the role belongs to.
+        :param str role_name: name of the role.
+        :param method load_rights: called without arguments on a cache miss,
+            returns the names of the rights of the role.
+
+        :return: names of the rights of the role.
+
+        :rtype: frozenset
+        """
+        key = (org_href, role_name)
+        with self._lock:
+            self._clear_if_invalidated()
+            rights = self._cache.get(key)
+            if rights is not None:
+                return rights
+            generation = self._generation
+
+        rights = frozenset(load_rights())
+        with self._lock:
+            # don't cache rights that were loaded before an invalidation
+            if generation == self._generation:
+                self._cache[key] = rights
+        return rights
+
+    def _clear_if_invalidated(self):
+        generation = _generation.value
+        if generation != self._generation:
+            self._cache.clear()
+            self._generation = generation
+
+
+def invalidate():
+    """Drop the cached rights in all server processes."""
+    with _generation.get_lock():
+        _generation.value += 1
+
+
+def get_cache():
+    """Get the rights cache of the current process.
+
+    :rtype: RightsCache
+    """
+    global _cache, _cache_pid
+    with _cache_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            service_config = get_server_runtime_config()['service']
+            _cache = RightsCache(
+                ttl=service_config.get('rights_cache_ttl', DEFAULT_CACHE_TTL))
+            _cache_pid = os.getpid()
+        return _cache
@@ -104,6 +104,19 @@ SAMPLE_VCS_CONFIG = {
 SAMPLE_SERVICE_CONFIG = {
     'service': {
         'listeners': 10,
+        'consumer_backend': 'select',
+        'processors': 0,
+        'cloudapi_pool_size': 10,
+        'cloudapi_max_retries': 3,
+        'cloudapi_backoff_factor': 0.5,
+        'node_naming': 'random',
+        'node_script_workers': 8,
+        'policy_update_workers': 8,
+        'rights_cache_ttl': 300,
+        'sysadmin_pool_size': 10,
+        'task_update_window': 2,
+        'tenant_session_cache_size': 256,
+        'tenant_session_cache_ttl': 300,
         'enforce_authorization': False,
         'log_wire': False,
         'telemetry': {
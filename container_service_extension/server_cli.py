@@ -619,8 +619,17 @@ def install(ctx, config_file_path, pks_config_file_path,
     '--skip-config-decryption',
     is_flag=True,
     help='Skip decryption of CSE/PKS config file')
+@click.option(
+    '-w',
+    '--workers',
+    'num_workers',
+    default=1,
+    type=click.IntRange(min=1),
+    metavar='NUM_WORKERS',
+    help='Number of worker processes that serve requests. Each worker runs '
+         'its own set of listeners (default: 1)')
 def run(ctx, config_file_path, pks_config_file_path, skip_check,
-        skip_config_decryption):
+        skip_config_decryption, num_workers):
     """Run CSE service."""
     SERVER_CLI_LOGGER.debug(f"Executing command: {ctx.command_path}")
     console_message_printer = ConsoleMessagePrinter()
@@ -639,7 +648,8 @@ def run(ctx, config_file_path, pks_config_file_path, skip_check,
                               pks_config_file=pks_config_file_path,
                               should_check_config=not skip_check,
                               skip_config_decryption=skip_config_decryption,
-                              decryption_password=password)
+                              decryption_password=password,
+                              num_workers=num_workers)
             service.run(msg_update_callback=console_message_printer)
             cse_run_complete = True
         except requests.exceptions.SSLError as err:
@@ -50,6 +50,17 @@ CSE_GLOBAL_PVDC_COMPUTE_POLICY_DESCRIPTION = 'global PVDC compute policy for' \
                                              'cse'
 CLUSTER_PLACEMENT_POLICIES = ['native', 'tkg_plus']
 
+# Default number of nodes a script is executed in concurrently
+DEFAULT_NODE_SCRIPT_WORKERS = 8
+# Bounds of the interval between two checks of a node being ready to execute
+# scripts, in seconds
+MIN_EXEC_READY_INTERVAL = 0.5
+MAX_EXEC_READY_INTERVAL = 8
+# Seconds to wait for a node to be ready to execute scripts
+EXEC_READY_TIMEOUT = 60
+# Seconds to wait for VMware Tools to run in nodes before executing scripts
+GUEST_TOOLS_READY_TIMEOUT = 600
+
 
 @unique
 class NodeType(str, Enum):
@@ -58,6 +69,28 @@ class NodeType(str, Enum):
     NFS = 'nfsd'
 
 
+@unique
+class ConsumerBackend(str, Enum):
+    """Types of AMQP consumer implementations the server can run."""
+
+    # one pika SelectConnection ioloop thread per listener
+    SELECT = 'select'
+    # all listeners share one asyncio event loop
+    ASYNCIO = 'asyncio'
+
+
+@unique
+class NodeNaming(str, Enum):
+    """Schemes by which names of new cluster nodes are generated."""
+
+    # random 4 character suffix, e.g. node-x7k2
+    RANDOM = 'random'
+    # next free number of the node type in the cluster, e.g. node-0003.
+    # Numbers are only reserved within a server process, so this scheme
+    # can't be used with multiple worker processes.
+    SEQUENTIAL = 'sequential'
+
+
 @unique
 class K8sProvider(str, Enum):
     """Types of Kubernetes providers.
@@ -78,6 +111,8 @@ class KwargKey(str, Enum):
 
     DATA = 'data'
     TELEMETRY = 'telemetry'
+    # read the cluster from vCD instead of the cluster inventory
+    FRESH = 'fresh'
 
 
 @unique
@@ -2,8 +2,11 @@
 # Copyright (c) 2017 VMware, Inc. All Rights Reserved.
 # SPDX-License-Identifier: BSD-2-Clause
 
+import asyncio
 from enum import Enum
 from enum import unique
+import multiprocessing
+import os
 import platform
 import signal
 import sys
@@ -20,11 +23,14 @@ from pyvcloud.vcd.client import Client
 from pyvcloud.vcd.exceptions import EntityNotFoundException
 from pyvcloud.vcd.exceptions import OperationNotSupportedException
 
+import container_service_extension.asyncio_consumer as asyncio_consumer
+import container_service_extension.cluster_inventory as cluster_inventory
 import container_service_extension.compute_policy_manager \
     as compute_policy_manager
 from container_service_extension.config_validator import get_validated_config
 from container_service_extension.configure_cse import check_cse_installation
 from container_service_extension.consumer import MessageConsumer
+from container_service_extension.consumer import RequestProcessorPool
 import container_service_extension.def_.models as def_models
 import container_service_extension.def_.schema_svc as def_schema_svc
 import container_service_extension.def_.utils as def_utils
@@ -34,9 +40,13 @@ import container_service_extension.local_template_manager as ltm
 import container_service_extension.logger as logger
 from container_service_extension.pks_cache import PksCache
 import container_service_extension.pyvcloud_utils as vcd_utils
+from container_service_extension.server_constants import ConsumerBackend
 from container_service_extension.server_constants import LocalTemplateKey
+from container_service_extension.server_constants import NodeNaming
 from container_service_extension.server_constants import SYSTEM_ORG_NAME
 from container_service_extension.shared_constants import ServerAction
+import container_service_extension.sysadmin_client_pool as sysadmin_client_pool # noqa: E501
+import container_service_extension.task_watcher as task_watcher
 from container_service_extension.telemetry.constants import CseOperation
 from container_service_extension.telemetry.constants import PayloadKey
 from container_service_extension.telemetry.telemetry_handler \
@@ -44,8 +54,11 @@ from container_service_extension.telemetry.telemetry_handler \
 from container_service_extension.telemetry.telemetry_handler import \
     record_user_action_details
 from container_service_extension.template_rule import TemplateRule
+import container_service_extension.template_script_registry as template_script_registry # noqa: E501
+import container_service_extension.tenant_session_cache as tenant_session_cache # noqa: E501
 import container_service_extension.utils as utils
-from container_service_extension.vsphere_utils import populate_vsphere_list
+import container_service_extension.vdc_index as vdc_index
+import container_service_extension.vsphere_utils as vs_utils
 
 
 class Singleton(type):
@@ -81,10 +94,18 @@ class ServerState(Enum):
     STOPPED = 'Stopped'
 
 
+# Server states are shared with worker processes by their index in this list
+_SERVER_STATES = list(ServerState)
+
+# Seconds to wait for a worker process to exit once it has been asked to stop
+WORKER_STOP_TIMEOUT = 60
+
+
 class Service(object, metaclass=Singleton):
     def __init__(self, config_file, pks_config_file=None,
                  should_check_config=True,
-                 skip_config_decryption=False, decryption_password=None):
+                 skip_config_decryption=False, decryption_password=None,
+                 num_workers=1):
         self.config_file = config_file
         self.pks_config_file = pks_config_file
         self.config = None
@@ -93,8 +114,20 @@ class Service(object, metaclass=Singleton):
         self.decryption_password = decryption_password
         self.consumers = []
         self.threads = []
+        self._consumer_loop = None
+        self._processor_pool = None
         self.pks_cache = None
-        self._state = ServerState.STOPPED
+        self.num_workers = num_workers
+        self.workers = []
+        # Server state lives in shared memory so that state transitions made
+        # by any worker process (via system_update) apply to all of them.
+        self._shared_state = multiprocessing.Value(
+            'i', _SERVER_STATES.index(ServerState.STOPPED))
+        # Per worker process count of requests in progress; None if server
+        # is not running in multi-process mode.
+        self._worker_request_counts = None
+        # Index of this process in self.workers; None in the supervisor.
+        self._worker_index = None
         self._nativeInterface: def_models.DefInterface = None
         self._nativeEntityType: def_models.DefEntityType = None
 
@@ -107,14 +140,28 @@ class Service(object, metaclass=Singleton):
     def is_pks_enabled(self):
         return bool(self.pks_cache)
 
+    @property
+    def _state(self):
+        return _SERVER_STATES[self._shared_state.value]
+
+    @_state.setter
+    def _state(self, state):
+        self._shared_state.value = _SERVER_STATES.index(state)
+
     def active_requests_count(self):
+        """Get number of requests in progress across all worker processes."""
         n = 0
         # TODO(request_count) Add support for PksBroker - VCDA-938
         for t in threading.enumerate():
             from container_service_extension.vcdbroker import VcdBroker
             if type(t) == VcdBroker:
                 n += 1
-        return n
+        if self._worker_request_counts is None:
+            return n
+        if self._worker_index is not None:
+            self._worker_request_counts[self._worker_index] = n
+            n = 0
+        return n + sum(self._worker_request_counts)
 
     def get_status(self):
         return self._state.value
@@ -126,9 +173,24 @@ class Service(object, metaclass=Singleton):
         result = Service.version()
         if get_sysadmin_info:
             result['consumer_threads'] = len(self.threads)
+            result['worker_processes'] = self.num_workers
             result['all_threads'] = threading.activeCount()
             result['requests_in_progress'] = self.active_requests_count()
             result['config_file'] = self.config_file
+            result['sysadmin_session_pool'] = \
+                sysadmin_client_pool.get_pool().get_stats()
+            result['tenant_session_cache'] = \
+                tenant_session_cache.get_cache().get_stats()
+            result['vdc_index'] = vdc_index.get_index().get_stats()
+            result['cluster_inventory'] = \
+                cluster_inventory.get_inventory().get_stats()
+            result['task_watcher'] = task_watcher.get_watcher().get_stats()
+            result['vsphere_session_pool'] = \
+                vs_utils.get_session_pool().get_stats()
+            result['vm_location_cache'] = \
+                vs_utils.vm_location_cache.get_stats()
+            result['template_script_registry'] = \
+                template_script_registry.get_registry().get_stats()
             result['status'] = self.get_status()
         else:
             del result['python']
@@ -151,6 +213,11 @@ class Service(object, metaclass=Singleton):
         }
 
     def update_status(self, server_action: ServerAction):
+        # state transition must be atomic across worker processes
+        with self._shared_state.get_lock():
+            return self._update_status(server_action)
+
+    def _update_status(self, server_action: ServerAction):
         def graceful_shutdown():
             message = 'Shutting down CSE'
             n = self.active_requests_count()
@@ -203,7 +270,14 @@ class Service(object, metaclass=Singleton):
             logger_debug=logger.SERVER_LOGGER,
             msg_update_callback=msg_update_callback)
 
-        populate_vsphere_list(self.config['vcs'])
+        # node names are reserved per process, see NodeNameAllocator
+        node_naming = self.config['service'].get('node_naming')
+        if self.num_workers > 1 and node_naming == NodeNaming.SEQUENTIAL:
+            raise ValueError(f"Node naming '{node_naming}' is not supported "
+                             f"with multiple worker processes")
+
+        vs_utils.populate_vsphere_list(self.config['vcs'])
+        self._warm_vm_location_cache(msg_update_callback=msg_update_callback)
 
         # Load def entity-type and interface
         self._load_def_schema(msg_update_callback=msg_update_callback)
@@ -230,6 +304,8 @@ class Service(object, metaclass=Singleton):
             msg_update_callback.info(msg)
             logger.SERVER_LOGGER.debug(msg)
 
+        self._load_template_scripts(msg_update_callback=msg_update_callback)
+
         if self.should_check_config:
             check_cse_installation(
                 self.config, msg_update_callback=msg_update_callback)
@@ -243,33 +319,13 @@ class Service(object, metaclass=Singleton):
                 orgs=pks_config.get('orgs', []),
                 nsxt_servers=pks_config.get('nsxt_servers', []))
 
-        amqp = self.config['amqp']
-        num_consumers = self.config['service']['listeners']
-        for n in range(num_consumers):
-            try:
-                c = MessageConsumer(
-                    amqp['host'], amqp['port'], amqp['ssl'], amqp['vhost'],
-                    amqp['username'], amqp['password'], amqp['exchange'],
-                    amqp['routing_key'])
-                name = 'MessageConsumer-%s' % n
-                t = Thread(name=name, target=consumer_thread, args=(c, ))
-                t.daemon = True
-                t.start()
-                msg = f"Started thread '{name} ({t.ident})'"
-                msg_update_callback.general(msg)
-                logger.SERVER_LOGGER.info(msg)
-                self.threads.append(t)
-                self.consumers.append(c)
-                time.sleep(0.25)
-            except KeyboardInterrupt:
-                break
-            except Exception:
-                logger.SERVER_LOGGER.error(traceback.format_exc())
-
-        logger.SERVER_LOGGER.info(f"Number of threads started: {len(self.threads)}")  # noqa: E501
-
         self._state = ServerState.RUNNING
 
+        if self.num_workers > 1:
+            self._start_workers(msg_update_callback=msg_update_callback)
+        else:
+            self._start_consumers(msg_update_callback=msg_update_callback)
+
         message = f"Container Service Extension for vCloud Director" \
                   f"\nServer running using config file: {self.config_file}" \
                   f"\nLog files: {logger.SERVER_INFO_LOG_FILEPATH}, " \
@@ -296,6 +352,8 @@ class Service(object, metaclass=Singleton):
                 if self._state == ServerState.STOPPING and \
                         self.active_requests_count() == 0:
                     break
+                if self.workers and self._state != ServerState.STOPPING:
+                    self._restart_dead_workers()
             except KeyboardInterrupt:
                 break
             except Exception:
@@ -305,15 +363,197 @@ class Service(object, metaclass=Singleton):
                 sys.exit(1)
 
         logger.SERVER_LOGGER.info("Stop detected")
+        if self.workers:
+            self._stop_workers()
+        else:
+            self._stop_consumers()
+
+        self._state = ServerState.STOPPED
+        logger.SERVER_LOGGER.info("Done")
+
+    def _start_consumers(self, msg_update_callback=utils.NullPrinter()):
+        consumer_backend = self.config['service'].get(
+            'consumer_backend', ConsumerBackend.SELECT)
+        if consumer_backend == ConsumerBackend.ASYNCIO:
+            self._start_asyncio_consumers(
+                msg_update_callback=msg_update_callback)
+        else:
+            self._start_select_consumers(
+                msg_update_callback=msg_update_callback)
+
+        logger.SERVER_LOGGER.info(f"Number of threads started: {len(self.threads)}")  # noqa: E501
+
+    def _stop_consumers(self):
         logger.SERVER_LOGGER.info("Closing connections...")
         for c in self.consumers:
             try:
                 c.stop()
             except Exception:
                 logger.SERVER_LOGGER.error(traceback.format_exc())
+        if self._consumer_loop is not None:
+            asyncio_consumer.stop_event_loop(self._consumer_loop)
+        if self._processor_pool is not None:
+            self._processor_pool.shutdown(wait=False)
+
+    def _start_workers(self, msg_update_callback=utils.NullPrinter()):
+        """Pre-fork worker processes that each run their own consumers.
+
+        Workers are forked after the server configuration and templates are
+        loaded, so they inherit them, while every worker builds its own AMQP
+        connections and per-process caches. This process stays behind as
+        supervisor of the workers.
+        """
+        if os.name == 'nt':
+            raise cse_exception.CseServerError(
+                "Running CSE server with multiple worker processes is not "
+                "supported on Windows.")
+        # sessions opened while loading the server state must not be
+        # inherited, workers would share their connections
+        sysadmin_client_pool.get_pool().close()
+        vs_utils.get_session_pool().close()
+
+        self._worker_request_counts = multiprocessing.Array(
+            'i', self.num_workers)
+        self.workers = [None] * self.num_workers
+        for n in range(self.num_workers):
+            self._start_worker(n)
+        msg = f"Started {self.num_workers} worker processes"
+        msg_update_callback.general(msg)
+        logger.SERVER_LOGGER.info(msg)
 
-        self._state = ServerState.STOPPED
-        logger.SERVER_LOGGER.info("Done")
+    def _start_worker(self, worker_index):
+        name = f"CSE-Worker-{worker_index}"
+        # use fork explicitly, workers must inherit the loaded server state
+        p = multiprocessing.get_context('fork').Process(
+            name=name, target=self._run_worker, args=(worker_index, ))
+        p.start()
+        self.workers[worker_index] = p
+        logger.SERVER_LOGGER.info(f"Started worker process '{name}' "
+                                  f"({p.pid})")
+
+    def _restart_dead_workers(self):
+        for n, p in enumerate(self.workers):
+            if p.is_alive():
+                continue
+            logger.SERVER_LOGGER.error(f"Worker process '{p.name}' ({p.pid}) "
+                                       f"exited with code {p.exitcode}. "
+                                       f"Restarting it.")
+            self._worker_request_counts[n] = 0
+            self._start_worker(n)
+
+    def _stop_workers(self):
+        logger.SERVER_LOGGER.info("Stopping worker processes...")
+        for p in self.workers:
+            if p.is_alive():
+                os.kill(p.pid, signal.SIGINT)
+        for p in self.workers:
+            p.join(timeout=WORKER_STOP_TIMEOUT)
+            if p.is_alive():
+                logger.SERVER_LOGGER.warning(f"Terminating worker process "
+                                             f"'{p.name}' ({p.pid})")
+                p.terminate()
+
+    def _run_worker(self, worker_index):
+        """Entry point of a worker process."""
+        self._worker_index = worker_index
+        self.workers = []
+        signal.signal(signal.SIGINT, signal_handler)
+        try:
+            self._start_consumers()
+            while True:
+                time.sleep(1)
+                # also publishes the count of this worker to the supervisor
+                num_requests = self.active_requests_count()
+                if self._state == ServerState.STOPPING and num_requests == 0:
+                    break
+        except KeyboardInterrupt:
+            pass
+        except Exception:
+            logger.SERVER_LOGGER.error(traceback.format_exc())
+            sys.exit(1)
+        finally:
+            # supervisor may signal again while connections are closing
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            self._stop_consumers()
+
+    def _start_select_consumers(self,
+                                msg_update_callback=utils.NullPrinter()):
+        """Start one MessageConsumer thread per configured listener.
+
+        If the 'processors' property of the 'service' config section is
+        positive, requests are processed by a thread pool of that size shared
+        by all listeners, otherwise on the thread of each listener.
+        """
+        amqp = self.config['amqp']
+        num_consumers = self.config['service']['listeners']
+        num_processors = self.config['service'].get('processors', 0)
+        if num_processors > 0:
+            self._processor_pool = RequestProcessorPool(
+                num_processors, thread_name_prefix='MessageConsumer-processor')
+        for n in range(num_consumers):
+            try:
+                c = MessageConsumer(
+                    amqp['host'], amqp['port'], amqp['ssl'], amqp['vhost'],
+                    amqp['username'], amqp['password'], amqp['exchange'],
+                    amqp['routing_key'], processor_pool=self._processor_pool)
+                name = 'MessageConsumer-%s' % n
+                t = Thread(name=name, target=consumer_thread, args=(c, ))
+                t.daemon = True
+                t.start()
+                msg = f"Started thread '{name} ({t.ident})'"
+                msg_update_callback.general(msg)
+                logger.SERVER_LOGGER.info(msg)
+                self.threads.append(t)
+                self.consumers.append(c)
+                time.sleep(0.25)
+            except KeyboardInterrupt:
+                break
+            except Exception:
+                logger.SERVER_LOGGER.error(traceback.format_exc())
+
+    def _start_asyncio_consumers(self,
+                                 msg_update_callback=utils.NullPrinter()):
+        """Start all listeners on a single asyncio event loop thread.
+
+        Requests are processed by a thread pool shared by all listeners,
+        sized by the 'processors' property of the 'service' config section.
+        If it is 0, the pool has one thread per listener, the same number of
+        threads that process requests with the 'select' backend.
+        """
+        amqp = self.config['amqp']
+        num_consumers = self.config['service']['listeners']
+        num_processors = self.config['service'].get('processors', 0) or \
+            num_consumers
+        self._consumer_loop = asyncio.new_event_loop()
+        self._processor_pool = RequestProcessorPool(
+            num_processors,
+            thread_name_prefix='AsyncioMessageConsumer-processor')
+
+        name = 'AsyncioMessageConsumer'
+        t = Thread(name=name, target=asyncio_consumer.run_event_loop,
+                   args=(self._consumer_loop, ))
+        t.daemon = True
+        t.start()
+        msg = f"Started thread '{name} ({t.ident})'"
+        msg_update_callback.general(msg)
+        logger.SERVER_LOGGER.info(msg)
+        self.threads.append(t)
+
+        for n in range(num_consumers):
+            try:
+                c = asyncio_consumer.AsyncioMessageConsumer(
+                    amqp['host'], amqp['port'], amqp['ssl'], amqp['vhost'],
+                    amqp['username'], amqp['password'], amqp['exchange'],
+                    amqp['routing_key'], loop=self._consumer_loop,
+                    processor_pool=self._processor_pool)
+                c.run()
+                self.consumers.append(c)
+            except Exception:
+                logger.SERVER_LOGGER.error(traceback.format_exc())
+        msg = f"Started {len(self.consumers)} listener(s) with " \
+              f"{num_processors} processor thread(s)"
+        msg_update_callback.general(msg)
+        logger.SERVER_LOGGER.info(msg)
 
     def _load_def_schema(self, msg_update_callback=utils.NullPrinter()):
         """Load cluster interface and cluster entity type to global context.
@@ -334,7 +574,8 @@ class Service(object, metaclass=Singleton):
             cloudapi_client = \
                 vcd_utils.get_cloudapi_client_from_vcd_client(sysadmin_client,
                                                               logger.SERVER_LOGGER, # noqa: E501
-                                                              logger_wire)
+                                                              logger_wire,
+                                                              service_config=self.config['service']) # noqa: E501
             raise_error_if_def_not_supported(cloudapi_client)
             schema_svc = def_schema_svc.DefSchemaService(cloudapi_client)
             defKey = def_utils.DefKey
@@ -463,6 +704,40 @@ class Service(object, metaclass=Singleton):
             logger.SERVER_LOGGER.debug(msg)
             msg_update_callback.general(msg)
 
+    def _warm_vm_location_cache(self, msg_update_callback=utils.NullPrinter()):
+        """Cache the vCenter location of the nodes of all native clusters.
+
+        Runs before worker processes are started, so that they inherit the
+        cache. Failing to warm the cache is not fatal, VMs missing from it
+        are looked up on use.
+        """
+        # circular dependency between service.py and vcdbroker.py
+        from container_service_extension.vcdbroker import get_all_clusters
+        sysadmin_client = None
+        try:
+            sysadmin_client = vcd_utils.get_sys_admin_client()
+            clusters = get_all_clusters(sysadmin_client)
+            num_cached = vs_utils.warm_vm_location_cache(
+                sysadmin_client, [c['vapp_href'] for c in clusters])
+            msg = f"Cached vCenter location of {num_cached} cluster node(s)"
+            msg_update_callback.general(msg)
+            logger.SERVER_LOGGER.info(msg)
+        except Exception as err:
+            msg = f"Failed to cache vCenter location of cluster nodes: {err}"
+            msg_update_callback.info(msg)
+            logger.SERVER_LOGGER.warning(msg, exc_info=True)
+        finally:
+            if sysadmin_client:
+                sysadmin_client.logout()
+
+    def _load_template_scripts(self, msg_update_callback=utils.NullPrinter()):
+        """Load the scripts of all k8s templates into memory."""
+        num_loaded = template_script_registry.get_registry().load(
+            self.config['broker'].get('templates', []))
+        msg = f"Loaded {num_loaded} template script(s)"
+        msg_update_callback.general(msg)
+        logger.SERVER_LOGGER.info(msg)
+
     def _process_template_compute_policy_compliance(self,
                                                     msg_update_callback=utils.NullPrinter()): # noqa: E501
         msg = "Processing compute policy for k8s templates."
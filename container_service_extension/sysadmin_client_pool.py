@@ -0,0 +1,225 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import collections
+import contextlib
+import os
+import threading
+import time
+
+from container_service_extension.logger import SERVER_LOGGER as LOGGER
+import container_service_extension.pyvcloud_utils as vcd_utils
+from container_service_extension.tenant_session_cache import \
+    is_unauthorized_error
+from container_service_extension.utils import get_server_runtime_config
+
+# Maximum number of logged in sys admin clients kept by the pool
+DEFAULT_POOL_SIZE = 10
+# Seconds to wait for a pooled client to be returned before leasing an
+# additional, non pooled, client
+DEFAULT_WAIT_TIMEOUT = 5
+# Sessions idle for longer than this many seconds are probed before lease
+SESSION_PROBE_INTERVAL = 60
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class SysAdminClientPool(object):
+    """Thread safe pool of logged in sys admin clients.
+
+    Clients are leased for the duration of a request and returned to the
+    pool afterwards instead of being logged out. Sessions that have been idle
+    for a while are probed with a GET of the session on lease, and the
+    client logs in again if its session has expired or was revoked. Clients
+    released after a 401 are dropped from the pool, or probed before their
+    next lease if the 401 may have been caused by another session.
+
+    If all pooled clients are leased, callers wait for one to be returned.
+    If none is returned within the wait timeout, an additional client is
+    logged in, which is logged out again once released, so that long running
+    operations holding a client can't starve other requests.
+    """
+
+    def __init__(self, max_size=DEFAULT_POOL_SIZE,
+                 wait_timeout=DEFAULT_WAIT_TIMEOUT,
+                 probe_interval=SESSION_PROBE_INTERVAL):
+        self.max_size = max_size
+        self.wait_timeout = wait_timeout
+        self.probe_interval = probe_interval
+        self._condition = threading.Condition()
+        # idle clients as (client, time of release), most recent last
+        self._idle = collections.deque()
+        self._pooled_clients = set()
+        # pooled clients that are being logged in
+        self._num_pending_logins = 0
+        self._stats = {
+            'logins': 0,
+            'relogins': 0,
+            'waits': 0,
+            'overflow_leases': 0
+        }
+
+    def lease(self):
+        """Lease a logged in sys admin client.
+
+        :return: sys admin client, which must be handed back via release().
+
+        :rtype: pyvcloud.vcd.client.Client
+        """
+        with self._condition:
+            if not self._idle and self._is_full():
+                self._stats['waits'] += 1
+                self._condition.wait_for(lambda: self._idle,
+                                         timeout=self.wait_timeout)
+            if self._idle:
+                client, released_at = self._idle.pop()
+                if time.time() - released_at <= self.probe_interval:
+                    return client
+            else:
+                client = None
+                is_pooled = not self._is_full()
+                if is_pooled:
+                    self._num_pending_logins += 1
+                else:
+                    self._stats['overflow_leases'] += 1
+
+        if client is not None:
+            return self._ensure_session(client)
+        if not is_pooled:
+            return self._login()
+        try:
+            client = self._login()
+            with self._condition:
+                self._pooled_clients.add(client)
+            return client
+        finally:
+            with self._condition:
+                self._num_pending_logins -= 1
+                self._condition.notify()
+
+    @contextlib.contextmanager
+    def leased_client(self):
+        """Lease a sys admin client for the duration of a with block.
+
+        The client is returned to the pool on exit, or dropped from it if vCD
+        rejected its session with a 401 in the with block.
+
+        :rtype: pyvcloud.vcd.client.Client
+        """
+        client = self.lease()
+        try:
+            yield client
+        except Exception as err:
+            if is_unauthorized_error(err):
+                LOGGER.debug(f"Sys admin session was rejected by vCD: {err}")
+                self.invalidate(client)
+            else:
+                self.release(client)
+            raise
+        self.release(client)
+
+    def release(self, client, error=None):
+        """Return a leased client to the pool.
+
+        :param pyvcloud.vcd.client.Client client: client obtained by lease().
+        :param Exception error: error of the operation that used the client.
+            If it is a 401 of vCD, the session of the client is probed before
+            the client is leased again, as the operation may have used other
+            sessions as well, e.g. the one of a tenant user.
+        """
+        released_at = time.time()
+        if error is not None and is_unauthorized_error(error):
+            released_at = 0
+        with self._condition:
+            if client in self._pooled_clients:
+                self._idle.append((client, released_at))
+                self._condition.notify()
+                return
+        _logout(client)
+
+    def invalidate(self, client):
+        """Remove a leased client whose session is unusable from the pool.
+
+        :param pyvcloud.vcd.client.Client client: client obtained by lease().
+        """
+        with self._condition:
+            self._pooled_clients.discard(client)
+            self._condition.notify()
+        _logout(client)
+
+    def get_stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats['size'] = len(self._pooled_clients)
+            stats['max_size'] = self.max_size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = len(self._pooled_clients) - len(self._idle)
+        return stats
+
+    def close(self):
+        """Log out all idle clients."""
+        with self._condition:
+            idle = [client for client, _ in self._idle]
+            self._idle.clear()
+            self._pooled_clients.difference_update(idle)
+        for client in idle:
+            _logout(client)
+
+    def _is_full(self):
+        return len(self._pooled_clients) + self._num_pending_logins >= \
+            self.max_size
+
+    def _login(self):
+        client = vcd_utils.get_sys_admin_client()
+        with self._condition:
+            self._stats['logins'] += 1
+        return client
+
+    def _ensure_session(self, client):
+        """Probe session of client, log in again if it has expired.
+
+        get_vcloud_session() only returns the session cached by the client,
+        so the session is read from vCD to find out if it's still valid.
+        """
+        try:
+            client.get_resource(f"{client.get_api_uri()}/session")
+            return client
+        except Exception as err:
+            LOGGER.debug(f"Sys admin session is no longer valid: {err}")
+
+        self.invalidate(client)
+        new_client = vcd_utils.get_sys_admin_client()
+        with self._condition:
+            self._stats['relogins'] += 1
+            self._pooled_clients.add(new_client)
+        return new_client
+
+
+def _logout(client):
+    try:
+        client.logout()
+    except Exception:
+        pass
+
+
+def get_pool():
+    """Get the sys admin client pool of the current process.
+
+    The pool is created on first use. Worker processes forked by the server
+    get a pool of their own, since sessions must not be shared across
+    processes.
+
+    :rtype: SysAdminClientPool
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            service_config = get_server_runtime_config()['service']
+            _pool = SysAdminClientPool(
+                max_size=service_config.get('sysadmin_pool_size',
+                                            DEFAULT_POOL_SIZE))
+            _pool_pid = os.getpid()
+        return _pool
@@ -0,0 +1,178 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import collections
+import contextlib
+import threading
+import time
+
+import pyvcloud.vcd.client as vcd_client
+import pyvcloud.vcd.task as vcd_task
+
+from container_service_extension.logger import SERVER_LOGGER as LOGGER
+import container_service_extension.pyvcloud_utils as vcd_utils
+import container_service_extension.request_context as ctx
+from container_service_extension.utils import get_server_runtime_config
+
+# Seconds within which RUNNING updates of a task are coalesced
+DEFAULT_UPDATE_WINDOW = 2
+
+
+class TaskReporter(object):
+    """Reports the progress of a CSE operation as a vCD task.
+
+    A reporter is created once per operation. The href of the user owning
+    the operation is resolved on the first update only. RUNNING updates
+    that follow the previous update of the task within the update window
+    are coalesced: such an update is held back until the next update, or
+    until flush() is called, which callers do before blocking waits. The
+    first update, which creates the task, and updates to any other status
+    are sent right away, after the held back update, if any.
+
+    Updates are only ever sent on the thread calling update() or flush(),
+    since the clients of the request context are not thread safe, and must
+    not be used once the context has ended.
+    """
+
+    def __init__(self, request_context: ctx.RequestContext,
+                 operation_name='cluster operation', update_window=None):
+        self.context = request_context
+        self.operation_name = operation_name
+        if update_window is None:
+            update_window = get_server_runtime_config()['service'].get(
+                'task_update_window', DEFAULT_UPDATE_WINDOW)
+        self.update_window = update_window
+        self.task_resource = None
+        self._task = None
+        self._user_href = None
+        self._last_update_time = 0
+        # latest RUNNING update that has not been sent yet
+        self._pending_update = None
+        self._lock = threading.Lock()
+
+    def update(self, status, message='', error_message=None,
+               stack_trace='', details=''):
+        """Update the task, or create it if it does not exist.
+
+        :param vcd_client.TaskStatus status:
+        :param str message: operation shown for the task.
+        :param str error_message:
+        :param str stack_trace: only reported to sys admin users.
+        :param str details: details shown for the task.
+
+        :return: task resource as of the latest update sent to vCD.
+        """
+        if not self.context.client.is_sysadmin():
+            stack_trace = ''
+        update = {
+            'status': status,
+            'message': message,
+            'error_message': error_message,
+            'stack_trace': stack_trace,
+            'details': details
+        }
+        with self._lock:
+            if status == vcd_client.TaskStatus.RUNNING and \
+                    self.task_resource is not None:
+                delay = self._last_update_time + self.update_window - \
+                    time.time()
+                if delay > 0:
+                    self._pending_update = update
+                    return self.task_resource
+            pending_update = self._pending_update
+            self._pending_update = None
+            if pending_update is not None and \
+                    status != vcd_client.TaskStatus.RUNNING:
+                self._send(**pending_update)
+            return self._send(**update)
+
+    def flush(self):
+        """Send the pending RUNNING update of the task, if any.
+
+        Sent on the calling thread, which must be allowed to use the clients
+        of the request context.
+        """
+        with self._lock:
+            update = self._pending_update
+            self._pending_update = None
+            if update is None:
+                return
+            try:
+                self._send(**update)
+            except Exception as err:
+                LOGGER.warning(f"Failed to update task "
+                               f"'{self.task_resource.get('href')}': {err}")
+
+    def _send(self, status, message, error_message, stack_trace, details):
+        if self._task is None:
+            self._task = vcd_task.Task(self.context.sysadmin_client)
+        if self._user_href is None:
+            org = vcd_utils.get_org(self.context.client)
+            self._user_href = org.get_user(self.context.user.name).get('href')
+
+        task_href = None
+        if self.task_resource is not None:
+            task_href = self.task_resource.get('href')
+
+        self.task_resource = self._task.update(
+            status=status.value,
+            namespace='vcloud.cse',
+            operation=message,
+            operation_name=self.operation_name,
+            details=details,
+            progress=None,
+            owner_href=self.context.user.org_href,
+            owner_name=self.context.user.org_name,
+            owner_type='application/vnd.vmware.vcloud.org+xml',
+            user_href=self._user_href,
+            user_name=self.context.user.name,
+            org_href=self.context.user.org_href,
+            task_href=task_href,
+            error_message=error_message,
+            stack_trace=stack_trace
+        )
+        self._last_update_time = time.time()
+        return self.task_resource
+
+
+class PhaseTimings(object):
+    """Wall clock time spent in the phases of an operation.
+
+    Phases may run concurrently, and a phase may be entered several times,
+    e.g. once per node. The time of a phase spans from its first start to
+    its last end.
+    """
+
+    def __init__(self):
+        self._phases = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def measure(self, phase):
+        """Measure a block of code as part of a phase.
+
+        :param str phase: name of the phase.
+        """
+        with self._lock:
+            times = self._phases.setdefault(phase, [time.time(), None])
+        try:
+            yield
+        finally:
+            with self._lock:
+                times[1] = time.time()
+
+    def get_durations(self):
+        """Get the duration of the phases that have ended, in seconds.
+
+        :rtype: collections.OrderedDict
+        """
+        with self._lock:
+            return collections.OrderedDict(
+                (phase, round(end - start, 1))
+                for phase, (start, end) in self._phases.items()
+                if end is not None)
+
+    def __str__(self):
+        return ', '.join(f"{phase}: {duration}s"
+                         for phase, duration in self.get_durations().items())
@@ -0,0 +1,310 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError
+import os
+import threading
+import time
+
+import pyvcloud.vcd.client as vcd_client
+import pyvcloud.vcd.exceptions as vcd_exceptions
+
+from container_service_extension.logger import SERVER_LOGGER as LOGGER
+import container_service_extension.sysadmin_client_pool as sysadmin_client_pool # noqa: E501
+
+# Seconds before a newly watched task is polled for the first time
+INITIAL_POLL_INTERVAL = 1
+# Upper bound of the poll interval of a task, in seconds
+MAX_POLL_INTERVAL = 10
+# Factor by which the poll interval of a task grows after every poll
+POLL_BACKOFF_FACTOR = 1.5
+# Seconds to wait for a task to finish, same as pyvcloud's TaskMonitor
+DEFAULT_TIMEOUT = 600
+# Maximum number of tasks whose status is read by a single task query, which
+# keeps the id filter of the query URL within limits
+MAX_TASKS_PER_QUERY = 50
+
+_FAILED_STATUSES = (vcd_client.TaskStatus.ERROR.value,
+                    vcd_client.TaskStatus.CANCELED.value,
+                    vcd_client.TaskStatus.ABORTED.value)
+
+_watcher = None
+_watcher_pid = None
+_watcher_lock = threading.Lock()
+
+
+class _WatchedTask(object):
+    def __init__(self, href):
+        self.href = href
+        self.future = Future()
+        self.interval = INITIAL_POLL_INTERVAL
+        self.next_poll_time = time.time() + self.interval
+
+
+class TaskWatcher(object):
+    """Waits for vCD tasks on behalf of all operations of a server process.
+
+    Instead of every operation polling its own tasks, tasks are handed to
+    the watcher, which polls all outstanding tasks from a single thread and
+    resolves the future returned for each task once it finishes. The poll
+    interval of a task backs off from INITIAL_POLL_INTERVAL up to
+    MAX_POLL_INTERVAL, so that long running tasks are polled less often.
+
+    The status of all due tasks is read by a single task query, filtered by
+    task id. Only tasks that have finished are fetched in full, to resolve
+    their futures with the final task resource. Tasks are polled with a sys
+    admin client leased from the pool, which can read tasks of all orgs.
+    """
+
+    def __init__(self):
+        self._tasks = []
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        self._stats = {
+            'watched': 0,
+            'polls': 0,
+            'queries': 0,
+            'failed_polls': 0
+        }
+
+    def watch(self, task):
+        """Start watching a vCD task.
+
+        :param lxml.objectify.ObjectifiedElement task: task resource.
+
+        :return: future resolved with the final task resource if the task
+            succeeds. If the task fails, the future raises
+            pyvcloud.vcd.exceptions.VcdTaskException. Cancelling the future
+            stops watching the task.
+
+        :rtype: concurrent.futures.Future
+        """
+        watched_task = _WatchedTask(task.get('href'))
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll_loop,
+                                                name='TaskWatcher',
+                                                daemon=True)
+                self._thread.start()
+            self._tasks.append(watched_task)
+            self._stats['watched'] += 1
+            self._condition.notify()
+        return watched_task.future
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def get_stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats['outstanding'] = len(self._tasks)
+        return stats
+
+    def _poll_loop(self):
+        while True:
+            with self._condition:
+                # the wait time is recomputed on every wakeup, as tasks
+                # watched meanwhile may be due before the current deadline
+                due_tasks = self._get_due_tasks()
+                while not self._stopped and not due_tasks:
+                    self._condition.wait(self._get_wait_time())
+                    due_tasks = self._get_due_tasks()
+                if self._stopped:
+                    return
+            try:
+                self._poll(due_tasks)
+            except Exception as err:
+                LOGGER.warning(f"Failed to poll vCD tasks: {err}",
+                               exc_info=True)
+                with self._condition:
+                    self._stats['failed_polls'] += 1
+                    for watched_task in due_tasks:
+                        self._schedule_next_poll(watched_task)
+
+    def _get_due_tasks(self):
+        self._tasks = [t for t in self._tasks if not t.future.done()]
+        now = time.time()
+        return [t for t in self._tasks if t.next_poll_time <= now]
+
+    def _get_wait_time(self):
+        if not self._tasks:
+            return None
+        next_poll_time = min(t.next_poll_time for t in self._tasks)
+        return max(0, next_poll_time - time.time())
+
+    def _poll(self, due_tasks):
+        with sysadmin_client_pool.get_pool().leased_client() as client:
+            for i in range(0, len(due_tasks), MAX_TASKS_PER_QUERY):
+                self._poll_batch(client,
+                                 due_tasks[i:i + MAX_TASKS_PER_QUERY])
+
+    def _poll_batch(self, client, watched_tasks):
+        statuses = _query_task_statuses(
+            client, [t.href for t in watched_tasks])
+        with self._condition:
+            self._stats['queries'] += 1
+        for watched_task in watched_tasks:
+            if watched_task.future.done():
+                continue
+            status = statuses.get(_get_task_id(watched_task.href))
+            if status is not None and not _is_final(status):
+                with self._condition:
+                    self._stats['polls'] += 1
+                    self._schedule_next_poll(watched_task)
+                continue
+
+            # the task has finished, or is missing from the query result,
+            # in which case fetching it reports the reason
+            try:
+                task_resource = client.get_resource(watched_task.href)
+            except Exception as err:
+                # fail the waiting operation, like pyvcloud's TaskMonitor
+                # does
+                with self._condition:
+                    self._stats['failed_polls'] += 1
+                    self._tasks.remove(watched_task)
+                _set_future(watched_task.future, exception=err)
+                continue
+            self._update(watched_task, task_resource)
+
+    def _update(self, watched_task, task_resource):
+        status = task_resource.get('status')
+        with self._condition:
+            self._stats['polls'] += 1
+            if not _is_final(status):
+                self._schedule_next_poll(watched_task)
+                return
+            self._tasks.remove(watched_task)
+
+        # resolve the future outside of the lock, its callbacks may watch
+        # further tasks
+        if status == vcd_client.TaskStatus.SUCCESS.value:
+            _set_future(watched_task.future, result=task_resource)
+        else:
+            error = task_resource.Error \
+                if hasattr(task_resource, 'Error') else {}
+            message = error.get('message') or \
+                f"Task '{task_resource.get('operationName')}' ended with " \
+                f"status '{status}'"
+            _set_future(watched_task.future,
+                        exception=vcd_exceptions.VcdTaskException(message,
+                                                                  error))
+
+    @staticmethod
+    def _schedule_next_poll(watched_task):
+        watched_task.interval = min(
+            watched_task.interval * POLL_BACKOFF_FACTOR, MAX_POLL_INTERVAL)
+        watched_task.next_poll_time = time.time() + watched_task.interval
+
+
+def _query_task_statuses(client, task_hrefs):
+    """Get the status of several tasks with a single task query.
+
+    :param pyvcloud.vcd.client.Client client: sys admin client.
+    :param list task_hrefs:
+
+    :return: dict of task id to task status.
+
+    :rtype: dict
+    """
+    qfilter = ','.join(f"id==urn:vcloud:task:{_get_task_id(href)}"
+                       for href in task_hrefs)
+    q = client.get_typed_query(
+        vcd_client.ResourceType.ADMIN_TASK.value,
+        query_result_format=vcd_client.QueryResultFormat.RECORDS,
+        page_size=len(task_hrefs),
+        qfilter=qfilter,
+        fields='status')
+    return {_get_task_id(record.get('href')): record.get('status')
+            for record in q.execute()}
+
+
+def _get_task_id(task_href):
+    return task_href.split('/')[-1]
+
+
+def _is_final(status):
+    return status == vcd_client.TaskStatus.SUCCESS.value or \
+        status in _FAILED_STATUSES
+
+
+def _set_future(future, result=None, exception=None):
+    # the future may have been cancelled by the waiting caller meanwhile
+    if not future.set_running_or_notify_cancel():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+def get_watcher():
+    """Get the task watcher of the current process.
+
+    The watcher is created on first use, separately in every worker process
+    of the server.
+
+    :rtype: TaskWatcher
+    """
+    global _watcher, _watcher_pid
+    with _watcher_lock:
+        if _watcher is None or _watcher_pid != os.getpid():
+            _watcher = TaskWatcher()
+            _watcher_pid = os.getpid()
+        return _watcher
+
+
+def wait_for_task(task, timeout=DEFAULT_TIMEOUT):
+    """Wait for a vCD task to finish via the task watcher of the process.
+
+    Drop-in replacement of client.get_task_monitor().wait_for_status(task).
+
+    :param lxml.objectify.ObjectifiedElement task: task resource.
+    :param int timeout: seconds to wait for the task to finish.
+
+    :return: final task resource.
+
+    :raises pyvcloud.vcd.exceptions.VcdTaskException: if the task fails.
+    :raises concurrent.futures.TimeoutError: if the task doesn't finish
+        within @timeout seconds.
+    """
+    future = get_watcher().watch(task)
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        future.cancel()
+        raise
+
+
+def wait_for_tasks(tasks, timeout=DEFAULT_TIMEOUT):
+    """Wait for several vCD tasks to finish via the task watcher.
+
+    All tasks are watched at once, so waiting for a batch of tasks takes as
+    long as its slowest task, instead of the sum of all of them.
+
+    :param list tasks: task resources.
+    :param int timeout: seconds to wait for all tasks to finish.
+
+    :return: final task resources, in the order of @tasks.
+
+    :rtype: list
+
+    :raises pyvcloud.vcd.exceptions.VcdTaskException: if any task fails.
+    :raises concurrent.futures.TimeoutError: if the tasks don't finish
+        within @timeout seconds.
+    """
+    watcher = get_watcher()
+    futures = [watcher.watch(task) for task in tasks]
+    deadline = time.time() + timeout
+    try:
+        return [future.result(timeout=max(0, deadline - time.time()))
+                for future in futures]
+    except Exception:
+        for future in futures:
+            future.cancel()
+        raise
@@ -21,8 +21,8 @@ from container_service_extension.server_constants import ScriptFile, \
 from container_service_extension.utils import download_file
 from container_service_extension.utils import NullPrinter
 from container_service_extension.utils import read_data_file
-from container_service_extension.vsphere_utils import get_vsphere
 from container_service_extension.vsphere_utils import vgr_callback
+from container_service_extension.vsphere_utils import vsphere_session
 from container_service_extension.vsphere_utils import wait_until_tools_ready
 
 
@@ -255,38 +255,39 @@ class TemplateBuilder():
             cust_script_filepath, logger=self.logger,
             msg_update_callback=self.msg_update_callback)
 
-        vs = get_vsphere(self.sys_admin_client, vapp, vm_name,
-                         logger=self.logger)
         callback = vgr_callback(
             prepend_msg='Waiting for guest tools, status: "',
             logger=self.logger,
             msg_update_callback=self.msg_update_callback)
-        wait_until_tools_ready(vapp, vm_name, vs, callback=callback)
-        password_auto = vapp.get_admin_password(vm_name)
-
-        try:
-            result = vs.execute_script_in_guest(
-                vs.get_vm_by_moid(vapp.get_vm_moid(vm_name)),
-                'root',
-                password_auto,
-                cust_script,
-                target_file=None,
-                wait_for_completion=True,
-                wait_time=10,
-                get_output=True,
-                delete_script=True,
-                callback=vgr_callback(
-                    logger=self.logger,
-                    msg_update_callback=self.msg_update_callback))
-        except Exception as err:
-            # TODO() replace raw exception with specific exception
-            # unsure all errors execute_script_in_guest can result in
-            # Docker TLS handshake timeout can occur when internet is slow
-            self.msg_update_callback.error(
-                "Failed VM customization. Check CSE install log")
-            self.logger.error(f"Failed VM customization with error: {err}",
-                              exc_info=True)
-            raise
+        with vsphere_session(self.sys_admin_client, vapp, vm_name,
+                             logger=self.logger) as vs:
+            wait_until_tools_ready(vapp, vm_name, vs, callback=callback)
+            password_auto = vapp.get_admin_password(vm_name)
+
+            try:
+                result = vs.execute_script_in_guest(
+                    vs.get_vm_by_moid(vapp.get_vm_moid(vm_name)),
+                    'root',
+                    password_auto,
+                    cust_script,
+                    target_file=None,
+                    wait_for_completion=True,
+                    wait_time=10,
+                    get_output=True,
+                    delete_script=True,
+                    callback=vgr_callback(
+                        logger=self.logger,
+                        msg_update_callback=self.msg_update_callback))
+            except Exception as err:
+                # TODO() replace raw exception with specific exception
+                # unsure all errors execute_script_in_guest can result in
+                # Docker TLS handshake timeout can occur when internet is slow
+                self.msg_update_callback.error(
+                    "Failed VM customization. Check CSE install log")
+                self.logger.error(
+                    f"Failed VM customization with error: {err}",
+                    exc_info=True)
+                raise
 
         if len(result) > 0:
             msg = f'Result: {result}'
@@ -0,0 +1,204 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import pathlib
+import string
+import threading
+
+import container_service_extension.local_template_manager as ltm
+from container_service_extension.logger import SERVER_LOGGER as LOGGER
+from container_service_extension.server_constants import LocalTemplateKey
+from container_service_extension.server_constants import ScriptFile
+
+_FORMATTER = string.Formatter()
+
+_registry = None
+_registry_pid = None
+_registry_lock = threading.Lock()
+
+
+class ScriptTemplate(object):
+    """Template script whose replacement fields are parsed only once.
+
+    Substitution follows str.format(), e.g. the node script of a template
+    is rendered with ScriptTemplate.format(token=..., ip=...).
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._parts = list(_FORMATTER.parse(text))
+        # nested replacement fields in format specs are left to str.format()
+        if any(spec and '{' in spec for _, _, spec, _ in self._parts):
+            self._parts = None
+
+    def format(self, **kwargs):
+        if self._parts is None:
+            return self.text.format(**kwargs)
+        chunks = []
+        for literal_text, field_name, format_spec, conversion in self._parts:
+            chunks.append(literal_text)
+            if field_name is None:
+                continue
+            value, _ = _FORMATTER.get_field(field_name, (), kwargs)
+            value = _FORMATTER.convert_field(value, conversion)
+            chunks.append(_FORMATTER.format_field(value, format_spec))
+        return ''.join(chunks)
+
+
+class _Script(object):
+    def __init__(self, filepath, text, mtime):
+        self.filepath = filepath
+        self.text = text
+        self.mtime = mtime
+        self.template = None
+
+
+class TemplateScriptRegistry(object):
+    """In-memory registry of the scripts of all k8s templates.
+
+    Scripts are keyed by template name, revision and ScriptFile, and read
+    from the local scripts folder of the server. A script is read again if
+    its modification time changes, so that scripts updated on disk are
+    picked up without restarting the server.
+    """
+
+    def __init__(self, scripts=None):
+        self._scripts = dict(scripts or {})
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'loads': 0,
+            'reloads': 0
+        }
+
+    def load(self, templates):
+        """Load the scripts of templates into the registry.
+
+        :param list templates: template definitions of the server runtime
+            config.
+
+        :return: number of scripts loaded.
+
+        :rtype: int
+        """
+        num_loaded = 0
+        for template in templates:
+            for script_file in ScriptFile:
+                try:
+                    self._get(template[LocalTemplateKey.NAME],
+                              template[LocalTemplateKey.REVISION],
+                              script_file)
+                    num_loaded += 1
+                except FileNotFoundError:
+                    # older templates don't ship all scripts, e.g. the
+                    # cluster upgrade ones
+                    LOGGER.debug(f"Script '{script_file.value}' of template "
+                                 f"'{template[LocalTemplateKey.NAME]}' at "
+                                 f"revision "
+                                 f"{template[LocalTemplateKey.REVISION]} "
+                                 f"not found")
+        return num_loaded
+
+    def get_script(self, template_name, revision, script_file):
+        """Get the contents of a template script.
+
+        :param str template_name:
+        :param str revision:
+        :param ScriptFile script_file:
+
+        :rtype: str
+
+        :raises FileNotFoundError: if the script doesn't exist.
+        """
+        return self._get(template_name, revision, script_file).text
+
+    def get_script_template(self, template_name, revision, script_file):
+        """Get a template script for parameter substitution.
+
+        :param str template_name:
+        :param str revision:
+        :param ScriptFile script_file:
+
+        :rtype: ScriptTemplate
+
+        :raises FileNotFoundError: if the script doesn't exist.
+        """
+        script = self._get(template_name, revision, script_file)
+        if script.template is None:
+            script.template = ScriptTemplate(script.text)
+        return script.template
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._scripts)
+        return stats
+
+    def get_state(self):
+        """Get the scripts held by the registry.
+
+        :return: arguments to create a registry holding the same scripts.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'scripts': dict(self._scripts)
+            }
+
+    def _get(self, template_name, revision, script_file):
+        key = _get_key(template_name, revision, script_file)
+        with self._lock:
+            script = self._scripts.get(key)
+        if script is not None:
+            filepath = script.filepath
+        else:
+            filepath = ltm.get_script_filepath(template_name, revision,
+                                               key[2])
+
+        mtime = os.stat(filepath).st_mtime_ns
+        if script is not None and script.mtime == mtime:
+            with self._lock:
+                self._stats['hits'] += 1
+            return script
+
+        # the file may change between stat and read, which only causes the
+        # script to be read again on its next use
+        text = pathlib.Path(filepath).read_text()
+        new_script = _Script(filepath, text, mtime)
+        with self._lock:
+            self._scripts[key] = new_script
+            if script is None:
+                self._stats['loads'] += 1
+            else:
+                self._stats['reloads'] += 1
+        if script is None:
+            LOGGER.debug(f"Loaded script: {filepath}")
+        else:
+            LOGGER.info(f"Reloaded modified script: {filepath}")
+        return new_script
+
+
+def _get_key(template_name, revision, script_file):
+    return template_name, str(revision), ScriptFile(script_file)
+
+
+def get_registry():
+    """Get the template script registry of the current process.
+
+    Scripts loaded by the server process before forking its workers are
+    carried over to the registry of every worker process.
+
+    :rtype: TemplateScriptRegistry
+    """
+    global _registry, _registry_pid
+    with _registry_lock:
+        if _registry is None:
+            _registry = TemplateScriptRegistry()
+            _registry_pid = os.getpid()
+        elif _registry_pid != os.getpid():
+            _registry = TemplateScriptRegistry(**_registry.get_state())
+            _registry_pid = os.getpid()
+        return _registry
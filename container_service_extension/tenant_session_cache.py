@@ -0,0 +1,183 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import collections
+import hashlib
+import os
+import threading
+
+import cachetools
+import pyvcloud.vcd.exceptions as vcd_exceptions
+import requests
+
+import container_service_extension.pyvcloud_utils as vcd_utils
+from container_service_extension.utils import get_server_runtime_config
+
+# Maximum number of tenant sessions kept by the cache
+DEFAULT_CACHE_SIZE = 256
+# Seconds after which a cached tenant session is rehydrated again
+DEFAULT_CACHE_TTL = 300
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+# Login result of a rehydrated tenant token along with the fields derived
+# from its vCD session. pyvcloud clients are not thread safe, so clients are
+# not cached, but built for each request by new_client().
+TenantSession = collections.namedtuple(
+    'TenantSession',
+    ['vcloud_auth_token', 'vcloud_session', 'session_endpoints', 'name',
+     'id', 'org_name', 'role', 'is_sys_admin'])
+
+
+class TenantSessionCache(object):
+    """Thread safe TTL cache of tenant sessions keyed by auth token.
+
+    Tokens are hashed before being used as keys, so that raw tokens are not
+    held on to by the cache. Entries expire after the ttl, and should be
+    evicted as soon as vCD rejects the token of a cached session.
+
+    Entries hold no client, callers get a client of their own for an entry
+    via new_client().
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self._cache = cachetools.TTLCache(maxsize=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+
+    def get(self, auth_token, is_jwt):
+        """Get the tenant session of an auth token, rehydrating it on a miss.
+
+        :param str auth_token: vCD auth token or JWT token of the tenant.
+        :param bool is_jwt: True if @auth_token is a JWT token.
+
+        :rtype: TenantSession
+        """
+        key = _hash_token(auth_token)
+        with self._lock:
+            tenant_session = self._cache.get(key)
+            if tenant_session is not None:
+                self._stats['hits'] += 1
+                return tenant_session
+            self._stats['misses'] += 1
+
+        # rehydrate outside of the lock, concurrent misses on the same token
+        # simply race to populate the entry
+        tenant_session = _rehydrate(auth_token, is_jwt)
+        with self._lock:
+            self._cache[key] = tenant_session
+        return tenant_session
+
+    def evict(self, auth_token):
+        """Drop the cached tenant session of an auth token, if any.
+
+        :param str auth_token:
+        """
+        with self._lock:
+            if self._cache.pop(_hash_token(auth_token), None) is not None:
+                self._stats['evictions'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self._cache.currsize
+            stats['max_size'] = self._cache.maxsize
+            stats['ttl'] = self._cache.ttl
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = \
+            round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+def _hash_token(auth_token):
+    return hashlib.sha256(auth_token.encode()).hexdigest()
+
+
+def _rehydrate(auth_token, is_jwt):
+    client = vcd_utils.connect_vcd_user_via_token(
+        tenant_auth_token=auth_token,
+        is_jwt_token=is_jwt)
+    session = client.get_vcloud_session()
+    return TenantSession(vcloud_auth_token=client.get_xvcloud_authorization_token(), # noqa: E501
+                         vcloud_session=session,
+                         session_endpoints=dict(client._session_endpoints),
+                         name=session.get('user'),
+                         id=session.get('userId'),
+                         org_name=session.get('org'),
+                         role=session.get('roles'),
+                         is_sys_admin=client.is_sysadmin())
+
+
+def new_client(tenant_session, auth_token, is_jwt):
+    """Build a vCD client logged in with the session of a cached entry.
+
+    The client is restored from the login result of the entry, without
+    another round trip to vCD.
+
+    :param TenantSession tenant_session: cached session of @auth_token.
+    :param str auth_token: vCD auth token or JWT token of the tenant.
+    :param bool is_jwt: True if @auth_token is a JWT token.
+
+    :rtype: pyvcloud.vcd.client.Client
+    """
+    client = vcd_utils.get_tenant_client()
+    session = requests.Session()
+    if is_jwt:
+        client._vcloud_access_token = auth_token
+        session.headers[client._HEADER_AUTHORIZATION_NAME] = \
+            'Bearer ' + auth_token
+    else:
+        session.headers[client._HEADER_X_VCLOUD_AUTH_NAME] = auth_token
+    client._session = session
+    client._vcloud_auth_token = tenant_session.vcloud_auth_token
+    client._vcloud_session = tenant_session.vcloud_session
+    client._session_endpoints = dict(tenant_session.session_endpoints)
+    client._is_sysadmin = tenant_session.is_sys_admin
+    return client
+
+
+def is_unauthorized_error(err):
+    """Check if an exception was caused by vCD rejecting the auth token.
+
+    :param Exception err:
+
+    :rtype: bool
+    """
+    if isinstance(err, vcd_exceptions.UnauthorizedException):
+        return True
+    if isinstance(err, requests.exceptions.HTTPError):
+        return err.response is not None and err.response.status_code == 401
+    return False
+
+
+def get_cache():
+    """Get the tenant session cache of the current process.
+
+    The cache is created on first use. Worker processes forked by the server
+    get a cache of their own, since sessions must not be shared across
+    processes.
+
+    :rtype: TenantSessionCache
+    """
+    global _cache, _cache_pid
+    with _cache_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            service_config = get_server_runtime_config()['service']
+            _cache = TenantSessionCache(
+                max_size=service_config.get('tenant_session_cache_size',
+                                            DEFAULT_CACHE_SIZE),
+                ttl=service_config.get('tenant_session_cache_ttl',
+                                       DEFAULT_CACHE_TTL))
+            _cache_pid = os.getpid()
+        return _cache
@@ -6,6 +6,8 @@ import pyvcloud.vcd.role as vcd_role
 import container_service_extension.cloudapi.cloudapi_client as cloudApiClient
 import container_service_extension.logger as logger
 import container_service_extension.pyvcloud_utils as vcd_utils
+import container_service_extension.rights_cache as rights_cache
+import container_service_extension.sysadmin_client_pool as sysadmin_client_pool # noqa: E501
 import container_service_extension.utils as utils
 
 
@@ -17,7 +19,8 @@ ORG_ADMIN_RIGHTS = [
 
 class UserContext:
     def __init__(self, client: vcd_client.Client,
-                 cloudapi_client: cloudApiClient.CloudApiClient):
+                 cloudapi_client: cloudApiClient.CloudApiClient,
+                 tenant_session=None):
         self.client: vcd_client.Client = client
         self._cloudapi_client: cloudApiClient.CloudApiClient = cloudapi_client
         self._session: lxml.ObjectifiedElement = None
@@ -26,12 +29,20 @@ class UserContext:
         self._org_name: str = None
         self._org_href: str = None
         self._role: str = None
-        self._rights: [str] = None
+        self._rights: frozenset = None
 
         self._sysadmin_client: vcd_client.Client = None
         self._sysadmin_cloudapi_client: cloudApiClient.CloudApiClient = None
         self._is_sys_admin: bool = None
 
+        # session fields already known from the tenant session cache
+        if tenant_session is not None:
+            self._name = tenant_session.name
+            self._id = tenant_session.id
+            self._org_name = tenant_session.org_name
+            self._role = tenant_session.role
+            self._is_sys_admin = tenant_session.is_sys_admin
+
     @property
     def session(self):
         if self._session is None:
@@ -81,18 +92,22 @@ class UserContext:
     @property
     def rights(self):
         if self._rights is None:
-            # Query is restricted to system administrator
-            org = vcd_org.Org(self.sysadmin_client, href=self.org_href)
-            role = vcd_role.Role(self.sysadmin_client,
-                                 resource=org.get_role_resource(self.role))
+            self._rights = rights_cache.get_cache().get_rights(
+                self.org_href, self.role, self._load_rights)
+        return self._rights
 
-            self._rights = []
-            for right_dict in role.list_rights():
-                right_name = right_dict.get('name')
-                if right_name is not None:
-                    self._rights.append(right_name)
+    def _load_rights(self):
+        # Query is restricted to system administrator
+        org = vcd_org.Org(self.sysadmin_client, href=self.org_href)
+        role = vcd_role.Role(self.sysadmin_client,
+                             resource=org.get_role_resource(self.role))
 
-        return self._rights
+        rights = []
+        for right_dict in role.list_rights():
+            right_name = right_dict.get('name')
+            if right_name is not None:
+                rights.append(right_name)
+        return rights
 
     @property
     def has_org_admin_rights(self):
@@ -101,29 +116,37 @@ class UserContext:
     @property
     def sysadmin_client(self):
         if self._sysadmin_client is None:
-            self._sysadmin_client = vcd_utils.get_sys_admin_client()
+            self._sysadmin_client = sysadmin_client_pool.get_pool().lease()
         return self._sysadmin_client
 
     @property
     def sysadmin_cloudapi_client(self):
         if self._sysadmin_cloudapi_client is None:
-            log_wire = utils.get_server_runtime_config() \
-                            .get('service', {}).get('log_wire', False)
+            service_config = \
+                utils.get_server_runtime_config().get('service', {})
             logger_wire = logger.NULL_LOGGER
-            if log_wire:
+            if service_config.get('log_wire', False):
                 logger_wire = logger.SERVER_CLOUDAPI_WIRE_LOGGER
             self._sysadmin_cloudapi_client = \
                 vcd_utils.get_cloudapi_client_from_vcd_client(
-                    self._sysadmin_client,
+                    self.sysadmin_client,
                     logger.SERVER_LOGGER,
-                    logger_wire)
+                    logger_wire,
+                    service_config=service_config)
         return self._sysadmin_cloudapi_client
 
-    def end(self):
+    def end(self, error=None):
+        """Hand back the sys admin client leased by the context, if any.
+
+        :param Exception error: error the request failed with, if vCD
+            rejected the sys admin session the client is dropped from the
+            pool.
+        """
         try:
-            self._sysadmin_client.logout()
-        except Exception:
-            pass
+            if self._sysadmin_client is not None:
+                sysadmin_client_pool.get_pool().release(self._sysadmin_client,
+                                                        error=error)
         finally:
             self._sysadmin_client = None
+            self._sysadmin_cloudapi_client = None
             self._cloudapi_client = None
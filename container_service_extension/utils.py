@@ -23,6 +23,7 @@ SIZE_1MB = 1024 * 1024
 _type_to_string = {
     str: 'string',
     int: 'number',
+    float: 'decimal number',
     bool: 'true/false',
     dict: 'mapping',
     list: 'sequence',
@@ -155,6 +156,9 @@ def check_keys_and_value_types(dikt, ref_dict, location='dictionary',
         if k not in keys:
             continue
         value_type = type(ref_dict[k])
+        # whole numbers are valid values of decimal number keys
+        if value_type is float and isinstance(dikt[k], int):
+            continue
         if not isinstance(dikt[k], value_type):
             msg_update_callback.error(
                 f"{location} key '{k}': value type should be "
@@ -0,0 +1,184 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import collections
+import os
+import threading
+import time
+
+import pyvcloud.vcd.client as vcd_client
+import pyvcloud.vcd.org as vcd_org
+
+from container_service_extension.logger import SERVER_LOGGER as LOGGER
+import container_service_extension.pyvcloud_utils as vcd_utils
+import container_service_extension.sysadmin_client_pool as sysadmin_client_pool # noqa: E501
+
+# Seconds between two bulk loads of the index
+DEFAULT_REFRESH_INTERVAL = 600
+# Number of records fetched per page of the adminOrgVdc query
+QUERY_PAGE_SIZE = 128
+
+_index = None
+_index_pid = None
+_index_lock = threading.Lock()
+
+# vc_name is None for VDCs that were looked up individually
+VdcInfo = collections.namedtuple(
+    'VdcInfo', ['id', 'name', 'org_name', 'vc_name', 'pvdc_id'])
+
+
+class VdcIndex(object):
+    """Index of all org VDCs in vCD, keyed by VDC id.
+
+    The index is loaded with a single adminOrgVdc typed query and reloaded
+    periodically by a background thread. VDCs created since the last load
+    are looked up individually on a miss and added to the index.
+    """
+
+    def __init__(self, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._vdcs = {}
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._initial_load_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._refresh_thread = None
+        self._stats = {
+            'loads': 0,
+            'hits': 0,
+            'misses': 0,
+            'last_load_time': None
+        }
+
+    def get_vdc_info(self, vdc_id, sysadmin_client=None):
+        """Get details of an org VDC.
+
+        :param str vdc_id: id of the org VDC.
+        :param pyvcloud.vcd.client.Client sysadmin_client: used to look up
+            VDCs missing from the index. If None, a client is leased from
+            the sys admin client pool if needed.
+
+        :rtype: VdcInfo
+        """
+        if not self._loaded.is_set():
+            with self._initial_load_lock:
+                if not self._loaded.is_set():
+                    self.load(sysadmin_client=sysadmin_client)
+        with self._lock:
+            vdc_info = self._vdcs.get(vdc_id)
+            if vdc_info is not None:
+                self._stats['hits'] += 1
+                return vdc_info
+            self._stats['misses'] += 1
+
+        vdc_info = self._with_client(sysadmin_client, _lookup_vdc, vdc_id)
+        with self._lock:
+            self._vdcs[vdc_id] = vdc_info
+        return vdc_info
+
+    def get_org_name(self, vdc_id, sysadmin_client=None):
+        """Get name of the org that an org VDC belongs to.
+
+        :param str vdc_id: id of the org VDC.
+        :param pyvcloud.vcd.client.Client sysadmin_client: see
+            get_vdc_info().
+
+        :rtype: str
+        """
+        return self.get_vdc_info(vdc_id, sysadmin_client).org_name
+
+    def load(self, sysadmin_client=None):
+        """Replace the index with the org VDCs currently in vCD.
+
+        :param pyvcloud.vcd.client.Client sysadmin_client: if None, a client
+            is leased from the sys admin client pool.
+        """
+        vdcs = self._with_client(sysadmin_client, _query_all_vdcs)
+        with self._lock:
+            self._vdcs = vdcs
+            self._stats['loads'] += 1
+            self._stats['last_load_time'] = time.time()
+        self._loaded.set()
+        LOGGER.debug(f"Loaded {len(vdcs)} org VDCs into VDC index")
+
+    def start(self):
+        """Start reloading the index periodically in the background."""
+        self._refresh_thread = threading.Thread(target=self._refresh_loop,
+                                                name='VdcIndexRefresh',
+                                                daemon=True)
+        self._refresh_thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._vdcs)
+        return stats
+
+    def _refresh_loop(self):
+        while not self._stopped.wait(timeout=self.refresh_interval):
+            try:
+                self.load()
+            except Exception as err:
+                LOGGER.warning(f"Failed to reload VDC index: {err}",
+                               exc_info=True)
+
+    @staticmethod
+    def _with_client(sysadmin_client, func, *args):
+        if sysadmin_client is not None:
+            return func(sysadmin_client, *args)
+        with sysadmin_client_pool.get_pool().leased_client() as client:
+            return func(client, *args)
+
+
+def _query_all_vdcs(sysadmin_client):
+    q = sysadmin_client.get_typed_query(
+        vcd_client.ResourceType.ADMIN_ORG_VDC.value,
+        query_result_format=vcd_client.QueryResultFormat.RECORDS,
+        page_size=QUERY_PAGE_SIZE)
+    vdcs = {}
+    for record in q.execute():
+        vdc_id = record.get('href').split('/')[-1]
+        pvdc_href = record.get('providerVdc')
+        vdcs[vdc_id] = VdcInfo(
+            id=vdc_id,
+            name=record.get('name'),
+            org_name=record.get('orgName'),
+            vc_name=record.get('vcName'),
+            pvdc_id=pvdc_href.split('/')[-1] if pvdc_href else None)
+    return vdcs
+
+
+def _lookup_vdc(sysadmin_client, vdc_id):
+    vdc = vcd_utils.get_vdc(sysadmin_client, vdc_id=vdc_id,
+                            is_admin_operation=True)
+    link = vcd_client.find_link(vdc.get_resource(),
+                                vcd_client.RelationType.UP,
+                                vcd_client.EntityType.ADMIN_ORG.value)
+    org = vcd_org.Org(sysadmin_client, href=link.href)
+    return VdcInfo(
+        id=vdc_id,
+        name=vdc.get_resource().get('name'),
+        org_name=org.get_name(),
+        vc_name=None,
+        pvdc_id=vcd_utils.get_pvdc_id(sysadmin_client, vdc))
+
+
+def get_index():
+    """Get the VDC index of the current process.
+
+    The index is created and its background refresh started on first use,
+    separately in every worker process of the server.
+
+    :rtype: VdcIndex
+    """
+    global _index, _index_pid
+    with _index_lock:
+        if _index is None or _index_pid != os.getpid():
+            _index = VdcIndex()
+            _index.start()
+            _index_pid = os.getpid()
+        return _index
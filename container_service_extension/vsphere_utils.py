@@ -2,19 +2,61 @@
 # Copyright (c) 2019 VMware, Inc. All Rights Reserved.
 # SPDX-License-Identifier: BSD-2-Clause
 
-from urllib.parse import urlparse
+import collections
+import contextlib
+import http.client
+import os
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
 
-from cachetools import LRUCache
+from cachetools import TTLCache
+import pyvcloud.vcd.client as vcd_client
 from pyvcloud.vcd.platform import Platform
 from pyvcloud.vcd.vapp import VApp
 from pyvcloud.vcd.vm import VM
+from pyVmomi import vim
+from pyVmomi import vmodl
 from vsphere_guest_run.vsphere import VSphere
 
 from container_service_extension.logger import NULL_LOGGER
 from container_service_extension.utils import NullPrinter
 
-cache = LRUCache(maxsize=1024)
+# Maximum number of logged in sessions kept by the pool per vCenter
+DEFAULT_MAX_SESSIONS_PER_VC = 8
+# Seconds to wait for a pooled session of a vCenter to be returned before
+# leasing an additional, non pooled, session
+DEFAULT_WAIT_TIMEOUT = 5
+# Sessions idle for longer than this many seconds are probed before lease
+SESSION_PROBE_INTERVAL = 60
+# Maximum number of VMs whose location is cached
+VM_LOCATION_CACHE_SIZE = 4096
+# Seconds for which the location of a VM is cached
+VM_LOCATION_CACHE_TTL = 3600
+# Number of records fetched per page of the adminVM query warming the cache
+QUERY_PAGE_SIZE = 128
+# Upper bound of the URL encoded filter of a single adminVM query warming the
+# cache, well within the URL length limits of vCD and proxies in front of it
+MAX_QUERY_FILTER_LENGTH = 4096
+# Bounds of the interval between two polls of the guest status of VMs, in
+# seconds, if property change notifications are not available
+MIN_GUEST_POLL_INTERVAL = 1
+MAX_GUEST_POLL_INTERVAL = 16
+# Upper bound of a single wait for property changes, in seconds
+MAX_PROPERTY_WAIT = 60
+# VM properties that tell if the guest is ready for guest operations
+GUEST_READINESS_PROPERTIES = ['guest.toolsRunningStatus',
+                              'guestHeartbeatStatus']
+
 vsphere_list = []
+# vCenter name -> 'name', 'hostname', 'port', 'username' and 'password'
+_vcenters = {}
+_vcenters_lock = threading.Lock()
+_session_pool = None
+_session_pool_pid = None
+_session_pool_lock = threading.Lock()
 
 
 def populate_vsphere_list(vcs):
@@ -40,38 +82,462 @@ def get_vsphere(sys_admin_client, vapp, vm_name, logger=NULL_LOGGER):
 
     :rtype: vsphere_guest_run.vsphere.VSphere
     """
-    global cache
-    global vsphere_list
+    vcenter = _get_vcenter_info(sys_admin_client, vapp, vm_name, logger)
+    return VSphere(vcenter['hostname'], vcenter['username'],
+                   vcenter['password'], vcenter['port'])
+
+
+@contextlib.contextmanager
+def vsphere_session(sys_admin_client, vapp, vm_name, logger=NULL_LOGGER):
+    """Lease a connected VSphere for a VM from the vCenter session pool.
+
+    The session is returned to the pool on exit. If a connection or
+    authentication error is raised within the context, the session is
+    logged out instead, since it may no longer be usable.
+
+    :param pyvcloud.vcd.vapp.VApp vapp: VApp of the VM.
+    :param str vm_name:
+    :param logging.Logger logger: logger to log with.
+
+    :return: connected VSphere object for the vCenter of the VM.
+
+    :rtype: vsphere_guest_run.vsphere.VSphere
+    """
+    vcenter = _get_vcenter_info(sys_admin_client, vapp, vm_name, logger)
+    try:
+        with _vcenter_session(vcenter) as vsphere:
+            yield vsphere
+    except vmodl.fault.ManagedObjectNotFound:
+        # the VM may have been deleted and created again under the same
+        # name since its location was cached
+        vm_location_cache.evict(vapp.href, vm_name)
+        raise
+
+
+@contextlib.contextmanager
+def _vcenter_session(vcenter):
+    pool = get_session_pool()
+    vsphere = pool.lease(vcenter)
+    try:
+        yield vsphere
+    except Exception as err:
+        if _is_session_error(err):
+            pool.invalidate(vcenter['name'], vsphere)
+        else:
+            pool.release(vcenter['name'], vsphere)
+        raise
+    pool.release(vcenter['name'], vsphere)
+
+
+def _is_session_error(err):
+    """Tell if an error means that a vCenter session may be unusable.
+
+    Other errors, e.g. a failed guest operation, leave the session usable.
+    """
+    return isinstance(err, (vim.fault.NotAuthenticated, ConnectionError,
+                            socket.timeout, ssl.SSLError,
+                            http.client.HTTPException))
+
+
+def get_vm_moid(sys_admin_client, vapp, vm_name):
+    """Get the vCenter managed object id of a VM inside a VApp.
+
+    :param pyvcloud.vcd.vapp.VApp vapp:
+    :param str vm_name:
+
+    :rtype: str
+    """
+    return _get_vm_location(sys_admin_client, vapp, vm_name).moid
+
+
+def _get_vcenter_info(sys_admin_client, vapp, vm_name, logger=NULL_LOGGER):
+    location = _get_vm_location(sys_admin_client, vapp, vm_name)
+    with _vcenters_lock:
+        vcenter = _vcenters.get(location.vcenter_name)
+    if vcenter is None:
+        vcenter = _load_vcenter_info(sys_admin_client, location.vcenter_name)
+        with _vcenters_lock:
+            _vcenters[location.vcenter_name] = vcenter
+
+    logger.debug(f"VM: {vm_name}, Hostname: {vcenter['hostname']}")
+    return vcenter
+
+
+def _load_vcenter_info(sys_admin_client, vcenter_name):
+    platform = Platform(sys_admin_client)
+    vcenter = platform.get_vcenter(vcenter_name)
+    vcenter_url = urllib.parse.urlparse(vcenter.Url.text)
+    vcenter_info = {
+        'name': vcenter_name,
+        'hostname': vcenter_url.hostname,
+        'port': vcenter_url.port
+    }
+    if not vsphere_list:
+        raise Exception("Global list of vSphere info not set.")
+
+    for vc in vsphere_list:
+        if vc['name'] == vcenter_name:
+            vcenter_info['username'] = vc['username']
+            vcenter_info['password'] = vc['password']
+            break
+    return vcenter_info
 
-    # get vm id from vm resource
-    vm_id = vapp.get_vm(vm_name).get('id')
-    if vm_id not in cache:
-        # recreate vapp with sys admin client
-        vapp = VApp(sys_admin_client, href=vapp.href)
-        vm_resource = vapp.get_vm(vm_name)
+
+VmLocation = collections.namedtuple('VmLocation', ['vcenter_name', 'moid'])
+
+
+class VmLocationCache(object):
+    """Thread safe TTL cache of the vCenter and moid of VMs.
+
+    VMs are keyed by the href of their vApp and their name, which callers
+    know without loading the vApp from vCD.
+    """
+
+    def __init__(self, max_size=VM_LOCATION_CACHE_SIZE,
+                 ttl=VM_LOCATION_CACHE_TTL):
+        self._cache = TTLCache(maxsize=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0
+        }
+
+    def get(self, vapp_href, vm_name):
+        """Get the location of a VM, None if it is not cached.
+
+        :param str vapp_href: href of the vApp of the VM.
+        :param str vm_name:
+
+        :rtype: VmLocation
+        """
+        with self._lock:
+            location = self._cache.get(_get_location_key(vapp_href, vm_name))
+            if location is None:
+                self._stats['misses'] += 1
+            else:
+                self._stats['hits'] += 1
+            return location
+
+    def put(self, vapp_href, vm_name, vcenter_name, moid):
+        """Cache the location of a VM.
+
+        :param str vapp_href: href of the vApp of the VM.
+        :param str vm_name:
+        :param str vcenter_name: name of the vCenter of the VM in vCD.
+        :param str moid: managed object id of the VM in vCenter.
+
+        :rtype: VmLocation
+        """
+        location = VmLocation(vcenter_name=vcenter_name, moid=moid)
+        with self._lock:
+            self._cache[_get_location_key(vapp_href, vm_name)] = location
+        return location
+
+    def evict(self, vapp_href, vm_name):
+        """Remove the location of a VM from the cache, if cached.
+
+        :param str vapp_href: href of the vApp of the VM.
+        :param str vm_name:
+        """
+        with self._lock:
+            self._cache.pop(_get_location_key(vapp_href, vm_name), None)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self._cache.currsize
+        return stats
+
+
+vm_location_cache = VmLocationCache()
+
+
+def _get_location_key(vapp_href, vm_name):
+    # hrefs of the same vApp may differ in their host, e.g. in query records
+    return vapp_href.split('/')[-1], vm_name
+
+
+def _get_vm_location(sys_admin_client, vapp, vm_name):
+    location = vm_location_cache.get(vapp.href, vm_name)
+    if location is None:
+        # recreate vapp with sys admin client, the vCenter details of the
+        # VMs are only visible to sys admins
+        sys_admin_vapp = VApp(sys_admin_client, href=vapp.href)
+        vm_resource = sys_admin_vapp.get_vm(vm_name)
         vm_sys = VM(sys_admin_client, resource=vm_resource)
-        vcenter_name = vm_sys.get_vc()
-        platform = Platform(sys_admin_client)
-        vcenter = platform.get_vcenter(vcenter_name)
-        vcenter_url = urlparse(vcenter.Url.text)
-        cache_item = {
-            'hostname': vcenter_url.hostname,
-            'port': vcenter_url.port
+        location = vm_location_cache.put(
+            vapp.href, vm_name, vm_sys.get_vc(),
+            sys_admin_vapp.get_vm_moid(vm_name))
+    return location
+
+
+def cache_vm_location(sys_admin_client, vapp, vm_name):
+    """Cache the location of a newly created VM inside a VApp.
+
+    :param pyvcloud.vcd.client.Client sys_admin_client:
+    :param pyvcloud.vcd.vapp.VApp vapp: VApp loaded with a sys admin client.
+    :param str vm_name:
+    """
+    vm_resource = vapp.get_vm(vm_name)
+    vcenter_name = VM(sys_admin_client, resource=vm_resource).get_vc()
+    moid = vapp.get_vm_moid(vm_name)
+    if vcenter_name is None or moid is None:
+        return
+    vm_location_cache.put(vapp.href, vm_name, vcenter_name, moid)
+
+
+def warm_vm_location_cache(sys_admin_client, vapp_hrefs):
+    """Cache the location of all VMs inside the given VApps.
+
+    Uses adminVM typed queries filtered by the VApps, instead of loading
+    every VApp. VApps are queried in batches, so that the query filter fits
+    the length limits of URLs.
+
+    :param pyvcloud.vcd.client.Client sys_admin_client:
+    :param list vapp_hrefs: hrefs of the VApps.
+
+    :return: number of VMs cached.
+
+    :rtype: int
+    """
+    vapp_hrefs = set(vapp_hrefs)
+    if not vapp_hrefs:
+        return 0
+    vcenter_names = {
+        vc.get('href'): vc.get('name')
+        for vc in Platform(sys_admin_client).list_vcenters()
+    }
+    num_cached = 0
+    for qfilter in _get_container_filters(vapp_hrefs):
+        q = sys_admin_client.get_typed_query(
+            vcd_client.ResourceType.ADMIN_VM.value,
+            query_result_format=vcd_client.QueryResultFormat.RECORDS,
+            page_size=QUERY_PAGE_SIZE,
+            qfilter=qfilter)
+        num_cached += _cache_vm_records(q.execute(), vcenter_names)
+    return num_cached
+
+
+def _get_container_filters(vapp_hrefs):
+    """Yield query filters for the VMs of batches of VApps.
+
+    :param set vapp_hrefs: hrefs of the VApps.
+
+    :rtype: Iterator[str]
+    """
+    suffix = ');isVAppTemplate==false'
+    # pyvcloud URL encodes the whole filter once more, separators included
+    base_length = len(urllib.parse.quote('(' + suffix))
+    terms = []
+    length = base_length
+    for href in sorted(vapp_hrefs):
+        term = f"container=={urllib.parse.quote_plus(href)}"
+        term_length = len(urllib.parse.quote(',' + term))
+        if terms and length + term_length > MAX_QUERY_FILTER_LENGTH:
+            yield '(' + ','.join(terms) + suffix
+            terms = []
+            length = base_length
+        terms.append(term)
+        length += term_length
+    if terms:
+        yield '(' + ','.join(terms) + suffix
+
+
+def _cache_vm_records(records, vcenter_names):
+    num_cached = 0
+    for record in records:
+        vcenter_name = vcenter_names.get(record.get('vc'))
+        if vcenter_name is None or not record.get('moref'):
+            continue
+        vm_location_cache.put(record.get('container'), record.get('name'),
+                              vcenter_name, record.get('moref'))
+        num_cached += 1
+    return num_cached
+
+
+class VSphereSessionPool(object):
+    """Thread safe pool of logged in vCenter sessions, per vCenter.
+
+    Sessions are leased for the duration of an operation on a VM and
+    returned to the pool afterwards instead of being dropped. Sessions that
+    have been idle for a while are probed on lease and logged in again if
+    they have expired.
+
+    If all pooled sessions of a vCenter are leased, callers wait for one to
+    be returned. If none is returned within the wait timeout, an additional
+    session is logged in, which is logged out again once released.
+    """
+
+    def __init__(self, max_sessions_per_vc=DEFAULT_MAX_SESSIONS_PER_VC,
+                 wait_timeout=DEFAULT_WAIT_TIMEOUT,
+                 probe_interval=SESSION_PROBE_INTERVAL):
+        self.max_sessions_per_vc = max_sessions_per_vc
+        self.wait_timeout = wait_timeout
+        self.probe_interval = probe_interval
+        self._condition = threading.Condition()
+        # vCenter name -> idle sessions as (vsphere, time of release), most
+        # recent last
+        self._idle = collections.defaultdict(collections.deque)
+        # vCenter name -> number of pooled sessions, including pending logins
+        self._num_sessions = collections.Counter()
+        self._pooled_sessions = set()
+        self._stats = {
+            'logins': 0,
+            'relogins': 0,
+            'waits': 0,
+            'overflow_leases': 0
         }
-        if not vsphere_list:
-            raise Exception("Global list of vSphere info not set.")
 
-        for vc in vsphere_list:
-            if vc['name'] == vcenter_name:
-                cache_item['username'] = vc['username']
-                cache_item['password'] = vc['password']
-                break
-        cache[vm_id] = cache_item
+    def lease(self, vcenter):
+        """Lease a connected session of a vCenter.
+
+        :param dict vcenter: 'name', 'hostname', 'port', 'username' and
+            'password' of the vCenter.
+
+        :return: connected VSphere object, which must be handed back via
+            release() or invalidate().
+
+        :rtype: vsphere_guest_run.vsphere.VSphere
+        """
+        name = vcenter['name']
+        with self._condition:
+            idle = self._idle[name]
+            if not idle and self._is_full(name):
+                self._stats['waits'] += 1
+                self._condition.wait_for(lambda: idle,
+                                         timeout=self.wait_timeout)
+            if idle:
+                vsphere, released_at = idle.pop()
+                if time.time() - released_at <= self.probe_interval:
+                    return vsphere
+            else:
+                vsphere = None
+                is_pooled = not self._is_full(name)
+                if is_pooled:
+                    self._num_sessions[name] += 1
+                else:
+                    self._stats['overflow_leases'] += 1
+
+        if vsphere is not None:
+            return self._ensure_session(vcenter, vsphere)
+        try:
+            vsphere = self._login(vcenter)
+        except Exception:
+            if is_pooled:
+                with self._condition:
+                    self._num_sessions[name] -= 1
+                    self._condition.notify_all()
+            raise
+        if is_pooled:
+            with self._condition:
+                self._pooled_sessions.add(vsphere)
+        return vsphere
+
+    def release(self, name, vsphere):
+        """Return a leased session to the pool.
+
+        :param str name: name of the vCenter of the session.
+        :param vsphere_guest_run.vsphere.VSphere vsphere:
+        """
+        with self._condition:
+            if vsphere in self._pooled_sessions:
+                self._idle[name].append((vsphere, time.time()))
+                self._condition.notify_all()
+                return
+        _logout(vsphere)
+
+    def invalidate(self, name, vsphere):
+        """Remove a leased session that may be unusable from the pool.
+
+        :param str name: name of the vCenter of the session.
+        :param vsphere_guest_run.vsphere.VSphere vsphere:
+        """
+        with self._condition:
+            if vsphere in self._pooled_sessions:
+                self._pooled_sessions.discard(vsphere)
+                self._num_sessions[name] -= 1
+                self._condition.notify_all()
+        _logout(vsphere)
+
+    def get_stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats['size'] = len(self._pooled_sessions)
+            stats['max_size_per_vc'] = self.max_sessions_per_vc
+            stats['idle'] = sum(len(idle) for idle in self._idle.values())
+        return stats
+
+    def close(self):
+        """Log out all idle sessions."""
+        with self._condition:
+            idle = []
+            for name, sessions in self._idle.items():
+                for vsphere, _ in sessions:
+                    self._pooled_sessions.discard(vsphere)
+                    self._num_sessions[name] -= 1
+                    idle.append(vsphere)
+                sessions.clear()
+            self._condition.notify_all()
+        for vsphere in idle:
+            _logout(vsphere)
+
+    def _is_full(self, name):
+        return self._num_sessions[name] >= self.max_sessions_per_vc
+
+    def _login(self, vcenter):
+        vsphere = VSphere(vcenter['hostname'], vcenter['username'],
+                          vcenter['password'], vcenter['port'])
+        vsphere.connect()
+        with self._condition:
+            self._stats['logins'] += 1
+        return vsphere
 
-    logger.debug(f"VM ID: {vm_id}, Hostname: {cache[vm_id]['hostname']}")
+    def _ensure_session(self, vcenter, vsphere):
+        """Probe session, log in again if it has expired."""
+        try:
+            vsphere.service_instance.CurrentTime()
+            return vsphere
+        except Exception:
+            pass
 
-    return VSphere(cache[vm_id]['hostname'], cache[vm_id]['username'],
-                   cache[vm_id]['password'], cache[vm_id]['port'])
+        self.invalidate(vcenter['name'], vsphere)
+        with self._condition:
+            self._num_sessions[vcenter['name']] += 1
+        try:
+            new_vsphere = self._login(vcenter)
+        except Exception:
+            with self._condition:
+                self._num_sessions[vcenter['name']] -= 1
+                self._condition.notify_all()
+            raise
+        with self._condition:
+            self._stats['relogins'] += 1
+            self._pooled_sessions.add(new_vsphere)
+        return new_vsphere
+
+
+def _logout(vsphere):
+    try:
+        vsphere.service_instance.content.sessionManager.Logout()
+    except Exception:
+        pass
+
+
+def get_session_pool():
+    """Get the vCenter session pool of the current process.
+
+    The pool is created on first use. Worker processes forked by the server
+    get a pool of their own, since sessions must not be shared across
+    processes.
+
+    :rtype: VSphereSessionPool
+    """
+    global _session_pool, _session_pool_pid
+    with _session_pool_lock:
+        if _session_pool is None or _session_pool_pid != os.getpid():
+            _session_pool = VSphereSessionPool()
+            _session_pool_pid = os.getpid()
+        return _session_pool
 
 
 def vgr_callback(prepend_msg='',
@@ -110,7 +576,162 @@ def wait_until_tools_ready(vapp, vm_name, vsphere, callback=vgr_callback()):
         def callback(message, exception=None), where parameter 'message'
         is a string.
     """
-    vsphere.connect()
+    if getattr(vsphere, 'service_instance', None) is None:
+        vsphere.connect()
     moid = vapp.get_vm_moid(vm_name)
     vm = vsphere.get_vm_by_moid(moid)
-    vsphere.wait_until_tools_ready(vm, sleep=5, callback=callback)
+    GuestReadinessWaiter(vsphere, callback=callback).wait([vm])
+
+
+def wait_until_guests_ready(sys_admin_client, vapp, vm_names, callback=None,
+                            timeout=None):
+    """Wait for VMware Tools of several VMs inside a VApp to be ready.
+
+    A single GuestReadinessWaiter is used per vCenter, covering all VMs of
+    the vCenter.
+
+    :param pyvcloud.vcd.client.Client sys_admin_client:
+    :param pyvcloud.vcd.vapp.VApp vapp:
+    :param list vm_names:
+    :param function callback: called with progress messages, see
+        vgr_callback().
+    :param int timeout: seconds to wait for, no limit if None.
+
+    :return: names of the VMs that are not ready when the timeout expires.
+
+    :rtype: list
+    """
+    deadline = time.time() + timeout if timeout is not None else None
+    vms_by_vcenter = collections.defaultdict(dict)
+    for vm_name in vm_names:
+        vcenter = _get_vcenter_info(sys_admin_client, vapp, vm_name)
+        moid = get_vm_moid(sys_admin_client, vapp, vm_name)
+        vms_by_vcenter[vcenter['name']][str(moid)] = (vcenter, vm_name)
+
+    not_ready = []
+    for vms in vms_by_vcenter.values():
+        vcenter = next(iter(vms.values()))[0]
+        with _vcenter_session(vcenter) as vsphere:
+            waiter = GuestReadinessWaiter(vsphere, callback=callback)
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.time())
+            not_ready_moids = waiter.wait(
+                [vsphere.get_vm_by_moid(moid) for moid in vms],
+                timeout=remaining)
+        not_ready.extend(vms[moid][1] for moid in not_ready_moids)
+    return not_ready
+
+
+class GuestReadinessWaiter(object):
+    """Waits for the guests of several VMs of a vCenter to be ready.
+
+    A guest is ready once VMware Tools are running and its heartbeat is
+    neither gray nor red. Changes of the guest status of all VMs are
+    received through a single property collector of the vCenter session. If
+    the property collector can't be used, the guest status of the VMs is
+    polled with an exponential backoff instead.
+    """
+
+    def __init__(self, vsphere, callback=None):
+        """Create a waiter.
+
+        :param vsphere_guest_run.vsphere.VSphere vsphere: connected session.
+        :param function callback: called with progress messages, see
+            vgr_callback().
+        """
+        self.vsphere = vsphere
+        self.callback = callback or (lambda message, exception=None: None)
+
+    def wait(self, vms, timeout=None):
+        """Wait for the guests of VMs to be ready.
+
+        :param list vms: vim.VirtualMachine objects of the session.
+        :param int timeout: seconds to wait for, no limit if None.
+
+        :return: moids of the VMs that are not ready when the timeout
+            expires.
+
+        :rtype: set
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        try:
+            return self._wait_for_updates(vms, deadline)
+        except Exception as err:
+            self.callback('unable to watch guest status of VMs, polling '
+                          'instead', exception=err)
+        return self._poll(vms, deadline)
+
+    def _wait_for_updates(self, vms, deadline):
+        content = self.vsphere.service_instance.RetrieveContent()
+        collector = content.propertyCollector.CreatePropertyCollector()
+        try:
+            filter_spec = vmodl.query.PropertyCollector.FilterSpec(
+                objectSet=[vmodl.query.PropertyCollector.ObjectSpec(obj=vm)
+                           for vm in vms],
+                propSet=[vmodl.query.PropertyCollector.PropertySpec(
+                    type=vim.VirtualMachine,
+                    pathSet=GUEST_READINESS_PROPERTIES)])
+            collector.CreateFilter(filter_spec, True)
+
+            pending = {vm._moId for vm in vms}
+            guest_status = collections.defaultdict(dict)
+            version = ''
+            while pending:
+                max_wait = MAX_PROPERTY_WAIT
+                if deadline is not None:
+                    max_wait = min(max_wait, int(deadline - time.time()))
+                    if max_wait <= 0:
+                        break
+                update_set = collector.WaitForUpdatesEx(
+                    version,
+                    vmodl.query.PropertyCollector.WaitOptions(
+                        maxWaitSeconds=max_wait))
+                if update_set is None:
+                    continue
+                version = update_set.version
+                for filter_update in update_set.filterSet:
+                    for object_update in filter_update.objectSet:
+                        moid = object_update.obj._moId
+                        for change in object_update.changeSet:
+                            guest_status[moid][change.name] = change.val
+                        self._update(pending, moid, guest_status[moid])
+            return pending
+        finally:
+            collector.Destroy()
+
+    def _poll(self, vms, deadline):
+        pending = {vm._moId for vm in vms}
+        interval = MIN_GUEST_POLL_INTERVAL
+        while True:
+            for vm in vms:
+                if vm._moId not in pending:
+                    continue
+                try:
+                    status = {
+                        'guest.toolsRunningStatus':
+                            vm.guest.toolsRunningStatus,
+                        'guestHeartbeatStatus': vm.guestHeartbeatStatus
+                    }
+                except Exception as err:
+                    self.callback(f"vm={vm}, exception", exception=err)
+                    continue
+                self._update(pending, vm._moId, status)
+            if not pending:
+                return pending
+            sleep = interval
+            if deadline is not None:
+                sleep = min(sleep, deadline - time.time())
+                if sleep <= 0:
+                    return pending
+            time.sleep(sleep)
+            interval = min(interval * 2, MAX_GUEST_POLL_INTERVAL)
+
+    def _update(self, pending, moid, status):
+        tools_status = status.get('guest.toolsRunningStatus')
+        heartbeat = status.get('guestHeartbeatStatus')
+        self.callback(f"vm={moid}, status={tools_status}, "
+                      f"heartbeat={heartbeat}")
+        if tools_status == 'guestToolsRunning' and \
+                heartbeat not in ('gray', 'red'):
+            pending.discard(moid)
@@ -0,0 +1,244 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Throughput benchmark of the AMQP consumer backends.
+
+Compares the 'select' backend (a MessageConsumer thread per listener) against
+the 'asyncio' backend (all AsyncioMessageConsumers on one event loop), both
+sharing one pool of 'processors' threads, configured the way Service starts
+them.
+
+The AMQP connection is replaced by an in-process stand-in: messages are
+delivered from a shared queue to the consumers with fewer unacknowledged
+messages than their prefetch count, and published replies are recorded.
+Requests are processed by a stub of request_processor that blocks for a
+fixed time, like a broker call to vCD. No AMQP server or vCD is needed,
+only pika.
+
+Usage: python tests/benchmarks/amqp_consumers.py [--messages N]
+    [--listeners N] [--processors N] [--request-time SECONDS]
+"""
+
+import argparse
+import asyncio
+import json
+import queue
+import statistics
+import sys
+import threading
+import time
+import types
+
+import pika
+
+# requests are processed by a stub, which keeps the brokers and their
+# dependencies out of the benchmark
+request_processor = types.ModuleType(
+    'container_service_extension.request_processor')
+sys.modules[request_processor.__name__] = request_processor
+
+import container_service_extension.asyncio_consumer as asyncio_consumer  # noqa: E402,E501,I100,I202
+from container_service_extension.consumer import MessageConsumer  # noqa: E402,E501
+from container_service_extension.consumer import RequestProcessorPool  # noqa: E402,E501
+
+REQUEST_BODY = json.dumps([{
+    'id': 'request-id',
+    'headers': {'Accept': 'application/json'},
+    'method': 'GET',
+    'requestUri': '/api/cse/clusters'
+}]).encode()
+
+
+class Recorder(object):
+    """Records the latency of every reply.
+
+    All messages are published at once when the benchmark starts, so the
+    latency of a reply includes the time its message waited in the broker.
+    """
+
+    def __init__(self, num_messages):
+        self.num_messages = num_messages
+        self.published_at = time.perf_counter()
+        self.latencies = []
+        self._lock = threading.Lock()
+        self.done = threading.Event()
+
+    def replied(self, correlation_id):
+        with self._lock:
+            self.latencies.append(time.perf_counter() - self.published_at)
+            if len(self.latencies) == self.num_messages:
+                self.done.set()
+
+
+class StubChannel(object):
+    def __init__(self, recorder, prefetch_count):
+        self.recorder = recorder
+        self.prefetch_count = prefetch_count
+        self.num_unacked = 0
+        self.is_open = True
+
+    def can_deliver(self):
+        return self.num_unacked < self.prefetch_count
+
+    def basic_ack(self, delivery_tag):
+        self.num_unacked -= 1
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.recorder.replied(properties.correlation_id)
+
+
+class StubIOLoop(object):
+    """ioloop of a SelectConnection, delivering messages within QOS."""
+
+    def __init__(self):
+        self._callbacks = queue.Queue()
+
+    def add_callback_threadsafe(self, callback):
+        self._callbacks.put(callback)
+
+    def run(self, consumer, channel, messages, recorder):
+        while not recorder.done.is_set():
+            message = None
+            if channel.can_deliver():
+                try:
+                    message = messages.get_nowait()
+                except queue.Empty:
+                    pass
+            if message is not None:
+                _deliver(consumer, channel, message)
+                continue
+            try:
+                self._callbacks.get(timeout=0.01)()
+            except queue.Empty:
+                pass
+        while not self._callbacks.empty():
+            self._callbacks.get_nowait()()
+
+
+def _get_messages(num_messages):
+    messages = queue.Queue()
+    for n in range(num_messages):
+        basic_deliver = types.SimpleNamespace(delivery_tag=n)
+        properties = pika.BasicProperties(
+            app_id='benchmark', reply_to='reply-queue', correlation_id=n,
+            headers={'replyToExchange': 'reply-exchange'})
+        messages.put((basic_deliver, properties))
+    return messages
+
+
+class StubConnection(object):
+    """SelectConnection delivering messages via a StubIOLoop."""
+
+    def __init__(self, ioloop):
+        self.ioloop = ioloop
+
+
+def _deliver(consumer, channel, message):
+    basic_deliver, properties = message
+    channel.num_unacked += 1
+    consumer.on_message(channel, basic_deliver, properties, REQUEST_BODY)
+
+
+def _get_consumer_args(routing_key):
+    return ('localhost', 5672, False, '/', 'guest', 'guest', 'exchange',
+            routing_key)
+
+
+def run_select(num_messages, num_listeners, num_processors):
+    messages = _get_messages(num_messages)
+    recorder = Recorder(num_messages)
+    processor_pool = None
+    if num_processors > 0:
+        processor_pool = RequestProcessorPool(num_processors)
+    consumers = []
+    threads = []
+    for n in range(num_listeners):
+        consumer = MessageConsumer(*_get_consumer_args(f"listener-{n}"),
+                                   processor_pool=processor_pool)
+        consumer._connection = StubConnection(StubIOLoop())
+        consumer._channel = StubChannel(recorder, consumer.prefetch_count)
+        consumers.append(consumer)
+        t = threading.Thread(target=consumer._connection.ioloop.run,
+                             args=(consumer, consumer._channel, messages,
+                                   recorder),
+                             daemon=True)
+        t.start()
+        threads.append(t)
+    recorder.done.wait()
+    duration = time.perf_counter() - recorder.published_at
+    for t in threads:
+        t.join()
+    if processor_pool is not None:
+        processor_pool.shutdown()
+    return duration, recorder.latencies
+
+
+def run_asyncio(num_messages, num_listeners, num_processors):
+    messages = _get_messages(num_messages)
+    loop = asyncio.new_event_loop()
+    processor_pool = RequestProcessorPool(num_processors or num_listeners)
+    consumers = []
+    for n in range(num_listeners):
+        consumer = asyncio_consumer.AsyncioMessageConsumer(
+            *_get_consumer_args(f"listener-{n}"), loop=loop,
+            processor_pool=processor_pool)
+        consumers.append(consumer)
+
+    def deliver_all(n=0):
+        # the broker pushes messages to the consumers within their prefetch
+        # count as fast as it can
+        while not messages.empty():
+            consumer = consumers[n % num_listeners]
+            n += 1
+            if consumer._channel.can_deliver():
+                _deliver(consumer, consumer._channel, messages.get_nowait())
+            elif not any(c._channel.can_deliver() for c in consumers):
+                loop.call_later(0.001, deliver_all, n)
+                return
+
+    t = threading.Thread(target=asyncio_consumer.run_event_loop,
+                         args=(loop, ), daemon=True)
+    recorder = Recorder(num_messages)
+    for consumer in consumers:
+        consumer._channel = StubChannel(recorder, consumer.prefetch_count)
+    t.start()
+    loop.call_soon_threadsafe(deliver_all)
+    recorder.done.wait()
+    duration = time.perf_counter() - recorder.published_at
+    asyncio_consumer.stop_event_loop(loop)
+    t.join()
+    processor_pool.shutdown()
+    return duration, recorder.latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--listeners', type=int, default=5)
+    parser.add_argument('--processors', type=int, default=0,
+                        help="the 'processors' service config property")
+    parser.add_argument('--request-time', type=float, default=0.01,
+                        help='seconds a request blocks')
+    args = parser.parse_args()
+
+    def process_request(body_json):
+        time.sleep(args.request_time)
+        return {'status_code': 200, 'body': {}}
+    request_processor.process_request = process_request
+
+    print(f"{args.messages} messages, {args.listeners} listeners, "
+          f"{args.processors} processors, {args.request_time * 1000:.0f} ms "
+          f"per request")
+    for name, run in (('select', run_select), ('asyncio', run_asyncio)):
+        duration, latencies = run(args.messages, args.listeners,
+                                  args.processors)
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(f"{name:<8} {args.messages / duration:>8.0f} msg/s, latency "
+              f"median {statistics.median(latencies) * 1000:.1f} ms, "
+              f"p99 {p99 * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Benchmark of listing clusters via vcdbroker.get_all_clusters().
+
+The vCD client is replaced by a stub whose typed queries return generated
+cluster records, page by page, after a fixed latency per page. No vCD is
+needed, only the dependencies of the CSE server.
+
+get_all_clusters() runs its two metadata queries concurrently, the second
+one on a copy of the client of the user. Tenant users and sys admins are
+measured against the sequential baseline, which executes the two queries one
+after the other.
+
+Usage: python tests/benchmarks/get_all_clusters.py [--clusters N]
+    [--page-size N] [--latency SECONDS] [--iterations N]
+"""
+
+import argparse
+import statistics
+import time
+
+from lxml import objectify
+
+from container_service_extension.server_constants import ClusterMetadataKey
+import container_service_extension.pyvcloud_utils as vcd_utils
+import container_service_extension.vcdbroker as vcdbroker
+
+API_URI = 'https://vcd.example.com/api'
+
+# metadata of the records returned by the first and the second query
+Q1_METADATA = {
+    ClusterMetadataKey.CLUSTER_ID: 'cluster-id-{n}',
+    ClusterMetadataKey.MASTER_IP: '10.0.0.{n}',
+    ClusterMetadataKey.CSE_VERSION: '3.0.0',
+    ClusterMetadataKey.TEMPLATE_NAME: 'ubuntu-16.04_k8-1.18_weave-2.6.5',
+    ClusterMetadataKey.TEMPLATE_REVISION: '1',
+    ClusterMetadataKey.OS: 'ubuntu-16.04'
+}
+Q2_METADATA = {
+    ClusterMetadataKey.DOCKER_VERSION: '19.03.5',
+    ClusterMetadataKey.KUBERNETES: 'upstream',
+    ClusterMetadataKey.KUBERNETES_VERSION: '1.18.6',
+    ClusterMetadataKey.CNI: 'weave',
+    ClusterMetadataKey.CNI_VERSION: '2.6.5'
+}
+
+
+def _get_record(n, metadata):
+    entries = ''.join(
+        f"<MetadataEntry><Key>{key.value}</Key><TypedValue>"
+        f"<Value>{value.format(n=n)}</Value></TypedValue></MetadataEntry>"
+        for key, value in metadata.items())
+    return objectify.fromstring(
+        f"<VAppRecord id=\"urn:vcloud:vapp:{n:08d}\" name=\"cluster-{n}\" "
+        f"vdc=\"urn:vcloud:vdc:vdc-1\" vdcName=\"vdc-1\" "
+        f"org=\"urn:vcloud:org:org-1\" numberOfVMs=\"3\" "
+        f"status=\"POWERED_ON\">"
+        f"<Metadata>{entries}</Metadata></VAppRecord>")
+
+
+class StubTypedQuery(object):
+    def __init__(self, records, page_size, latency):
+        self.records = records
+        self.page_size = page_size
+        self.latency = latency
+
+    def execute(self):
+        for i in range(0, len(self.records), self.page_size):
+            # the request for a page, which releases the GIL like a socket
+            time.sleep(self.latency)
+            yield from self.records[i:i + self.page_size]
+
+
+class StubClient(object):
+    def __init__(self, q1_records, q2_records, latency, is_sysadmin):
+        self.q1_records = q1_records
+        self.q2_records = q2_records
+        self.latency = latency
+        self._is_sysadmin = is_sysadmin
+
+    def is_sysadmin(self):
+        return self._is_sysadmin
+
+    def get_org_list(self):
+        return []
+
+    def get_api_uri(self):
+        return API_URI
+
+    def get_typed_query(self, query_type_name, query_result_format=None,
+                        page_size=None, qfilter=None, fields=None):
+        if f'metadata:{ClusterMetadataKey.CLUSTER_ID}' in fields:
+            records = self.q1_records
+        else:
+            records = self.q2_records
+        return StubTypedQuery(records, page_size or 25, self.latency)
+
+
+def _get_all_clusters_sequentially(client, page_size):
+    """Execute both queries one after the other, as the baseline did."""
+    queries = [client.get_typed_query(
+        'vApp', page_size=page_size,
+        fields=','.join(f'metadata:{key.value}' for key in metadata))
+        for metadata in (Q1_METADATA, Q2_METADATA)]
+    clusters = {record.get('id'): record for record in queries[0].execute()}
+    for record in queries[1].execute():
+        assert record.get('id') in clusters
+    return list(clusters.values())
+
+
+def _measure(get_all_clusters, client, page_size, iterations, num_clusters):
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        clusters = get_all_clusters(client, page_size=page_size)
+        durations.append(time.perf_counter() - start)
+        assert len(clusters) == num_clusters
+        if get_all_clusters is vcdbroker.get_all_clusters:
+            assert all(c['cluster_id'] and c['cni'] for c in clusters)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clusters', type=int, default=10000)
+    parser.add_argument('--page-size', type=int, default=128)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds per page of a typed query')
+    parser.add_argument('--iterations', type=int, default=3)
+    args = parser.parse_args()
+
+    q1_records = [_get_record(n, Q1_METADATA) for n in range(args.clusters)]
+    q2_records = [_get_record(n, Q2_METADATA) for n in range(args.clusters)]
+    sysadmin_client = StubClient(q1_records, q2_records, args.latency, True)
+    tenant_client = StubClient(q1_records, q2_records, args.latency, False)
+    vcd_utils.copy_client = lambda client: StubClient(
+        q1_records, q2_records, args.latency, client.is_sysadmin())
+
+    print(f"{args.clusters} clusters, {args.page_size} records per page, "
+          f"{args.latency * 1000:.0f} ms per page, {args.iterations} "
+          f"iterations")
+    for name, get_all_clusters, client in (
+            ('sequential baseline', _get_all_clusters_sequentially,
+             tenant_client),
+            ('tenant', vcdbroker.get_all_clusters, tenant_client),
+            ('sys admin', vcdbroker.get_all_clusters, sysadmin_client)):
+        durations = _measure(get_all_clusters, client, args.page_size,
+                             args.iterations, args.clusters)
+        print(f"{name:<24} median {statistics.median(durations):.3f}s, "
+              f"min {min(durations):.3f}s, max {max(durations):.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Benchmark of enumerating the nodes of a cluster.
+
+Compares vcdbroker.get_cluster_nodes(), which reads the nodes from a VM
+typed query, against the previous way of loading the cluster vApp and
+looking up the primary IP of every VM in it.
+
+The vCD client is replaced by a stub that returns generated vApp documents
+and VM query records. Every request waits a fixed latency plus the time to
+transfer its response at a given bandwidth, and its response is parsed like
+pyvcloud does, so that both the number of requests and the size of the
+documents count. No vCD is needed, only the dependencies of the CSE
+server.
+
+Usage: python tests/benchmarks/get_cluster_nodes.py [--nodes N [N ...]]
+    [--latency SECONDS] [--bandwidth MBPS] [--vm-size KB] [--iterations N]
+"""
+
+import argparse
+import statistics
+import time
+
+from lxml import objectify
+import pyvcloud.vcd.vapp as vcd_vapp
+
+from container_service_extension.server_constants import NodeType
+import container_service_extension.vcdbroker as vcdbroker
+
+VAPP_HREF = 'https://vcd.example.com/api/vApp/vapp-1'
+# records per page of a typed query, if no page size is given
+DEFAULT_PAGE_SIZE = 25
+
+
+def _get_node_names(num_nodes):
+    return [f"{NodeType.MASTER.value}-0001"] + \
+        [f"{NodeType.WORKER.value}-{n:04d}" for n in range(1, num_nodes)]
+
+
+def _get_vapp_document(num_nodes, vm_size):
+    # hardware and filler sections, the latter standing in for the guest
+    # customization, runtime info and other sections of a real VM document
+    filler = 'x' * (vm_size * 1024)
+    vms = ''.join(
+        f"<Vm name=\"{name}\" status=\"4\" href=\"{VAPP_HREF}/vm-{n}\">"
+        f"<ovf:VirtualHardwareSection>"
+        f"<ovf:Item><rasd:ResourceType>3</rasd:ResourceType></ovf:Item>"
+        f"<ovf:Item><rasd:ResourceType>4</rasd:ResourceType></ovf:Item>"
+        f"<ovf:Item><rasd:Connection vcloud:ipAddress=\"10.0.{n // 250}."
+        f"{n % 250}\">net</rasd:Connection>"
+        f"<rasd:ResourceType>10</rasd:ResourceType></ovf:Item>"
+        f"</ovf:VirtualHardwareSection>"
+        f"<Description>{filler}</Description>"
+        f"</Vm>"
+        for n, name in enumerate(_get_node_names(num_nodes)))
+    return (
+        f"<VApp xmlns=\"http://www.vmware.com/vcloud/v1.5\" "
+        f"xmlns:vcloud=\"http://www.vmware.com/vcloud/v1.5\" "
+        f"xmlns:ovf=\"http://schemas.dmtf.org/ovf/envelope/1\" "
+        f"xmlns:rasd=\"http://schemas.dmtf.org/wbem/wscim/1/cim-schema/2/"
+        f"CIM_ResourceAllocationSettingData\" name=\"cluster\" "
+        f"href=\"{VAPP_HREF}\"><Children>{vms}</Children></VApp>").encode()
+
+
+def _get_record_pages(num_nodes, page_size):
+    records = [
+        f"<VMRecord name=\"{name}\" status=\"POWERED_ON\" "
+        f"ipAddress=\"10.0.{n // 250}.{n % 250}\" numberOfCpus=\"2\" "
+        f"memoryMB=\"2048\" moref=\"vm-{n}\" container=\"{VAPP_HREF}\"/>"
+        for n, name in enumerate(_get_node_names(num_nodes))]
+    return [
+        (f"<QueryResultRecords xmlns=\"http://www.vmware.com/vcloud/v1.5\">"
+         f"{''.join(records[i:i + page_size])}</QueryResultRecords>").encode()
+        for i in range(0, len(records), page_size)]
+
+
+class StubTypedQuery(object):
+    def __init__(self, client, pages):
+        self.client = client
+        self.pages = pages
+
+    def execute(self):
+        for page in self.pages:
+            for record in self.client.request(page).iterchildren():
+                yield record
+
+
+class StubClient(object):
+    def __init__(self, num_nodes, latency, bandwidth, vm_size):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.vapp_document = _get_vapp_document(num_nodes, vm_size)
+        self.num_nodes = num_nodes
+        self.num_requests = 0
+
+    def request(self, document):
+        self.num_requests += 1
+        delay = self.latency
+        if self.bandwidth:
+            delay += len(document) / (self.bandwidth * 1024 * 1024)
+        time.sleep(delay)
+        return objectify.fromstring(document)
+
+    def is_sysadmin(self):
+        return True
+
+    def get_resource(self, uri):
+        return self.request(self.vapp_document)
+
+    def get_typed_query(self, query_type_name, query_result_format=None,
+                        page_size=None, qfilter=None, equality_filter=None,
+                        fields=None):
+        pages = _get_record_pages(self.num_nodes,
+                                  page_size or DEFAULT_PAGE_SIZE)
+        return StubTypedQuery(self, pages)
+
+
+def get_nodes_from_vapp(client, vapp_href):
+    """Enumerate nodes as cluster info did before get_cluster_nodes()."""
+    vapp = vcd_vapp.VApp(client, href=vapp_href)
+    nodes = {}
+    for vm in vapp.get_all_vms():
+        node_info = {
+            'name': vm.get('name'),
+            'ipAddress': ''
+        }
+        try:
+            node_info['ipAddress'] = vapp.get_primary_ip(vm.get('name'))
+        except Exception:
+            pass
+        for node_type in NodeType:
+            if vm.get('name').startswith(node_type):
+                nodes.setdefault(node_type, []).append(node_info)
+    return nodes
+
+
+def _measure(get_nodes, num_nodes, args):
+    durations = []
+    num_requests = 0
+    for _ in range(args.iterations):
+        client = StubClient(num_nodes, args.latency, args.bandwidth,
+                            args.vm_size)
+        start = time.perf_counter()
+        nodes = get_nodes(client, VAPP_HREF)
+        durations.append(time.perf_counter() - start)
+        num_requests = client.num_requests
+        assert sum(len(n) for n in nodes.values()) == num_nodes
+    return statistics.median(durations), num_requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, nargs='+',
+                        default=[5, 25, 50, 100, 200])
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds per request')
+    parser.add_argument('--bandwidth', type=float, default=10,
+                        help='MB per second of responses, 0 for unlimited')
+    parser.add_argument('--vm-size', type=int, default=16,
+                        help='KB per VM in the vApp document')
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.latency * 1000:.0f} ms per request, {args.bandwidth} MB/s, "
+          f"{args.vm_size} KB per VM document, median of {args.iterations} "
+          f"iterations")
+    print(f"{'nodes':>6} {'vApp walk':>12} {'requests':>9} "
+          f"{'VM query':>12} {'requests':>9}")
+    for num_nodes in args.nodes:
+        vapp_time, vapp_requests = _measure(get_nodes_from_vapp, num_nodes,
+                                            args)
+        query_time, query_requests = _measure(vcdbroker.get_cluster_nodes,
+                                              num_nodes, args)
+        print(f"{num_nodes:>6} {vapp_time * 1000:>10.1f}ms {vapp_requests:>9} "
+              f"{query_time * 1000:>10.1f}ms {query_requests:>9}")
+
+
+if __name__ == '__main__':
+    main()
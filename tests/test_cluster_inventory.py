@@ -0,0 +1,117 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Unit tests of the cluster inventory, runnable without a vCD.
+
+vCD queries are replaced by stubs, which read vApp tasks and clusters from
+in-memory lists.
+"""
+
+import pytest
+
+import container_service_extension.cluster_inventory as ci
+
+
+def _cluster(vapp_id, name, template_revision=1):
+    return {
+        'vapp_id': vapp_id,
+        'name': name,
+        'cluster_id': f'id-{name}',
+        'vdc_id': 'vdc-1',
+        'vdc_name': 'vdc',
+        'org_name': 'org',
+        'template_revision': template_revision
+    }
+
+
+def _task(task_id, vapp_id, end_date):
+    return {'href': f'https://vcd/api/task/{task_id}',
+            'object': f'https://vcd/api/vApp/vapp-{vapp_id}',
+            'endDate': end_date}
+
+
+class StubVcd(object):
+    def __init__(self):
+        self.clusters = []
+        self.tasks = []
+        self.cluster_queries = []
+        self.task_queries = []
+
+    def query_clusters(self, client, cluster_id=None, vapp_ids=None):
+        self.cluster_queries.append(vapp_ids)
+        return [dict(c) for c in self.clusters
+                if vapp_ids is None or c['vapp_id'] in vapp_ids]
+
+    def query_vapp_tasks(self, client, changes_since):
+        self.task_queries.append(changes_since)
+        since = ci._parse_date(changes_since)
+        return [t for t in self.tasks
+                if ci._parse_date(t['endDate']) >= since]
+
+
+@pytest.fixture
+def vcd(monkeypatch):
+    vcd = StubVcd()
+    monkeypatch.setattr(ci, '_query_clusters', vcd.query_clusters)
+    monkeypatch.setattr(ci, '_query_vapp_tasks', vcd.query_vapp_tasks)
+    monkeypatch.setattr(ci.ClusterInventory, '_with_sysadmin_client',
+                        staticmethod(lambda func, **kwargs:
+                                     func(None, **kwargs)))
+    return vcd
+
+
+@pytest.fixture
+def inventory(vcd):
+    vcd.clusters = [_cluster('1', 'a'), _cluster('2', 'b')]
+    inventory = ci.ClusterInventory()
+    inventory.load()
+    vcd.cluster_queries = []
+    return inventory
+
+
+def test_refresh_reads_changed_vapps_only(inventory, vcd):
+    vcd.clusters = [_cluster('1', 'a', template_revision=2),
+                    _cluster('3', 'c')]
+    vcd.tasks = [_task('t1', '1', '2099-01-01T00:00:00.000Z'),
+                 _task('t2', '3', '2099-01-01T00:00:01.000+00:00')]
+
+    assert inventory.refresh_changes() == 2
+
+    assert vcd.cluster_queries == [['1', '3']]
+    cluster = inventory.get_clusters(cluster_name='a')[0]
+    assert cluster['template_revision'] == 2
+    assert inventory.get_clusters(cluster_name='c')
+    # no task on the vApp of cluster 'b', which is not read again
+    assert inventory.get_clusters(cluster_name='b')
+
+
+def test_refresh_removes_deleted_vapps(inventory, vcd):
+    vcd.clusters = [_cluster('2', 'b')]
+    vcd.tasks = [_task('t1', '1', '2099-01-01T00:00:00.000Z')]
+
+    inventory.refresh_changes()
+
+    assert inventory.get_clusters(cluster_name='a') == []
+    assert len(inventory.get_clusters()) == 1
+
+
+def test_refresh_skips_tasks_seen(inventory, vcd):
+    vcd.tasks = [_task('t1', '1', '2099-01-01T00:00:00.000Z')]
+    inventory.refresh_changes()
+    vcd.cluster_queries = []
+
+    assert inventory.refresh_changes() == 0
+    assert vcd.task_queries[-1] == '2099-01-01T00:00:00.000Z'
+    assert vcd.cluster_queries == []
+
+    vcd.tasks.append(_task('t2', '2', '2099-01-01T00:00:00.000Z'))
+    assert inventory.refresh_changes() == 1
+    assert vcd.cluster_queries == [['2']]
+
+
+def test_refresh_before_load(vcd):
+    inventory = ci.ClusterInventory()
+
+    assert inventory.refresh_changes() == 0
+    assert vcd.task_queries == []
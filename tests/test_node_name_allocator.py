@@ -0,0 +1,143 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Unit tests of the node name allocator, runnable without a vCD.
+
+The clock of the allocator is replaced by a stub, so that reservations can
+be expired without waiting for RESERVATION_TTL.
+"""
+
+import types
+
+import pytest
+
+import container_service_extension.node_name_allocator as nna
+from container_service_extension.server_constants import NodeNaming
+from container_service_extension.server_constants import NodeType
+
+VAPP_HREF = 'https://vcd/api/vApp/vapp-1'
+
+
+class StubClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = StubClock()
+    monkeypatch.setattr(nna, 'time', types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture
+def allocator(clock):
+    return nna.NodeNameAllocator()
+
+
+def test_sequential_names(allocator):
+    names = allocator.allocate(VAPP_HREF, set(), NodeType.WORKER, 2,
+                               naming=NodeNaming.SEQUENTIAL)
+
+    assert names == ['node-0001', 'node-0002']
+
+
+def test_sequential_names_follow_highest_existing(allocator):
+    existing_names = {'mstr-abcd', 'node-0002', 'node-0007', 'node-wxyz',
+                      'nfsd-0042'}
+
+    names = allocator.allocate(VAPP_HREF, existing_names, NodeType.WORKER, 2,
+                               naming=NodeNaming.SEQUENTIAL)
+
+    assert names == ['node-0008', 'node-0009']
+
+
+def test_sequential_names_skip_reserved(allocator):
+    first = allocator.allocate(VAPP_HREF, set(), NodeType.WORKER, 2,
+                               naming=NodeNaming.SEQUENTIAL)
+    # the snapshot of the second operation predates the first nodes
+    second = allocator.allocate(VAPP_HREF, set(), NodeType.WORKER, 1,
+                                naming=NodeNaming.SEQUENTIAL)
+
+    assert first == ['node-0001', 'node-0002']
+    assert second == ['node-0003']
+
+
+def test_reservations_are_per_vapp(allocator):
+    allocator.allocate(VAPP_HREF, set(), NodeType.WORKER, 1,
+                       naming=NodeNaming.SEQUENTIAL)
+
+    names = allocator.allocate('https://vcd/api/vApp/vapp-2', set(),
+                               NodeType.WORKER, 1,
+                               naming=NodeNaming.SEQUENTIAL)
+
+    assert names == ['node-0001']
+
+
+def test_reservation_expiry(allocator, clock):
+    allocator.allocate(VAPP_HREF, set(), NodeType.WORKER, 1,
+                       naming=NodeNaming.SEQUENTIAL)
+
+    clock.now += nna.RESERVATION_TTL - 1
+    assert allocator.allocate(VAPP_HREF, set(), NodeType.WORKER, 1,
+                              naming=NodeNaming.SEQUENTIAL) == ['node-0002']
+
+    clock.now += nna.RESERVATION_TTL
+    assert allocator.allocate(VAPP_HREF, set(), NodeType.WORKER, 1,
+                              naming=NodeNaming.SEQUENTIAL) == ['node-0001']
+
+
+def test_release(allocator):
+    names = allocator.allocate(VAPP_HREF, set(), NodeType.WORKER, 2,
+                               naming=NodeNaming.SEQUENTIAL)
+    # the nodes failed to be created
+    allocator.release(VAPP_HREF, names)
+
+    assert allocator.allocate(VAPP_HREF, set(), NodeType.WORKER, 2,
+                              naming=NodeNaming.SEQUENTIAL) == names
+
+
+def test_release_unknown_names(allocator):
+    allocator.release(VAPP_HREF, ['node-0001'])
+    allocator.release('https://vcd/api/vApp/vapp-2', ['node-0001'])
+
+
+def test_random_names(allocator):
+    names = allocator.allocate(VAPP_HREF, set(), NodeType.WORKER, 3,
+                               naming=NodeNaming.RANDOM)
+
+    assert len(set(names)) == 3
+    for name in names:
+        prefix, suffix = name.split('-')
+        assert prefix == NodeType.WORKER.value
+        assert len(suffix) == nna.RANDOM_SUFFIX_LENGTH
+
+
+def test_random_names_exclude_collisions(allocator, monkeypatch):
+    suffixes = iter(['aaaa', 'bbbb', 'aaaa', 'bbbb', 'cccc', 'dddd'])
+    monkeypatch.setattr(nna.random, 'choices',
+                        lambda population, k: list(next(suffixes)))
+
+    first = allocator.allocate(VAPP_HREF, {'node-aaaa'}, NodeType.WORKER, 1,
+                               naming=NodeNaming.RANDOM)
+    # node-aaaa exists and node-bbbb is reserved by the first allocation
+    second = allocator.allocate(VAPP_HREF, {'node-aaaa'}, NodeType.WORKER, 2,
+                                naming=NodeNaming.RANDOM)
+
+    assert first == ['node-bbbb']
+    assert second == ['node-cccc', 'node-dddd']
+
+
+def test_random_names_are_unique_within_allocation(allocator, monkeypatch):
+    suffixes = iter(['aaaa', 'aaaa', 'bbbb'])
+    monkeypatch.setattr(nna.random, 'choices',
+                        lambda population, k: list(next(suffixes)))
+
+    names = allocator.allocate(VAPP_HREF, set(), NodeType.WORKER, 2,
+                               naming=NodeNaming.RANDOM)
+
+    assert names == ['node-aaaa', 'node-bbbb']
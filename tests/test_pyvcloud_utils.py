@@ -0,0 +1,120 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Unit tests of pyvcloud_utils, runnable without a vCD.
+
+vCD clients are replaced by stubs, whose typed queries return records from
+an in-memory map of query fields to records.
+"""
+
+import threading
+
+import pytest
+
+import container_service_extension.pyvcloud_utils as vcd_utils
+
+
+class StubClient(object):
+    def __init__(self, records, access_token=None, auth_token='auth-token'):
+        self.records = records
+        self.access_token = access_token
+        self.auth_token = auth_token
+        self.rehydrated_with = None
+        self.query_threads = []
+        self.query_filters = []
+
+    def get_access_token(self):
+        return self.access_token
+
+    def get_xvcloud_authorization_token(self):
+        return self.auth_token
+
+    def rehydrate_from_token(self, token, is_jwt_token=False):
+        self.rehydrated_with = (token, is_jwt_token)
+
+    def is_sysadmin(self):
+        return True
+
+    def get_api_uri(self):
+        return 'https://vcd/api'
+
+    def get_typed_query(self, query_type_name, query_result_format=None,
+                        page_size=None, qfilter=None, equality_filter=None,
+                        fields=None):
+        self.query_threads.append(threading.current_thread())
+        self.query_filters.append((qfilter, equality_filter))
+        return StubQuery(self.records[fields])
+
+
+class StubQuery(object):
+    def __init__(self, records):
+        self.records = records
+
+    def execute(self):
+        return iter(self.records)
+
+
+@pytest.fixture
+def copies(monkeypatch):
+    copies = []
+
+    def get_tenant_client():
+        copies.append(StubClient(RECORDS))
+        return copies[-1]
+
+    monkeypatch.setattr(vcd_utils, 'get_tenant_client', get_tenant_client)
+    return copies
+
+
+RECORDS = {
+    'a,b': [{'id': 'vapp-1', 'a': '1'}, {'id': 'vapp-2', 'a': '2'}],
+    'c': [{'id': 'vapp-2', 'c': '2'}, {'id': 'vapp-3', 'c': '3'},
+          {'id': 'vapp-1', 'c': '1'}]
+}
+
+
+def test_copy_client_with_auth_token(copies):
+    client_copy = vcd_utils.copy_client(StubClient(RECORDS))
+
+    assert client_copy is copies[0]
+    assert client_copy.rehydrated_with == ('auth-token', False)
+
+
+def test_copy_client_with_access_token(copies):
+    client_copy = vcd_utils.copy_client(
+        StubClient(RECORDS, access_token='jwt'))
+
+    assert client_copy.rehydrated_with == ('jwt', True)
+
+
+def test_execute_split_typed_query(copies):
+    client = StubClient(RECORDS)
+
+    records = vcd_utils.execute_split_typed_query(
+        client, 'vApp', 'name==*', ['a,b', 'c'])
+
+    assert list(records) == ['vapp-1', 'vapp-2', 'vapp-3']
+    assert records['vapp-1'] == [{'id': 'vapp-1', 'a': '1'},
+                                 {'id': 'vapp-1', 'c': '1'}]
+    assert records['vapp-3'] == [{'id': 'vapp-3', 'c': '3'}]
+    # the second query runs on a copy of the client, on another thread
+    assert client.query_threads == [threading.current_thread()]
+    assert len(copies) == 1
+    assert copies[0].query_threads[0] is not threading.current_thread()
+
+
+def test_get_vms_in_ovdc(monkeypatch):
+    monkeypatch.setattr(vcd_utils, 'MAX_IDS_PER_QUERY', 2)
+    client = StubClient({'name': [{'name': 'vm'}]})
+
+    vms = list(vcd_utils.get_vms_in_ovdc(client, 'vdc-1', ['a', 'b', 'c']))
+
+    # one query per batch of ids, each restricted to the vdc
+    assert len(vms) == 2
+    vdc_filter = ('vdc', 'https://vcd/api/vdc/vdc-1')
+    assert client.query_filters == [
+        ('isVAppTemplate==false;(id==urn:vcloud:vm:a,id==urn:vcloud:vm:b)',
+         vdc_filter),
+        ('isVAppTemplate==false;(id==urn:vcloud:vm:c)', vdc_filter)
+    ]
@@ -0,0 +1,116 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Unit tests of the sys admin client pool, runnable without a vCD.
+
+Sys admin logins are replaced by stub clients, whose session is read from
+vCD by a GET of the session endpoint.
+"""
+
+import pyvcloud.vcd.exceptions as vcd_exceptions
+import pytest
+
+import container_service_extension.sysadmin_client_pool as pool_module
+
+
+class StubClient(object):
+    def __init__(self):
+        self.is_session_valid = True
+        self.session_gets = 0
+        self.logged_out = False
+
+    def get_api_uri(self):
+        return 'https://vcd/api'
+
+    def get_resource(self, uri):
+        assert uri == 'https://vcd/api/session'
+        self.session_gets += 1
+        if not self.is_session_valid:
+            raise _unauthorized_error()
+        return {}
+
+    def logout(self):
+        self.logged_out = True
+
+
+def _unauthorized_error():
+    return vcd_exceptions.UnauthorizedException(401, 'request-id', None)
+
+
+@pytest.fixture
+def logins(monkeypatch):
+    clients = []
+
+    def get_sys_admin_client():
+        clients.append(StubClient())
+        return clients[-1]
+
+    monkeypatch.setattr(pool_module.vcd_utils, 'get_sys_admin_client',
+                        get_sys_admin_client)
+    return clients
+
+
+@pytest.fixture
+def pool(logins):
+    return pool_module.SysAdminClientPool(max_size=2, wait_timeout=0.1,
+                                          probe_interval=60)
+
+
+def test_reuse_recently_released_client(pool, logins):
+    client = pool.lease()
+    pool.release(client)
+
+    assert pool.lease() is client
+    assert client.session_gets == 0
+    assert len(logins) == 1
+
+
+def test_probe_idle_client(pool, logins):
+    client = pool.lease()
+    pool.release(client)
+    pool._idle[-1] = (client, 0)
+
+    assert pool.lease() is client
+    assert client.session_gets == 1
+
+
+def test_relogin_when_probe_fails(pool, logins):
+    client = pool.lease()
+    pool.release(client)
+    pool._idle[-1] = (client, 0)
+    client.is_session_valid = False
+
+    new_client = pool.lease()
+
+    assert new_client is not client
+    assert client.logged_out
+    assert pool.get_stats()['relogins'] == 1
+    assert pool.get_stats()['size'] == 1
+
+
+def test_leased_client_invalidated_on_401(pool, logins):
+    with pytest.raises(vcd_exceptions.UnauthorizedException):
+        with pool.leased_client() as client:
+            raise _unauthorized_error()
+
+    assert client.logged_out
+    assert pool.get_stats()['size'] == 0
+    assert pool.lease() is not client
+
+
+def test_leased_client_released_on_other_errors(pool, logins):
+    with pytest.raises(ValueError):
+        with pool.leased_client() as client:
+            raise ValueError()
+
+    assert not client.logged_out
+    assert pool.lease() is client
+
+
+def test_release_after_401_probes_on_next_lease(pool, logins):
+    client = pool.lease()
+    pool.release(client, error=_unauthorized_error())
+
+    assert pool.lease() is client
+    assert client.session_gets == 1
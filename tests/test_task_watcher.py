@@ -0,0 +1,226 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Unit tests of the task watcher, runnable without a vCD.
+
+pyvcloud and the sys admin client pool are replaced by stubs, so that tasks
+are resolved from an in-memory map of task href to task status. Task queries
+are answered from the same map.
+"""
+
+import contextlib
+import enum
+import importlib
+import sys
+import time
+import types
+
+import pytest
+
+import container_service_extension
+
+
+class TaskStatus(enum.Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    ERROR = 'error'
+    CANCELED = 'canceled'
+    ABORTED = 'aborted'
+
+
+class ResourceType(enum.Enum):
+    ADMIN_TASK = 'adminTask'
+
+
+class QueryResultFormat(enum.Enum):
+    RECORDS = 'records'
+
+
+class VcdTaskException(Exception):
+    def __init__(self, message, error):
+        super().__init__(message)
+        self.error = error
+
+
+class StubTask(dict):
+    pass
+
+
+class StubQuery(object):
+    def __init__(self, records):
+        self.records = records
+
+    def execute(self):
+        return iter(self.records)
+
+
+class StubClient(object):
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.queries = []
+        self.gets = []
+
+    def get_resource(self, href):
+        self.gets.append(href)
+        return StubTask(href=href, status=self.statuses[href],
+                        operationName='stub')
+
+    def get_typed_query(self, query_type_name, qfilter=None, **kwargs):
+        assert query_type_name == ResourceType.ADMIN_TASK.value
+        ids = [f.split(':')[-1] for f in qfilter.split(',')]
+        self.queries.append(ids)
+        hrefs = {href.split('/')[-1]: href for href in self.statuses}
+        return StubQuery([StubTask(href=hrefs[i],
+                                   status=self.statuses[hrefs[i]])
+                          for i in ids if i in hrefs])
+
+
+class StubPool(object):
+    def __init__(self, statuses):
+        self.client = StubClient(statuses)
+
+    def lease(self):
+        return self.client
+
+    def release(self, client):
+        pass
+
+    @contextlib.contextmanager
+    def leased_client(self):
+        yield self.client
+
+
+@pytest.fixture
+def statuses():
+    return {}
+
+
+@pytest.fixture
+def pool(statuses):
+    return StubPool(statuses)
+
+
+@pytest.fixture
+def task_watcher(monkeypatch, pool):
+    pyvcloud = types.ModuleType('pyvcloud')
+    vcd = types.ModuleType('pyvcloud.vcd')
+    client = types.ModuleType('pyvcloud.vcd.client')
+    client.TaskStatus = TaskStatus
+    client.ResourceType = ResourceType
+    client.QueryResultFormat = QueryResultFormat
+    exceptions = types.ModuleType('pyvcloud.vcd.exceptions')
+    exceptions.VcdTaskException = VcdTaskException
+    pyvcloud.vcd = vcd
+    vcd.client = client
+    vcd.exceptions = exceptions
+    sysadmin_client_pool = types.ModuleType(
+        'container_service_extension.sysadmin_client_pool')
+    sysadmin_client_pool.get_pool = lambda: pool
+
+    monkeypatch.setitem(sys.modules, 'pyvcloud', pyvcloud)
+    monkeypatch.setitem(sys.modules, 'pyvcloud.vcd', vcd)
+    monkeypatch.setitem(sys.modules, 'pyvcloud.vcd.client', client)
+    monkeypatch.setitem(sys.modules, 'pyvcloud.vcd.exceptions', exceptions)
+    monkeypatch.setitem(sys.modules,
+                        'container_service_extension.sysadmin_client_pool',
+                        sysadmin_client_pool)
+    # the module may already be bound to the package by an earlier import
+    monkeypatch.setattr(container_service_extension, 'sysadmin_client_pool',
+                        sysadmin_client_pool, raising=False)
+    monkeypatch.delitem(sys.modules,
+                        'container_service_extension.task_watcher',
+                        raising=False)
+    module = importlib.import_module(
+        'container_service_extension.task_watcher')
+    monkeypatch.setattr(module, 'INITIAL_POLL_INTERVAL', 0.1)
+    monkeypatch.setattr(module, 'MAX_POLL_INTERVAL', 0.2)
+    yield module
+    module.get_watcher().stop()
+    monkeypatch.delitem(sys.modules,
+                        'container_service_extension.task_watcher')
+
+
+def test_wait_for_task(task_watcher, statuses):
+    statuses['task-1'] = TaskStatus.SUCCESS.value
+
+    task = task_watcher.wait_for_task(StubTask(href='task-1'), timeout=5)
+
+    assert task.get('status') == TaskStatus.SUCCESS.value
+
+
+def test_wait_for_failed_task(task_watcher, statuses):
+    statuses['task-1'] = TaskStatus.ERROR.value
+
+    with pytest.raises(VcdTaskException):
+        task_watcher.wait_for_task(StubTask(href='task-1'), timeout=5)
+
+
+def test_watch_after_idle(task_watcher, statuses):
+    """Tasks watched after the watcher ran out of tasks are still polled."""
+    statuses['task-1'] = TaskStatus.SUCCESS.value
+    task_watcher.wait_for_task(StubTask(href='task-1'), timeout=5)
+    # let the poll thread go idle, with no outstanding task
+    time.sleep(0.3)
+    assert task_watcher.get_watcher().get_stats()['outstanding'] == 0
+
+    statuses['task-2'] = TaskStatus.SUCCESS.value
+    task = task_watcher.wait_for_task(StubTask(href='task-2'), timeout=5)
+
+    assert task.get('href') == 'task-2'
+
+
+def test_watch_during_backoff(task_watcher, statuses):
+    """Tasks watched while another task backs off are polled on time."""
+    statuses['task-1'] = TaskStatus.RUNNING.value
+    watcher = task_watcher.get_watcher()
+    slow_future = watcher.watch(StubTask(href='task-1'))
+    with watcher._condition:
+        watcher._tasks[0].next_poll_time = time.time() + 60
+        watcher._condition.notify()
+    time.sleep(0.3)
+
+    statuses['task-2'] = TaskStatus.SUCCESS.value
+    start = time.time()
+    task_watcher.wait_for_task(StubTask(href='task-2'), timeout=5)
+
+    assert time.time() - start < 2
+    assert not slow_future.done()
+    slow_future.cancel()
+
+
+def test_poll_with_single_query(task_watcher, statuses, pool, monkeypatch):
+    """Only finished tasks are fetched, running ones are read by a query."""
+    monkeypatch.setattr(task_watcher, 'MAX_TASKS_PER_QUERY', 3)
+    hrefs = [f"https://vcd/api/task/task-{i}" for i in range(5)]
+    for href in hrefs:
+        statuses[href] = TaskStatus.RUNNING.value
+    statuses[hrefs[0]] = TaskStatus.SUCCESS.value
+    watcher = task_watcher.get_watcher()
+    # watch all tasks before the poll thread picks any of them
+    with watcher._condition:
+        futures = [watcher.watch(StubTask(href=href)) for href in hrefs]
+        next_poll_time = time.time() + 0.1
+        for watched_task in watcher._tasks:
+            watched_task.next_poll_time = next_poll_time
+
+    assert futures[0].result(timeout=5).get('status') == \
+        TaskStatus.SUCCESS.value
+    for future in futures[1:]:
+        future.cancel()
+
+    first_queries = pool.client.queries[:2]
+    assert first_queries == [['task-0', 'task-1', 'task-2'],
+                             ['task-3', 'task-4']]
+    assert pool.client.gets == [hrefs[0]]
+    assert watcher.get_stats()['queries'] >= 2
+
+
+def test_poll_task_missing_from_query(task_watcher, statuses, pool):
+    """A task the query doesn't return is fetched, failing its future."""
+    with pytest.raises(KeyError):
+        task_watcher.wait_for_task(
+            StubTask(href='https://vcd/api/task/task-1'), timeout=5)
+
+    assert pool.client.gets == ['https://vcd/api/task/task-1']
@@ -0,0 +1,69 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Unit tests of the template script registry, runnable without a vCD.
+
+Template scripts are rendered with ScriptTemplate.format() in place of
+str.format(), so every case is checked against str.format() itself.
+"""
+
+import os
+import types
+
+import pytest
+
+from container_service_extension.server_constants import LocalTemplateKey
+from container_service_extension.server_constants import ScriptFile
+import container_service_extension.template_script_registry as tsr
+
+
+@pytest.mark.parametrize('text, kwargs', [
+    ('', {}),
+    ('echo no fields', {}),
+    ('kubeadm join {ip} --token {token}', {'ip': '10.0.0.1', 'token': 't'}),
+    ('{token}{token}', {'token': 'abc'}),
+    ('cat <<EOF\n{{"a": {ip}}}\nEOF\n', {'ip': '10.0.0.1'}),
+    ('{ip!r} {ip!s}', {'ip': '10.0.0.1'}),
+    ('{count:>5} {count:05d}', {'count': 42}),
+    ('{node.name} {ips[0]}', {'node': types.SimpleNamespace(name='node-1'),
+                              'ips': ['10.0.0.1']}),
+    ('{ip:{width}}', {'ip': '10.0.0.1', 'width': 12}),
+])
+def test_format_matches_str_format(text, kwargs):
+    assert tsr.ScriptTemplate(text).format(**kwargs) == text.format(**kwargs)
+
+
+def test_format_is_repeatable():
+    template = tsr.ScriptTemplate('join {ip} {token}')
+
+    assert template.format(ip='a', token='1') == 'join a 1'
+    assert template.format(ip='b', token='2') == 'join b 2'
+
+
+def test_format_missing_field():
+    with pytest.raises(KeyError):
+        tsr.ScriptTemplate('join {ip} {token}').format(ip='10.0.0.1')
+
+
+def test_registry_reloads_modified_script(tmp_path, monkeypatch):
+    filepath = tmp_path / ScriptFile.NODE.value
+    filepath.write_text('echo {ip}')
+    monkeypatch.setattr(tsr.ltm, 'get_script_filepath',
+                        lambda name, revision, script_file: str(filepath))
+    registry = tsr.TemplateScriptRegistry()
+    template = {LocalTemplateKey.NAME: 'tmpl', LocalTemplateKey.REVISION: 1}
+
+    assert registry.load([template]) == len(ScriptFile)
+    assert registry.get_script_template(
+        'tmpl', 1, ScriptFile.NODE).format(ip='a') == 'echo a'
+
+    filepath.write_text('echo {ip} {token}')
+    stat = os.stat(filepath)
+    os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    assert registry.get_script_template(
+        'tmpl', 1, ScriptFile.NODE).format(ip='a', token='1') == 'echo a 1'
+    stats = registry.get_stats()
+    assert stats['reloads'] == 1
+    assert stats['size'] == len(ScriptFile)
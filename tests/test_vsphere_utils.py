@@ -0,0 +1,89 @@
+# container-service-extension
+# Copyright (c) 2020 VMware, Inc. All Rights Reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Unit tests of vsphere_utils, runnable without a vCD or a vCenter.
+
+The vCenter session pool is replaced by a stub, which records the sessions
+released and invalidated.
+"""
+
+from pyVmomi import vim
+import pytest
+
+import container_service_extension.vsphere_utils as vs_utils
+
+VCENTER = {'name': 'vc'}
+
+
+class StubSessionPool(object):
+    def __init__(self):
+        self.released = []
+        self.invalidated = []
+
+    def lease(self, vcenter):
+        return object()
+
+    def release(self, name, vsphere):
+        self.released.append(vsphere)
+
+    def invalidate(self, name, vsphere):
+        self.invalidated.append(vsphere)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = StubSessionPool()
+    monkeypatch.setattr(vs_utils, 'get_session_pool', lambda: pool)
+    return pool
+
+
+def test_session_invalidated_on_session_errors(pool):
+    with pytest.raises(ConnectionResetError):
+        with vs_utils._vcenter_session(VCENTER) as vsphere:
+            raise ConnectionResetError()
+
+    assert pool.invalidated == [vsphere]
+    assert pool.released == []
+
+
+@pytest.mark.parametrize('error, is_session_error', [
+    (vim.fault.NotAuthenticated(), True),
+    (ConnectionRefusedError(), True),
+    (vim.fault.GuestOperationsUnavailable(), False),
+    (ValueError(), False),
+])
+def test_is_session_error(error, is_session_error):
+    assert vs_utils._is_session_error(error) == is_session_error
+
+
+def test_session_released_on_other_errors(pool):
+    with pytest.raises(ValueError):
+        with vs_utils._vcenter_session(VCENTER) as vsphere:
+            raise ValueError()
+
+    assert pool.released == [vsphere]
+    assert pool.invalidated == []
+
+
+class StubVApp(object):
+    def __init__(self, href):
+        self.href = href
+
+    def get_vm(self, vm_name):
+        raise AssertionError("the vApp must not be loaded")
+
+
+def test_cached_location_does_not_load_vapp(monkeypatch):
+    cache = vs_utils.VmLocationCache()
+    monkeypatch.setattr(vs_utils, 'vm_location_cache', cache)
+    vs_utils._cache_vm_records(
+        [{'container': 'https://vcd-1/api/vApp/vapp-1', 'name': 'node-1',
+          'vc': 'vc-href', 'moref': 'vm-42'}],
+        {'vc-href': 'vc'})
+
+    vapp = StubVApp('https://vcd/api/vApp/vapp-1')
+
+    assert vs_utils.get_vm_moid(None, vapp, 'node-1') == 'vm-42'
+    cache.evict(vapp.href, 'node-1')
+    assert cache.get(vapp.href, 'node-1') is None